@@ -8,6 +8,9 @@ from database import create_tables, delete_tables
 from router.auth import auth_router
 from router.car import router as car_router
 from repositories.car import CarRepository
+from utils.http_client import http_clients
+from utils.inference_pipeline import inference_pipeline, PIPELINE_MODE
+from utils.upload_limit import UploadSizeLimitMiddleware
 
 
 
@@ -18,8 +21,14 @@ async def lifespan(app: FastAPI):
     print('База очищена')
     await create_tables()
     print('База готова к работе')
+    http_clients.start()
+    if PIPELINE_MODE:
+        inference_pipeline.start()
+        print('Конвейер нейросети запущен')
     yield
     print('Выключение')
+    await inference_pipeline.close()
+    await http_clients.close()
 
 
 def custom_openapi():
@@ -58,6 +67,11 @@ app.openapi = custom_openapi
 app.include_router(auth_router)
 app.include_router(car_router)
 
+# Лимит загрузки проверяется, пока тело запроса читается, а не после разбора multipart
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_body_size=CarRepository.MAX_UPLOAD_REQUEST_SIZE + 64 * 1024  # Запас на заголовки частей multipart
+)
 
 app.add_middleware(
     CORSMiddleware,
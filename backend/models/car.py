@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 from typing import List, Optional
-from sqlalchemy import ForeignKey, Integer, String, DateTime, Enum
+from sqlalchemy import ForeignKey, Integer, String, DateTime, Enum, JSON, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from enum import Enum as PyEnum
 from database import Model
@@ -132,4 +132,35 @@ class AnalysisMetadataOrm(Model):
     value: Mapped[str] = mapped_column(String(500))
     
     # Связи
-    analysis: Mapped['CarAnalysisOrm'] = relationship()
\ No newline at end of file
+    analysis: Mapped['CarAnalysisOrm'] = relationship()
+
+
+class UploadedImageOrm(Model):
+    __tablename__ = 'uploaded_images'
+    __table_args__ = (UniqueConstraint('analysis_id', 'position', 'filename'),)
+    
+    id: Mapped[int] = mapped_column(primary_key=True)
+    analysis_id: Mapped[int] = mapped_column(ForeignKey('car_analyses.id'), index=True)
+    position: Mapped[str] = mapped_column(String(100))
+    filename: Mapped[str] = mapped_column(String(255))  # Файл в uploads/<analysis_id>/<position>/
+    content_hash: Mapped[str] = mapped_column(String(64))  # SHA-256, посчитанный при загрузке
+    uploaded_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    
+    # Связи
+    analysis: Mapped['CarAnalysisOrm'] = relationship()
+
+
+class ImageResultOrm(Model):
+    __tablename__ = 'image_results'
+    __table_args__ = (UniqueConstraint('analysis_id', 'position', 'content_hash'),)
+    
+    id: Mapped[int] = mapped_column(primary_key=True)
+    analysis_id: Mapped[int] = mapped_column(ForeignKey('car_analyses.id'), index=True)
+    position: Mapped[str] = mapped_column(String(100))
+    filename: Mapped[str] = mapped_column(String(255))  # Последний файл с этим содержимым
+    content_hash: Mapped[str] = mapped_column(String(64))  # SHA-256 фотографии
+    report: Mapped[list] = mapped_column(JSON)  # Дефекты из ответа нейросети
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    
+    # Связи
+    analysis: Mapped['CarAnalysisOrm'] = relationship()
@@ -1,14 +1,18 @@
 import os
-import httpx
 import datetime
 from database import new_session
-from models.car import CarAnalysisOrm, CarPartAnalysisOrm, PartDefectOrm, AnalysisMetadataOrm
-from sqlalchemy import select
+from utils.http_client import http_clients
+from models.car import CarAnalysisOrm, CarPartAnalysisOrm, PartDefectOrm, AnalysisMetadataOrm, ImageResultOrm, UploadedImageOrm
+from sqlalchemy import select, delete
+from sqlalchemy.dialects import postgresql, sqlite
 from schemas.car import SAnalyseResult
-from fastapi import HTTPException
-from typing import List, Dict
+from fastapi import HTTPException, UploadFile
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from pathlib import Path
 import asyncio
+import hashlib
+import httpx
+import math
 
 
 
@@ -54,46 +58,228 @@ MAX_DAMAGE_SCORE = 12  # Максимально возможный ущерб
 
 class CarRepository:
     UPLOAD_DIR = "uploads"
+    UPLOAD_CHUNK_SIZE = 1024 * 1024  # Копируем загрузки кусками по 1 МБ
+    MAX_UPLOAD_FILE_SIZE = int(os.getenv('MAX_UPLOAD_FILE_SIZE', 10 * 1024 * 1024))  # Как MAX_FILE_SIZE нейросервиса, больший файл он отклонит
+    MAX_UPLOAD_REQUEST_SIZE = int(os.getenv('MAX_UPLOAD_REQUEST_SIZE', 200 * 1024 * 1024))
     NEURAL_API_URL = "http://localhost:4070/api/v1/find_defects"
+    NEURAL_BATCH_API_URL = "http://localhost:4070/api/v1/find_defects_batch"
+    NEURAL_BATCH_SIZE = int(os.getenv('NEURAL_BATCH_SIZE', 16))  # Не больше MAX_BATCH_IMAGES нейросервиса
+    NEURAL_BATCH_RETRIES = int(os.getenv('NEURAL_BATCH_RETRIES', 3))  # Повторы пакета, когда нейросервис перегружен (503/429)
+    NEURAL_RETRY_AFTER_MAX = 30.0  # Дольше этого не ждем, даже если сервис просит
+    # Ответы пакетного эндпоинта, после которых изображения отправляются по одному:
+    # ошибка в одном из файлов (400/413/415/422) или нет пакетного эндпоинта (404)
+    NEURAL_BATCH_FALLBACK_STATUSES = {400, 404, 413, 415, 422}
+    NEURAL_MAX_CONCURRENCY = int(os.getenv('NEURAL_MAX_CONCURRENCY', 4))  # Одновременных запросов к нейросервису на один анализ
     #GIBDD_API_URL = "http://localhost:8085/api/vin/{vin}"
     GIBDD_API_URL = "http://localhost:8085/api/vin/mock/1"
     
         # Коэффициенты серьезности по типам повреждений
     
     @classmethod
-    async def _send_to_neural(cls, image_path: str) -> Dict:
+    async def _request_neural(cls, image_path: str) -> Optional[Dict]:
         """
         Отправляет изображение в нейросеть для анализа.
-        В случае ошибки возвращает моковые данные.
+        В случае ошибки возвращает None.
         """
         try:
             # Проверяем существование файла
             if not os.path.exists(image_path):
                 print(f"File not found: {image_path}")
-                return cls._get_test_defects()
+                return None
 
             # Подготавливаем файл для отправки
             file_name = os.path.basename(image_path)
             with open(image_path, "rb") as file:
                 files = {'file': (file_name, file, 'image/jpeg')}
                 
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    print(f"Sending to neural: {file_name}")
-                    response = await client.post(
-                        cls.NEURAL_API_URL,
-                        files=files,
-                        headers={'Accept': 'application/json'}
-                    )
-                    
-                    if response.status_code != 200:
-                        print(f"Neural API error: {response.status_code} - {response.text}")
-                        return cls._get_test_defects()
-                    
-                    return response.json()
+                print(f"Sending to neural: {file_name}")
+                response = await http_clients.get("neural").post(
+                    cls.NEURAL_API_URL,
+                    files=files,
+                    headers={'Accept': 'application/json'}
+                )
+                
+                if response.status_code != 200:
+                    print(f"Neural API error: {response.status_code} - {response.text}")
+                    return None
+                
+                return response.json()
                     
         except Exception as e:
             print(f"Error sending to neural: {str(e)}")
+            return None
+
+
+    @classmethod
+    async def _send_to_neural(cls, image_path: str) -> Dict:
+        """
+        Отправляет изображение в нейросеть для анализа.
+        В случае ошибки возвращает моковые данные.
+        """
+        neural_response = await cls._request_neural(image_path)
+        if neural_response is None:
             return cls._get_test_defects()
+        return neural_response
+
+
+    @classmethod
+    def _retry_after(cls, response: httpx.Response) -> float:
+        """Сколько ждать перед повтором по заголовку Retry-After (в секундах)"""
+        try:
+            delay = float(response.headers.get('Retry-After', 1))
+        except ValueError:
+            delay = 1.0
+        return min(max(delay, 0.0), cls.NEURAL_RETRY_AFTER_MAX)
+
+
+    @classmethod
+    async def _send_each_to_neural(cls, image_paths: List[str], semaphore: asyncio.Semaphore) -> List[Optional[Dict]]:
+        """Отправляет изображения по одному, параллельно, занимая слоты того же semaphore"""
+        async def send(image_path: str) -> Optional[Dict]:
+            async with semaphore:
+                return await cls._request_neural(image_path)
+
+        return list(await asyncio.gather(*(send(path) for path in image_paths)))
+
+
+    @classmethod
+    async def _send_batch_to_neural(cls, image_paths: List[str]) -> Optional[List[Optional[Dict]]]:
+        """
+        Отправляет часть изображений анализа в нейросеть одним запросом.
+        Возвращает ответы в том же порядке, что и image_paths
+        (None для изображений, которые не удалось обработать).
+        Если сервис перегружен (503/429), повторяет пакет после Retry-After.
+        Возвращает None, если пакет отклонен из-за содержимого или пакетного
+        эндпоинта нет: тогда изображения нужно отправить по одному.
+        """
+        files = []
+        try:
+            existing_paths = [path for path in image_paths if os.path.exists(path)]
+            for image_path in existing_paths:
+                files.append(('files', (os.path.basename(image_path), open(image_path, "rb"), 'image/jpeg')))
+            
+            for attempt in range(cls.NEURAL_BATCH_RETRIES + 1):
+                for _, (_, file, _) in files:
+                    file.seek(0)
+                print(f"Sending batch to neural: {len(files)} files")
+                response = await http_clients.get("neural").post(
+                    cls.NEURAL_BATCH_API_URL,
+                    files=files,
+                    headers={'Accept': 'application/json'},
+                    timeout=http_clients.timeout("neural", scale=len(files))
+                )
+                if response.status_code not in (429, 503) or attempt == cls.NEURAL_BATCH_RETRIES:
+                    break
+                delay = cls._retry_after(response)
+                print(f"Neural service busy ({response.status_code}), retrying batch in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            
+            if response.status_code in cls.NEURAL_BATCH_FALLBACK_STATUSES:
+                print(f"Neural batch API rejected batch: {response.status_code} - {response.text}")
+                return None
+            if response.status_code != 200:
+                # Перегрузка или сбой сервиса: отдельные запросы только добавят нагрузки
+                print(f"Neural batch API error: {response.status_code} - {response.text}")
+                return [None] * len(image_paths)
+            
+            batch_results = response.json().get("results", [])
+            if len(batch_results) != len(existing_paths):
+                raise ValueError(f"Expected {len(existing_paths)} results, got {len(batch_results)}")
+            
+            results = []
+            batch_results = iter(batch_results)
+            for image_path in image_paths:
+                if image_path in existing_paths:
+                    results.append(next(batch_results))
+                else:
+                    print(f"File not found: {image_path}")
+                    results.append(None)
+            return results
+                    
+        except httpx.HTTPError as e:
+            print(f"Error sending batch to neural: {str(e)}")
+            return [None] * len(image_paths)
+        except Exception as e:
+            # Неожиданный ответ пакетного эндпоинта
+            print(f"Error sending batch to neural: {str(e)}")
+            return None
+        finally:
+            for _, (_, file, _) in files:
+                file.close()
+
+
+    @classmethod
+    async def _iter_neural_responses(cls, image_paths: List[str]) -> AsyncIterator[Tuple[int, List[Optional[Dict]]]]:
+        """
+        Отправляет изображения в нейросеть параллельными пакетами и отдаёт
+        (смещение пакета в image_paths, ответы) по мере готовности пакетов.
+        Одновременно выполняется не больше NEURAL_MAX_CONCURRENCY запросов,
+        в том числе когда отклоненный пакет отправляется по одному изображению.
+        """
+        concurrency = max(1, cls.NEURAL_MAX_CONCURRENCY)
+        # Делим изображения так, чтобы загрузить все слоты, но не превысить лимит пакета нейросервиса
+        chunk_size = max(1, min(cls.NEURAL_BATCH_SIZE, math.ceil(len(image_paths) / concurrency)))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send_chunk(offset: int) -> Tuple[int, List[Optional[Dict]]]:
+            chunk = image_paths[offset:offset + chunk_size]
+            async with semaphore:
+                results = await cls._send_batch_to_neural(chunk)
+            if results is None:
+                # Слот пакета уже освобожден, отдельные запросы занимают слоты сами
+                results = await cls._send_each_to_neural(chunk, semaphore)
+            return offset, results
+
+        tasks = [asyncio.create_task(send_chunk(offset)) for offset in range(0, len(image_paths), chunk_size)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Если обработка прервалась, не оставляем висящих запросов
+            for task in tasks:
+                task.cancel()
+
+
+    @classmethod
+    def _fold_neural_response(cls, car_parts: Dict, neural_response: Dict, total_damage_score: float) -> float:
+        """
+        Добавляет дефекты из ответа нейросети в car_parts.
+        Возвращает обновлённую сумму ущерба.
+        """
+        for defect in neural_response.get("report", []):
+            part_type = defect["car_part"]
+            defect_type = defect["defect_type"]
+            severity = defect["severity"] / 5  # Нормализуем severity (0-1)
+            confidence = defect["confidence"]
+            
+            damage_weight = DAMAGE_WEIGHTS.get(defect_type, 1.0)
+            part_weight = PART_WEIGHTS.get(part_type, 1.0)
+            
+            damage_score = damage_weight * part_weight * severity * confidence
+            total_damage_score += damage_score
+            
+            if part_type not in car_parts:
+                car_parts[part_type] = {
+                    "quality": 5.0,
+                    "metadata": [],
+                    "defects": [],
+                    "detailed": [],
+                    "total_damage": 0.0
+                }
+            
+            defect_detail = {
+                "defect_type": defect_type,
+                "severity": min(4, max(0, round(defect["severity"]))),
+                "description": f"Confidence: {confidence:.2f}",
+                "damage_score": damage_score,
+                "confidence": confidence
+            }
+            
+            car_parts[part_type]["detailed"].append(defect_detail)
+            car_parts[part_type]["defects"].append(defect_type)
+            car_parts[part_type]["total_damage"] += damage_score
+        
+        return total_damage_score
 
 
     @classmethod
@@ -144,18 +330,17 @@ class CarRepository:
     @classmethod
     async def _get_gibdd_data(cls, vin: str) -> dict:
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                # Используем тестовый эндпоинт независимо от VIN
-                response = await client.get(cls.GIBDD_API_URL)
-                response.raise_for_status()
-                data = response.json()
-                
-                # Подменяем VIN в ответе на реальный, если нужно
-                if data.get("gibdd", {}).get("vehicle"):
-                    data["gibdd"]["vehicle"]["vin"] = "1"
-                    data["gibdd"]["vehicle"]["bodyNumber"] = "1"
-                
-                return data
+            # Используем тестовый эндпоинт независимо от VIN
+            response = await http_clients.get("gibdd").get(cls.GIBDD_API_URL)
+            response.raise_for_status()
+            data = response.json()
+            
+            # Подменяем VIN в ответе на реальный, если нужно
+            if data.get("gibdd", {}).get("vehicle"):
+                data["gibdd"]["vehicle"]["vin"] = "1"
+                data["gibdd"]["vehicle"]["bodyNumber"] = "1"
+            
+            return data
         except Exception as e:
             raise HTTPException(
                 status_code=502,
@@ -245,35 +430,161 @@ class CarRepository:
     
     
     @classmethod
-    async def upload_images(cls, analyse_id: int, images_data: list[tuple[bytes, str, str]]) -> bool:
+    def _copy_upload(cls, source, destination: str, budget: int) -> Tuple[int, str]:
+        """
+        Копирует загруженный файл в destination кусками по UPLOAD_CHUNK_SIZE.
+        Прерывается, как только файл превышает MAX_UPLOAD_FILE_SIZE или
+        оставшийся лимит запроса budget. Возвращает размер файла и SHA-256 содержимого.
+        Выполняется в отдельном потоке, чтобы не блокировать event loop.
+        """
+        written = 0
+        digest = hashlib.sha256()
+        source.seek(0)
+        with open(destination, "wb") as target:
+            while True:
+                chunk = source.read(cls.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > cls.MAX_UPLOAD_FILE_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Файл больше {cls.MAX_UPLOAD_FILE_SIZE // (1024 * 1024)} МБ"
+                    )
+                if written > budget:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Суммарный размер фотографий больше {cls.MAX_UPLOAD_REQUEST_SIZE // (1024 * 1024)} МБ"
+                    )
+                target.write(chunk)
+                digest.update(chunk)
+        return written, digest.hexdigest()
+    
+    
+    @staticmethod
+    def _fsync_paths(paths: List[str]):
+        """Сбрасывает на диск файлы или каталоги (одним проходом для всей загрузки)"""
+        for path in paths:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+    
+    
+    @classmethod
+    async def stream_upload_images(cls, analyse_id: int, uploads: list[tuple[UploadFile, str, str]]) -> list[tuple[str, str, str, str]]:
+        """
+        Сохраняет загруженные фотографии, не читая их целиком в память.
+        uploads - список (файл, позиция, имя файла).
+        Каждый файл копируется во временный .part файл кусками в отдельном потоке
+        с проверкой лимитов. Когда скопированы все файлы, они разом сбрасываются
+        на диск и переименовываются, так что при ошибке не остается частично
+        записанных фотографий.
+        Возвращает список (позиция, имя файла, путь, SHA-256) сохраненных фотографий.
+        К этому моменту Starlette уже получил тело запроса и сложил файлы во
+        временные файлы, поэтому размер всего запроса ограничивает
+        UploadSizeLimitMiddleware во время чтения, а здесь лимиты проверяются
+        повторно, чтобы не сохранить лишнего.
+        """
+        for _, position, filename in uploads:
+            if position in ("", ".", "..") or os.path.basename(position) != position:
+                raise ValueError(f"Некорректная позиция: {position}")
+            if not filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+                raise ValueError(f"Неподдерживаемый формат файла: {filename}")
+        
+        analyse_dir = os.path.join(cls.UPLOAD_DIR, str(analyse_id))
+        part_paths = []
+        content_hashes = []
         try:
-            cls._ensure_upload_dir_exists()
-            analyse_dir = os.path.join(cls.UPLOAD_DIR, str(analyse_id))
-            os.makedirs(analyse_dir, exist_ok=True)
-
-            for image_data, position, filename in images_data:
+            budget = cls.MAX_UPLOAD_REQUEST_SIZE
+            directories = set()
+            for upload, position, filename in uploads:
                 position_dir = os.path.join(analyse_dir, position)
                 os.makedirs(position_dir, exist_ok=True)
+                directories.add(position_dir)
                 
-                file_path = os.path.join(position_dir, filename)
-                
-                # Проверяем расширение файла
-                if not filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    raise ValueError(f"Неподдерживаемый формат файла: {filename}")
-                    
-                # Сохраняем файл с проверкой
-                try:
-                    with open(file_path, "wb") as f:
-                        f.write(image_data)
-                except IOError as e:
-                    raise ValueError(f"Ошибка сохранения файла {filename}: {str(e)}")
-
-            return True
+                part_path = os.path.join(position_dir, filename + ".part")
+                part_paths.append((part_path, os.path.join(position_dir, filename)))
+                size, content_hash = await asyncio.to_thread(cls._copy_upload, upload.file, part_path, budget)
+                budget -= size
+                content_hashes.append(content_hash)
+            
+            await asyncio.to_thread(cls._fsync_paths, [part_path for part_path, _ in part_paths])
+            for part_path, file_path in part_paths:
+                os.replace(part_path, file_path)
+            stored = [
+                (position, filename, file_path, content_hash)
+                for (_, position, filename), (_, file_path), content_hash in zip(uploads, part_paths, content_hashes)
+            ]
+            part_paths = []
+            # Фиксируем переименования
+            await asyncio.to_thread(cls._fsync_paths, sorted(directories))
+            await cls._record_uploads(analyse_id, stored)
+            return stored
+        except (HTTPException, ValueError):
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"Ошибка при загрузке изображений: {str(e)}"
             )
+        finally:
+            for part_path, _ in part_paths:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+    
+    
+    @staticmethod
+    async def _upsert(session, model, values: Dict, index_elements: List[str], update_fields: List[str]):
+        """
+        INSERT ... ON CONFLICT (index_elements) DO UPDATE для PostgreSQL и SQLite.
+        Одновременные записи одной строки не падают на уникальном ограничении:
+        последняя запись обновляет поля update_fields.
+        """
+        dialect = session.bind.dialect.name
+        if dialect == "postgresql":
+            statement = postgresql.insert(model).values(**values)
+        elif dialect == "sqlite":
+            statement = sqlite.insert(model).values(**values)
+        else:
+            raise NotImplementedError(f"Upsert не поддерживается для {dialect}")
+        await session.execute(statement.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={field: statement.excluded[field] for field in update_fields}
+        ))
+    
+    
+    @classmethod
+    async def _record_uploads(cls, analyse_id: int, stored: list[tuple[str, str, str, str]]):
+        """
+        Запоминает сохраненные фотографии и их SHA-256.
+        Повторная загрузка в тот же файл обновляет хеш.
+        """
+        async with new_session() as session:
+            for position, filename, _, content_hash in stored:
+                await cls._upsert(
+                    session,
+                    UploadedImageOrm,
+                    {
+                        "analysis_id": analyse_id,
+                        "position": position,
+                        "filename": filename,
+                        "content_hash": content_hash,
+                        "uploaded_at": datetime.datetime.now(datetime.timezone.utc)
+                    },
+                    index_elements=["analysis_id", "position", "filename"],
+                    update_fields=["content_hash", "uploaded_at"]
+                )
+            await session.commit()
+    
+    
+    @classmethod
+    async def _load_uploads(cls, session, analyse_id: int) -> List[UploadedImageOrm]:
+        """Загруженные фотографии анализа в порядке первой загрузки"""
+        query = select(UploadedImageOrm).where(UploadedImageOrm.analysis_id == analyse_id).order_by(UploadedImageOrm.id)
+        result = await session.execute(query)
+        return list(result.scalars().all())
     
     
     @classmethod
@@ -287,59 +598,71 @@ class CarRepository:
             if not analyse:
                 raise ValueError("Analysis not found")
 
-            # Получаем все загруженные изображения
-            analyse_dir = os.path.join(cls.UPLOAD_DIR, str(analyse_id))
-            if not os.path.exists(analyse_dir):
+            # Список фотографий и их SHA-256 берем из записей о загрузке, а не из
+            # каталога: недописанные .part файлы в анализ не попадут, а фото не
+            # нужно читать и хешировать заново
+            uploads = await cls._load_uploads(session, analyse_id)
+            if not uploads:
                 raise ValueError("No images uploaded for this analysis")
 
             car_parts = {}
             total_damage_score = 0.0
             processed_images = 0
 
-            for position in os.listdir(analyse_dir):
-                position_dir = os.path.join(analyse_dir, position)
-                if os.path.isdir(position_dir):
-                    for image_file in os.listdir(position_dir):
-                        image_path = os.path.join(position_dir, image_file)
-                        
-                        # Отправляем изображение в нейросеть (или получаем мок)
-                        neural_response = await cls._send_to_neural(image_path)
-                        
-                        # Обрабатываем каждый дефект
-                        for defect in neural_response.get("report", []):
-                            part_type = defect["car_part"]
-                            defect_type = defect["defect_type"]
-                            severity = defect["severity"] / 5  # Нормализуем severity (0-1)
-                            confidence = defect["confidence"]
-                            
-                            damage_weight = DAMAGE_WEIGHTS.get(defect_type, 1.0)
-                            part_weight = PART_WEIGHTS.get(part_type, 1.0)
-                            
-                            damage_score = damage_weight * part_weight * severity * confidence
-                            total_damage_score += damage_score
-                            
-                            if part_type not in car_parts:
-                                car_parts[part_type] = {
-                                    "quality": 5.0,
-                                    "metadata": [],
-                                    "defects": [],
-                                    "detailed": [],
-                                    "total_damage": 0.0
-                                }
-                            
-                            defect_detail = {
-                                "defect_type": defect_type,
-                                "severity": min(4, max(0, round(defect["severity"]))),
-                                "description": f"Confidence: {confidence:.2f}",
-                                "damage_score": damage_score,
-                                "confidence": confidence
-                            }
-                            
-                            car_parts[part_type]["detailed"].append(defect_detail)
-                            car_parts[part_type]["defects"].append(defect_type)
-                            car_parts[part_type]["total_damage"] += damage_score
-                        
-                        processed_images += 1
+            analyse_dir = os.path.join(cls.UPLOAD_DIR, str(analyse_id))
+            image_paths = [os.path.join(analyse_dir, upload.position, upload.filename) for upload in uploads]
+            # Результаты ищем по позиции и содержимому фото, а не по имени файла:
+            # замененная фотография будет обработана заново, а неизмененные - нет
+            image_keys = [(upload.position, upload.content_hash) for upload in uploads]
+            stored_responses = await cls._load_image_results(session, analyse_id)
+
+            # Удаляем результаты фотографий, которых больше нет
+            stale_keys = set(stored_responses) - set(image_keys)
+            for position, content_hash in stale_keys:
+                await session.execute(delete(ImageResultOrm).where(
+                    ImageResultOrm.analysis_id == analyse_id,
+                    ImageResultOrm.position == position,
+                    ImageResultOrm.content_hash == content_hash
+                ))
+
+            ready_responses = {}
+            missing = {}  # ключ -> индексы изображений с таким содержимым
+            for index, image_key in enumerate(image_keys):
+                if image_key in stored_responses:
+                    ready_responses[index] = stored_responses[image_key]
+                else:
+                    missing.setdefault(image_key, []).append(index)
+            missing_keys = list(missing)
+            print(f"Analyse {analyse_id}: {len(image_paths)} images, {len(missing_keys)} need inference")
+
+            # Новые изображения отправляем в нейросеть параллельно (или получаем мок).
+            # Ответы складываются в порядке image_paths по мере готовности, поэтому
+            # суммы с плавающей точкой совпадают с последовательной обработкой
+            next_index = 0
+
+            def fold_ready():
+                nonlocal next_index, total_damage_score, processed_images
+                while next_index in ready_responses:
+                    neural_response = ready_responses.pop(next_index)
+                    total_damage_score = cls._fold_neural_response(car_parts, neural_response, total_damage_score)
+                    processed_images += 1
+                    next_index += 1
+
+            fold_ready()
+            missing_paths = [image_paths[missing[image_key][0]] for image_key in missing_keys]
+            async for offset, neural_responses in cls._iter_neural_responses(missing_paths):
+                for missing_index, neural_response in enumerate(neural_responses, start=offset):
+                    image_key = missing_keys[missing_index]
+                    if neural_response is None:
+                        neural_response = cls._get_test_defects()
+                    else:
+                        # Сохраняем только настоящие ответы, моки будут запрошены заново
+                        position, content_hash = image_key
+                        filename = os.path.basename(missing_paths[missing_index])
+                        await cls._store_image_result(session, analyse_id, position, filename, content_hash, neural_response)
+                    for index in missing[image_key]:
+                        ready_responses[index] = neural_response
+                fold_ready()
 
             # Рассчитываем финальную оценку
             condition_score = max(0.0, 4 - 4 * (total_damage_score / MAX_DAMAGE_SCORE))
@@ -362,6 +685,64 @@ class CarRepository:
             )
     
     
+    @classmethod
+    async def _store_image_result(
+        cls, session, analyse_id: int, position: str, filename: str, content_hash: str, neural_response: Dict
+    ):
+        """
+        Записывает ответ нейросети для одной фотографии, заменяя предыдущий.
+        Конвейер и analyse могут сохранять одну и ту же фотографию одновременно,
+        поэтому запись идет через upsert, а не delete + insert.
+        """
+        await cls._upsert(
+            session,
+            ImageResultOrm,
+            {
+                "analysis_id": analyse_id,
+                "position": position,
+                "filename": filename,
+                "content_hash": content_hash,
+                "report": neural_response.get("report", []),
+                "created_at": datetime.datetime.now(datetime.timezone.utc)
+            },
+            index_elements=["analysis_id", "position", "content_hash"],
+            update_fields=["filename", "report", "created_at"]
+        )
+    
+    
+    @classmethod
+    async def save_image_result(
+        cls, analyse_id: int, position: str, filename: str, content_hash: str, neural_response: Dict
+    ):
+        """Сохраняет ответ нейросети для одной фотографии"""
+        async with new_session() as session:
+            await cls._store_image_result(session, analyse_id, position, filename, content_hash, neural_response)
+            await session.commit()
+    
+    
+    @classmethod
+    async def has_image_result(cls, analyse_id: int, position: str, content_hash: str) -> bool:
+        async with new_session() as session:
+            query = select(ImageResultOrm.id).where(
+                ImageResultOrm.analysis_id == analyse_id,
+                ImageResultOrm.position == position,
+                ImageResultOrm.content_hash == content_hash
+            )
+            result = await session.execute(query)
+            return result.first() is not None
+    
+    
+    @classmethod
+    async def _load_image_results(cls, session, analyse_id: int) -> Dict[Tuple[str, str], Dict]:
+        """Возвращает сохраненные ответы нейросети по (позиция, SHA-256 фото)"""
+        query = select(ImageResultOrm).where(ImageResultOrm.analysis_id == analyse_id)
+        result = await session.execute(query)
+        return {
+            (image_result.position, image_result.content_hash): {"report": image_result.report}
+            for image_result in result.scalars().all()
+        }
+    
+    
     @classmethod
     async def _save_analysis_results(cls, session, analyse_id: int, car_parts: Dict, total_quality: float):
         # Обновляем основной анализ
@@ -370,6 +751,11 @@ class CarRepository:
         analyse = result.scalars().first()
         analyse.result_quality = total_quality
         
+        # Повторный анализ заменяет результаты предыдущего, а не добавляет к ним
+        previous_parts = select(CarPartAnalysisOrm.id).where(CarPartAnalysisOrm.analysis_id == analyse_id)
+        await session.execute(delete(PartDefectOrm).where(PartDefectOrm.part_analysis_id.in_(previous_parts)))
+        await session.execute(delete(CarPartAnalysisOrm).where(CarPartAnalysisOrm.analysis_id == analyse_id))
+        
         # Сохраняем данные по деталям
         for part_type, part_data in car_parts.items():
             part_analysis = CarPartAnalysisOrm(
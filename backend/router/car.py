@@ -5,6 +5,8 @@ from schemas.car import SAnalyseResponse, SCreateAnalyse
 from models.car import AnalysisMetadataOrm
 from database import new_session
 from sqlalchemy import select
+from utils.http_client import http_clients
+from utils.inference_pipeline import inference_pipeline
 
 
 
@@ -194,14 +196,15 @@ async def upload_photos(
         if len(photos) != len(sep_positions):
             raise ValueError("Количество фотографий и позиций должно совпадать")
         
-        # Собираем данные с уникальными именами файлов
-        images_data = []
+        # Собираем файлы с уникальными именами, содержимое копируется потоково
+        uploads = []
         for i, (photo, sep_positions) in enumerate(zip(photos, sep_positions), start=1):
-            image_data = await photo.read()
             filename = f"{i}_{sep_positions}.jpg"  # Уникальное имя файла
-            images_data.append((image_data, sep_positions, filename))
+            uploads.append((photo, sep_positions, filename))
         
-        result = await CarRepository.upload_images(analyse_id, images_data)
+        stored = await CarRepository.stream_upload_images(analyse_id, uploads)
+        # В режиме конвейера нейросеть начинает обработку сразу, не дожидаясь запроса анализа
+        inference_pipeline.submit(analyse_id, stored)
         return {"success": True, "message": "Фотографии загружены"}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -210,10 +213,25 @@ async def upload_photos(
 @router.get("/analyse", response_model=SAnalyseResponse)
 async def get_analyse(analyse_id: int):
     try:
+        # Дожидаемся фотографий, которые конвейер еще обрабатывает
+        await inference_pipeline.wait(analyse_id)
         result = await CarRepository.analyse(analyse_id)
         return {
             "success": True,
             "details_analize": result
         }
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/analyse_status")
+async def get_analyse_status(analyse_id: int):
+    # Сколько фотографий анализа конвейер еще не обработал
+    pending = inference_pipeline.pending(analyse_id)
+    return {"analyse_id": analyse_id, "pending_images": pending, "ready": pending == 0}
+
+
+@router.get("/upstream_stats")
+async def get_upstream_stats():
+    # Состояние пулов соединений к нейросети и ГИБДД
+    return http_clients.stats()
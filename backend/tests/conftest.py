@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+
+
+
+# database.py создает engine при импорте, поэтому база для тестов задается до него
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
@@ -0,0 +1,127 @@
+import asyncio
+import io
+import os
+import pytest
+from fastapi import UploadFile
+from sqlalchemy import func, select
+from database import create_tables, delete_tables, engine, new_session
+from models.car import CarPartAnalysisOrm, ImageResultOrm
+from repositories.car import CarRepository
+
+
+
+
+def _neural_response(car_part: str) -> dict:
+    return {"report": [{"car_part": car_part, "defect_type": "Dent", "severity": 2, "confidence": 0.9}]}
+
+
+# Ответ нейросети зависит от содержимого фото
+RESPONSES = {b"hood": _neural_response("Hood"), b"bumper": _neural_response("Front-bumper"), b"roof": _neural_response("Roof")}
+
+
+@pytest.fixture
+def sent(monkeypatch, tmp_path):
+    """Подменяет нейросеть, возвращает список отправленных в нее фото"""
+    sent = []
+
+    async def fake_send_batch(cls, image_paths):
+        results = []
+        for path in image_paths:
+            with open(path, "rb") as f:
+                content = f.read()
+            sent.append(content)
+            results.append(RESPONSES[content])
+        return results
+
+    monkeypatch.setattr(CarRepository, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(CarRepository, "_send_batch_to_neural", classmethod(fake_send_batch))
+    return sent
+
+
+def _run(test):
+    async def run():
+        await delete_tables()
+        await create_tables()
+        try:
+            await test()
+        finally:
+            await engine.dispose()
+    asyncio.run(run())
+
+
+async def _upload(analyse_id: int, photos: list[tuple[bytes, str, str]]):
+    uploads = [(UploadFile(io.BytesIO(content)), position, filename) for content, position, filename in photos]
+    return await CarRepository.stream_upload_images(analyse_id, uploads)
+
+
+async def _count(model, analyse_id: int) -> int:
+    async with new_session() as session:
+        result = await session.execute(select(func.count()).select_from(model).where(model.analysis_id == analyse_id))
+        return result.scalar_one()
+
+
+def test_repeated_analyse_reuses_stored_results(sent):
+    async def test():
+        analyse_id = await CarRepository.create_analyse("VIN")
+        await _upload(analyse_id, [(b"hood", "front", "1_front.jpg"), (b"bumper", "front", "2_front.jpg")])
+
+        first = await CarRepository.analyse(analyse_id)
+        assert sorted(sent) == [b"bumper", b"hood"]
+
+        sent.clear()
+        second = await CarRepository.analyse(analyse_id)
+        assert sent == []
+        assert second.quality == first.quality
+        assert second.total_damage_score == pytest.approx(first.total_damage_score)
+        # Повторный анализ заменяет строки по деталям, а не дублирует их
+        assert await _count(CarPartAnalysisOrm, analyse_id) == 2
+
+    _run(test)
+
+
+def test_only_replaced_photo_is_sent_again(sent):
+    async def test():
+        analyse_id = await CarRepository.create_analyse("VIN")
+        await _upload(analyse_id, [(b"hood", "front", "1_front.jpg"), (b"bumper", "back", "2_back.jpg")])
+        await CarRepository.analyse(analyse_id)
+
+        sent.clear()
+        await _upload(analyse_id, [(b"roof", "front", "1_front.jpg")])
+        result = await CarRepository.analyse(analyse_id)
+        assert sent == [b"roof"]
+        assert set(result.car_parts) == {"Roof", "Front-bumper"}
+        # Результат замененного фото удален
+        assert await _count(ImageResultOrm, analyse_id) == 2
+
+    _run(test)
+
+
+def test_pipeline_results_are_reused(sent):
+    async def test():
+        analyse_id = await CarRepository.create_analyse("VIN")
+        stored = await _upload(analyse_id, [(b"hood", "front", "1_front.jpg")])
+        position, filename, _, content_hash = stored[0]
+        # Конвейер и analyse могут записать одну фотографию дважды
+        await CarRepository.save_image_result(analyse_id, position, filename, content_hash, RESPONSES[b"hood"])
+        await CarRepository.save_image_result(analyse_id, position, filename, content_hash, RESPONSES[b"hood"])
+        assert await _count(ImageResultOrm, analyse_id) == 1
+
+        result = await CarRepository.analyse(analyse_id)
+        assert sent == []
+        assert set(result.car_parts) == {"Hood"}
+
+    _run(test)
+
+
+def test_unfinished_uploads_are_ignored(sent):
+    async def test():
+        analyse_id = await CarRepository.create_analyse("VIN")
+        await _upload(analyse_id, [(b"hood", "front", "1_front.jpg")])
+        # Недописанный файл параллельной загрузки
+        with open(os.path.join(CarRepository.UPLOAD_DIR, str(analyse_id), "front", "2_front.jpg.part"), "wb") as f:
+            f.write(b"bumper")
+
+        await CarRepository.analyse(analyse_id)
+        assert sent == [b"hood"]
+
+    _run(test)
@@ -0,0 +1,83 @@
+import asyncio
+import httpx
+import pytest
+from repositories.car import CarRepository
+from utils.http_client import http_clients
+
+
+
+
+@pytest.fixture
+def neural(monkeypatch, tmp_path):
+    """
+    Подменяет транспорт клиента нейросервиса.
+    Возвращает (пути к фото, список запросов, словарь для настройки ответов).
+    """
+    paths = []
+    for index in range(4):
+        path = tmp_path / f"photo{index}.jpg"
+        path.write_bytes(b"photo")
+        paths.append(str(path))
+
+    requests = []
+    state = {"batch": [], "in_flight": 0, "max_in_flight": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        try:
+            await asyncio.sleep(0.01)
+            if request.url.path.endswith("_batch"):
+                if state["batch"]:
+                    return state["batch"].pop(0)
+                count = request.content.count(b'name="files"')
+                return httpx.Response(200, json={"results": [{"report": []}] * count})
+            return httpx.Response(200, json={"report": []})
+        finally:
+            state["in_flight"] -= 1
+
+    monkeypatch.setitem(http_clients._clients, "neural", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(CarRepository, "NEURAL_MAX_CONCURRENCY", 2)
+    return paths, requests, state
+
+
+async def _collect(paths):
+    results = [None] * len(paths)
+    async for offset, responses in CarRepository._iter_neural_responses(paths):
+        results[offset:offset + len(responses)] = responses
+    return results
+
+
+def test_payload_error_falls_back_to_concurrent_single_requests(neural):
+    paths, requests, state = neural
+    state["batch"] = [httpx.Response(413), httpx.Response(413)]
+
+    results = asyncio.run(_collect(paths))
+
+    assert results == [{"report": []}] * 4
+    assert sum(1 for path in requests if path.endswith("_batch")) == 2
+    assert sum(1 for path in requests if path.endswith("find_defects")) == 4
+    # Одиночные запросы идут параллельно, но не больше NEURAL_MAX_CONCURRENCY
+    assert state["max_in_flight"] == 2
+
+
+def test_busy_service_retries_batch_after_retry_after(neural):
+    paths, requests, state = neural
+    state["batch"] = [httpx.Response(503, headers={"Retry-After": "0"}), httpx.Response(429, headers={"Retry-After": "0"})]
+
+    results = asyncio.run(_collect(paths))
+
+    assert results == [{"report": []}] * 4
+    assert len(requests) == 4
+    assert all(path.endswith("_batch") for path in requests)
+
+
+def test_server_error_does_not_fall_back(neural):
+    paths, requests, state = neural
+    state["batch"] = [httpx.Response(500), httpx.Response(500)]
+
+    results = asyncio.run(_collect(paths))
+
+    assert results == [None] * 4
+    assert all(path.endswith("_batch") for path in requests)
@@ -0,0 +1,54 @@
+import asyncio
+from utils.upload_limit import UploadSizeLimitMiddleware
+
+
+
+
+async def _echo_app(scope, receive, send):
+    """Читает тело целиком и отвечает 200"""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise RuntimeError("client disconnected")
+        if not message.get("more_body", False):
+            break
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def _call(path, chunks, content_length=None):
+    """Отправляет тело кусками, возвращает статус и сколько кусков прочитано"""
+    middleware = UploadSizeLimitMiddleware(_echo_app, max_body_size=100)
+    headers = [] if content_length is None else [(b"content-length", str(content_length).encode())]
+    scope = {"type": "http", "path": path, "headers": headers}
+    pending = list(chunks)
+    pulled = 0
+    sent = []
+
+    async def receive():
+        nonlocal pulled
+        pulled += 1
+        body = pending.pop(0)
+        return {"type": "http.request", "body": body, "more_body": bool(pending)}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return sent[0]["status"], pulled
+
+
+def test_upload_within_limit_passes():
+    assert _call("/api/upload", [b"x" * 50, b"x" * 50]) == (200, 2)
+
+
+def test_declared_length_over_limit_is_rejected_unread():
+    assert _call("/api/upload", [b"x" * 200], content_length=200) == (413, 0)
+
+
+def test_streamed_upload_stops_at_first_chunk_over_limit():
+    assert _call("/api/upload", [b"x" * 60] * 10) == (413, 2)
+
+
+def test_other_routes_are_not_limited():
+    assert _call("/api/analyse", [b"x" * 60] * 10) == (200, 10)
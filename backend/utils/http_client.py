@@ -0,0 +1,133 @@
+import os
+import httpx
+from dotenv import load_dotenv
+from typing import Dict
+
+
+
+
+load_dotenv()
+
+# Лимиты соединений и таймауты для каждого внешнего сервиса
+NEURAL_MAX_CONNECTIONS = int(os.getenv('NEURAL_MAX_CONNECTIONS', 8))
+NEURAL_TIMEOUT = float(os.getenv('NEURAL_TIMEOUT', 30.0))  # На одно изображение
+GIBDD_MAX_CONNECTIONS = int(os.getenv('GIBDD_MAX_CONNECTIONS', 4))
+GIBDD_TIMEOUT = float(os.getenv('GIBDD_TIMEOUT', 10.0))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5.0))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 30.0))  # Сколько держать простаивающее соединение
+HTTP2_ENABLED = os.getenv('HTTP2_ENABLED', 'false').lower() == 'true'  # Пакет h2 есть в requirements.txt
+
+
+class UpstreamClients:
+    """
+    Общие httpx.AsyncClient для внешних сервисов, по одному на сервис.
+    Соединения переиспользуются между запросами (keep-alive), поэтому
+    каждый запрос не платит за установку TCP-соединения.
+    Клиенты создаются в lifespan приложения и закрываются при остановке.
+    """
+
+    UPSTREAMS = {
+        "neural": (NEURAL_MAX_CONNECTIONS, NEURAL_TIMEOUT),
+        "gibdd": (GIBDD_MAX_CONNECTIONS, GIBDD_TIMEOUT),
+    }
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._requests: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self.http2 = False
+
+    @staticmethod
+    def _http2_available() -> bool:
+        try:
+            import h2  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def _create_client(self, name: str) -> httpx.AsyncClient:
+        max_connections, timeout = self.UPSTREAMS[name]
+
+        async def count_request(request: httpx.Request):
+            self._requests[name] = self._requests.get(name, 0) + 1
+
+        async def count_response(response: httpx.Response):
+            if response.status_code >= 500:
+                self._errors[name] = self._errors.get(name, 0) + 1
+
+        return httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            ),
+            # Ожидание свободного соединения в пуле считаем частью таймаута запроса
+            timeout=httpx.Timeout(timeout, connect=HTTP_CONNECT_TIMEOUT),
+            event_hooks={"request": [count_request], "response": [count_response]}
+        )
+
+    def start(self):
+        if HTTP2_ENABLED and not self._http2_available():
+            print("HTTP/2 включен, но пакет h2 не установлен, используется HTTP/1.1")
+        self.http2 = HTTP2_ENABLED and self._http2_available()
+        for name in self.UPSTREAMS:
+            if name not in self._clients:
+                self._clients[name] = self._create_client(name)
+
+    async def close(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """
+        Возвращает клиент сервиса.
+        Вне приложения (скрипты, тесты) клиенты создаются при первом обращении.
+        """
+        if name not in self._clients:
+            self.start()
+        return self._clients[name]
+
+    def timeout(self, name: str, scale: int = 1) -> httpx.Timeout:
+        """Таймаут сервиса, увеличенный в scale раз (для пакетных запросов)"""
+        _, timeout = self.UPSTREAMS[name]
+        return httpx.Timeout(timeout * max(1, scale), connect=HTTP_CONNECT_TIMEOUT)
+
+    @staticmethod
+    def _pool_stats(client: httpx.AsyncClient) -> Dict:
+        """
+        Соединения в пуле клиента.
+        httpx не отдаёт пул публично, поэтому смотрим в транспорт httpcore,
+        только если он устроен как ожидается. Иначе (другая версия httpx,
+        свой транспорт) возвращаем пустой словарь.
+        """
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if not isinstance(connections, list):
+            return {}
+        try:
+            idle = sum(1 for connection in connections if connection.is_idle())
+        except AttributeError:
+            return {}
+        return {
+            "connections": len(connections),
+            "active_connections": len(connections) - idle,
+            "idle_connections": idle,
+        }
+
+    def stats(self) -> Dict:
+        """Состояние пулов соединений по каждому сервису"""
+        result = {}
+        for name, client in self._clients.items():
+            result[name] = {
+                "max_connections": self.UPSTREAMS[name][0],
+                **self._pool_stats(client),
+                "requests": self._requests.get(name, 0),
+                "server_errors": self._errors.get(name, 0),
+                "http2": self.http2,
+            }
+        return result
+
+
+http_clients = UpstreamClients()
@@ -0,0 +1,103 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+from typing import Dict, List, Optional, Tuple
+from repositories.car import CarRepository
+
+
+
+
+load_dotenv()
+
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'false').lower() == 'true'  # Запускать нейросеть сразу при загрузке
+PIPELINE_WORKERS = int(os.getenv('PIPELINE_WORKERS', 4))  # Одновременных запросов к нейросети из конвейера
+
+
+class InferencePipeline:
+    """
+    Фоновая обработка фотографий сразу после загрузки.
+    /api/upload ставит каждую сохраненную фотографию в очередь, воркеры
+    отправляют их в нейросеть и сохраняют ответы в image_results
+    (по позиции и SHA-256 фотографии).
+    GET /api/analyse дожидается незавершенных фотографий своего анализа и
+    собирает оценку из сохраненных ответов.
+    Очередь живет в памяти процесса: после перезапуска необработанные
+    фотографии будут отправлены в нейросеть при вызове analyse.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Dict[int, int] = {}
+        self._done_events: Dict[int, asyncio.Event] = {}
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        # Никто больше не обработает оставшиеся фотографии, analyse отправит их сам
+        for event in self._done_events.values():
+            event.set()
+        self._pending.clear()
+        self._done_events.clear()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def submit(self, analyse_id: int, images: List[Tuple[str, str, str, str]]):
+        """
+        Ставит фотографии анализа в очередь.
+        images - список (позиция, имя файла, путь к файлу, SHA-256 содержимого).
+        """
+        if not self.running or not images:
+            return
+        self._pending[analyse_id] = self._pending.get(analyse_id, 0) + len(images)
+        self._done_events.setdefault(analyse_id, asyncio.Event()).clear()
+        for position, filename, image_path, content_hash in images:
+            self._queue.put_nowait((analyse_id, position, filename, image_path, content_hash))
+
+    def pending(self, analyse_id: int) -> int:
+        """Сколько фотографий анализа еще в очереди или в работе"""
+        return self._pending.get(analyse_id, 0)
+
+    async def wait(self, analyse_id: int):
+        """Дожидается обработки всех поставленных в очередь фотографий анализа"""
+        event = self._done_events.get(analyse_id)
+        if event is not None:
+            await event.wait()
+
+    def _finish(self, analyse_id: int):
+        self._pending[analyse_id] -= 1
+        if self._pending[analyse_id] == 0:
+            del self._pending[analyse_id]
+            self._done_events.pop(analyse_id).set()
+
+    async def _work(self):
+        while True:
+            analyse_id, position, filename, image_path, content_hash = await self._queue.get()
+            try:
+                # Та же фотография уже обработана (повторная загрузка)
+                if await CarRepository.has_image_result(analyse_id, position, content_hash):
+                    continue
+                neural_response = await CarRepository._request_neural(image_path)
+                # Ошибки не сохраняем, такие фотографии analyse отправит повторно
+                if neural_response is not None:
+                    await CarRepository.save_image_result(analyse_id, position, filename, content_hash, neural_response)
+            except Exception as e:
+                print(f"Pipeline error for {image_path}: {str(e)}")
+            finally:
+                self._finish(analyse_id)
+                self._queue.task_done()
+
+
+inference_pipeline = InferencePipeline(PIPELINE_WORKERS)
@@ -0,0 +1,85 @@
+import json
+from typing import Any, Callable, Dict
+
+
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware, ограничивающее размер тела запроса на загрузку фотографий.
+    Starlette разбирает multipart и складывает файлы во временные файлы еще до
+    вызова обработчика, поэтому проверки в CarRepository срабатывают только
+    после того, как тело получено целиком. Здесь тело считается по мере чтения:
+    запрос с Content-Length больше лимита отклоняется сразу, а при потоковой
+    передаче чтение прерывается на первом куске, превысившем лимит, и клиент
+    получает 413.
+    Ограничивается весь запрос. Лимит на один файл (MAX_UPLOAD_FILE_SIZE)
+    проверяется уже при копировании, так что до отказа на диск может попасть
+    не больше max_body_size байт.
+    """
+
+    def __init__(self, app: Callable, max_body_size: int, paths: tuple = ("/api/upload",)):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.paths = set(paths)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http" or scope["path"].rstrip("/") not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_body_size:
+                await self._reject(send)
+                return
+
+        received = 0
+        too_large = False
+        response_started = False
+
+        async def limited_receive() -> Dict[str, Any]:
+            nonlocal received, too_large
+            if too_large:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    # Дальше не читаем, приложение увидит разрыв соединения
+                    too_large = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def tracked_send(message: Dict[str, Any]):
+            nonlocal response_started
+            # Ответ приложения на оборванный запрос заменяем на 413
+            if too_large and not response_started:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except Exception:
+            if not too_large or response_started:
+                raise
+
+        if too_large and not response_started:
+            await self._reject(send)
+
+    async def _reject(self, send: Callable):
+        body = json.dumps(
+            {"detail": f"Суммарный размер фотографий больше {self.max_body_size // (1024 * 1024)} МБ"},
+            ensure_ascii=False
+        ).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
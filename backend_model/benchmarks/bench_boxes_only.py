@@ -0,0 +1,94 @@
+"""
+Latency and peak memory of boxes-only inference versus full Mask R-CNN
+
+Each mode runs in its own subprocess (so peak RSS is measured independently),
+loads the real models through ModelManager and runs detect_defects over the
+same images.
+
+Usage (from backend_model/):
+    python -m benchmarks.bench_boxes_only --images path/to/photos --repeat 3
+    python -m benchmarks.bench_boxes_only --synthetic 10
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+MODES = {"masks": "false", "boxes_only": "true"}
+
+def load_images(images_dir: str, synthetic: int) -> List:
+    """Load benchmark images from a directory, or generate synthetic ones"""
+    import numpy as np
+    from PIL import Image
+
+    if images_dir:
+        paths = sorted(p for p in Path(images_dir).iterdir() if p.suffix.lower() in {".jpg", ".jpeg", ".png"})
+        return [Image.open(p).convert("RGB") for p in paths]
+
+    generator = np.random.default_rng(0)
+    return [
+        Image.fromarray(generator.integers(0, 255, (1080, 1440, 3), dtype=np.uint8))
+        for _ in range(synthetic)
+    ]
+
+def run_worker(args: argparse.Namespace) -> None:
+    """Measure one mode in the current process and print the results as JSON"""
+    from src.services.model_service import model_manager
+    from src.services.detection_service import detection_service
+
+    if not model_manager.load_models():
+        raise SystemExit("Failed to load models")
+
+    images = load_images(args.images, args.synthetic)
+    detection_service.detect_defects(images[0])  # warm-up
+
+    latencies = []
+    for _ in range(args.repeat):
+        for image in images:
+            start_time = time.perf_counter()
+            detection_service.detect_defects(image)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+
+    print(json.dumps({
+        "p50_ms": statistics.median(latencies),
+        "mean_ms": statistics.fmean(latencies),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "samples": len(latencies)
+    }))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default="", help="Directory with benchmark photos")
+    parser.add_argument("--synthetic", type=int, default=10, help="Synthetic images when --images is not given")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the image set")
+    parser.add_argument("--worker", choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    results: Dict[str, Dict] = {}
+    for mode, boxes_only in MODES.items():
+        command = [sys.executable, "-m", "benchmarks.bench_boxes_only", "--worker", mode,
+                   "--images", args.images, "--synthetic", str(args.synthetic), "--repeat", str(args.repeat)]
+        env = dict(os.environ, BOXES_ONLY=boxes_only)
+        output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    masks, boxes = results["masks"], results["boxes_only"]
+    print(f"{'mode':<12}{'p50 ms':>10}{'mean ms':>10}{'peak RSS MB':>14}")
+    for mode, result in results.items():
+        print(f"{mode:<12}{result['p50_ms']:>10.1f}{result['mean_ms']:>10.1f}{result['peak_rss_mb']:>14.1f}")
+    print(f"p50 latency saved: {masks['p50_ms'] - boxes['p50_ms']:.1f} ms "
+          f"({(1 - boxes['p50_ms'] / masks['p50_ms']) * 100:.1f}%)")
+    print(f"peak RSS saved:    {masks['peak_rss_mb'] - boxes['peak_rss_mb']:.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Micro-benchmark for detection post-processing (thresholding + damage-to-part matching)
+
+Compares the vectorized DefectDetectionService path against the previous
+per-detection Python loops on dense synthetic scenes, and checks that both
+return exactly the same matches.
+
+Usage (from backend_model/):
+    python -m benchmarks.bench_matching --parts 300 --damages 300 --repeat 50
+"""
+import argparse
+import statistics
+import time
+from typing import Dict, List, Tuple
+import torch
+from benchmarks.fake_predictors import make_predictions
+from src.config.settings import settings
+from src.services.detection_service import DefectDetectionService
+
+def legacy_post_process(service: DefectDetectionService, parts_predictions: Dict, damage_predictions: Dict) -> List[Tuple[str, str, float]]:
+    """Previous implementation: per-detection thresholding and a double IoU loop"""
+    parts_detections = []
+    if len(parts_predictions['instances']) > 0:
+        parts_scores = parts_predictions['instances'].scores.cpu().numpy()
+        parts_boxes = parts_predictions['instances'].pred_boxes.tensor.cpu().numpy()
+        parts_classes = parts_predictions['instances'].pred_classes.cpu().numpy()
+        for score, box, class_id in zip(parts_scores, parts_boxes, parts_classes):
+            if score > settings.PARTS_MODEL_THRESHOLD:
+                part_name = service.id_to_part_name.get(class_id, f"Unknown_Part_{class_id}")
+                parts_detections.append((score, box.tolist(), part_name))
+
+    damage_detections = []
+    if len(damage_predictions['instances']) > 0:
+        damage_scores = damage_predictions['instances'].scores.cpu().numpy()
+        damage_boxes = damage_predictions['instances'].pred_boxes.tensor.cpu().numpy()
+        damage_classes = damage_predictions['instances'].pred_classes.cpu().numpy()
+        for score, box, class_id in zip(damage_scores, damage_boxes, damage_classes):
+            if score > settings.DAMAGE_MODEL_THRESHOLD:
+                damage_type = settings.DAMAGE_CATEGORIES.get(class_id, f"Unknown_Damage_{class_id}")
+                damage_detections.append((score, box.tolist(), damage_type))
+
+    matched_defects = []
+    for damage_score, damage_box, damage_type in damage_detections:
+        best_match_part = "Unknown"
+        best_iou = 0.0
+        for part_score, part_box, part_type in parts_detections:
+            iou = service.compute_iou(damage_box, part_box)
+            if iou > best_iou and iou > 0.1:
+                best_iou = iou
+                best_match_part = part_type
+        if best_iou > 0.1:
+            matched_defects.append((damage_type, best_match_part, damage_score))
+    return matched_defects
+
+def vectorized_post_process(service: DefectDetectionService, parts_predictions: Dict, damage_predictions: Dict) -> List[Tuple[str, str, float]]:
+    """Current implementation"""
+    return service._match_damage_to_parts(
+        service._extract_damages(damage_predictions),
+        service._extract_parts(parts_predictions)
+    )
+
+def time_call(func, repeat: int) -> List[float]:
+    """Run func `repeat` times and return wall times in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start_time) * 1000)
+    return samples
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parts", type=int, default=300, help="Parts detections per image")
+    parser.add_argument("--damages", type=int, default=300, help="Damage detections per image")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed iterations")
+    parser.add_argument("--scenes", type=int, default=20, help="Random scenes checked for identical output")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    service = DefectDetectionService()
+    generator = torch.Generator().manual_seed(args.seed)
+
+    def scene():
+        return (
+            make_predictions(args.parts, settings.PARTS_MODEL_NUM_CLASSES, 1920, 1080, generator),
+            make_predictions(args.damages, settings.DAMAGE_MODEL_NUM_CLASSES, 1920, 1080, generator),
+        )
+
+    for _ in range(args.scenes):
+        parts_predictions, damage_predictions = scene()
+        expected = legacy_post_process(service, parts_predictions, damage_predictions)
+        actual = vectorized_post_process(service, parts_predictions, damage_predictions)
+        assert actual == expected, "Vectorized post-processing differs from the legacy implementation"
+    print(f"Output identical to legacy implementation on {args.scenes} random scenes")
+
+    parts_predictions, damage_predictions = scene()
+    legacy = time_call(lambda: legacy_post_process(service, parts_predictions, damage_predictions), args.repeat)
+    vectorized = time_call(lambda: vectorized_post_process(service, parts_predictions, damage_predictions), args.repeat)
+
+    legacy_ms = statistics.median(legacy)
+    vectorized_ms = statistics.median(vectorized)
+    print(f"{args.parts} parts x {args.damages} damages, median of {args.repeat} runs:")
+    print(f"  legacy:     {legacy_ms:9.3f} ms")
+    print(f"  vectorized: {vectorized_ms:9.3f} ms")
+    print(f"  speedup:    {legacy_ms / vectorized_ms:9.1f}x")
+
+if __name__ == "__main__":
+    main()
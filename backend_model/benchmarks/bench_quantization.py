@@ -0,0 +1,150 @@
+"""
+Speed and accuracy drift of INT8 quantized models versus FP32
+
+Loads both models in FP32 and in INT8, runs them over a fixed image set and
+compares them. The INT8 models are calibrated on the same image set and saved
+to the cache QUANTIZE_INT8=true loads from, so the numbers describe exactly
+the models the service will run:
+- per-model latency
+- per-model detections above threshold: INT8 detections matched to FP32
+  detections of the same class with IoU >= 0.5 (precision / recall against
+  FP32), score and box drift of the matched pairs
+- final reports: share of images whose (defect, part) list is unchanged
+
+Usage (from backend_model/):
+    python -m benchmarks.bench_quantization --images path/to/photos --output drift.json
+    python -m benchmarks.bench_quantization --synthetic 10
+"""
+import argparse
+import json
+import statistics
+import time
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np
+import torch
+from detectron2.engine import DefaultPredictor
+
+from benchmarks.bench_boxes_only import load_images
+from src.config.settings import settings
+from src.services.detection_service import DefectDetectionService, Detections
+from src.services.model_service import ModelManager
+from src.services.quantization import load_quantized_predictor
+from src.utils.image_utils import ImageProcessor
+
+MATCH_IOU = 0.5
+
+def match_detections(reference: Detections, candidate: Detections) -> Dict[str, float]:
+    """Greedily match candidate detections to same-class reference detections"""
+    matched_scores, matched_ious = [], []
+    if len(reference.labels) and len(candidate.labels):
+        iou = DefectDetectionService.compute_iou_matrix(candidate.boxes, reference.boxes)
+        same_class = np.array(candidate.labels)[:, None] == np.array(reference.labels)[None, :]
+        iou = np.where(same_class, iou, 0.0)
+        used = set()
+        for index in np.argsort(-candidate.scores):
+            for ref_index in np.argsort(-iou[index]):
+                if iou[index, ref_index] < MATCH_IOU:
+                    break
+                if ref_index not in used:
+                    used.add(ref_index)
+                    matched_scores.append(abs(float(candidate.scores[index]) - float(reference.scores[ref_index])))
+                    matched_ious.append(float(iou[index, ref_index]))
+                    break
+    return {
+        "reference": len(reference.labels),
+        "candidate": len(candidate.labels),
+        "matched": len(matched_scores),
+        "score_abs_diff": matched_scores,
+        "box_iou": matched_ious,
+    }
+
+def summarize(name: str, fp32_ms: List[float], int8_ms: List[float], matches: List[Dict]) -> Dict:
+    """Aggregate latency and drift of one model over the image set"""
+    reference = sum(m["reference"] for m in matches)
+    candidate = sum(m["candidate"] for m in matches)
+    matched = sum(m["matched"] for m in matches)
+    score_diffs = [d for m in matches for d in m["score_abs_diff"]]
+    ious = [d for m in matches for d in m["box_iou"]]
+    return {
+        "model": name,
+        "fp32_p50_ms": statistics.median(fp32_ms),
+        "int8_p50_ms": statistics.median(int8_ms),
+        "speedup": statistics.median(fp32_ms) / statistics.median(int8_ms),
+        "fp32_detections": reference,
+        "int8_detections": candidate,
+        "precision_vs_fp32": matched / candidate if candidate else 1.0,
+        "recall_vs_fp32": matched / reference if reference else 1.0,
+        "mean_score_abs_diff": statistics.fmean(score_diffs) if score_diffs else 0.0,
+        "max_score_abs_diff": max(score_diffs, default=0.0),
+        "mean_matched_iou": statistics.fmean(ious) if ious else 1.0,
+    }
+
+def timed(predictor: DefaultPredictor, image_array: np.ndarray, latencies: List[float]):
+    start_time = time.perf_counter()
+    predictions = predictor(image_array)
+    latencies.append((time.perf_counter() - start_time) * 1000)
+    return predictions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default="", help="Directory with the fixed evaluation photos")
+    parser.add_argument("--synthetic", type=int, default=10, help="Synthetic images when --images is not given")
+    parser.add_argument("--output", default="", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    ModelManager._configure_cpu_threads()
+    service = DefectDetectionService()
+    extractors = {"Parts Detection": service._extract_parts, "Damage Detection": service._extract_damages}
+    image_arrays = [ImageProcessor.to_model_input(image) for image in load_images(args.images, args.synthetic)]
+
+    predictions: Dict[str, Dict[str, List]] = {}
+    models = []
+    for model_name, cfg in ModelManager.build_model_cfgs():
+        cfg.MODEL.DEVICE = "cpu"
+        fp32 = DefaultPredictor(cfg)
+        int8 = load_quantized_predictor(cfg, model_name, calibration_images=image_arrays, force=True)
+        fp32(image_arrays[0]), int8(image_arrays[0])  # warm-up
+
+        fp32_ms, int8_ms, matches = [], [], []
+        predictions[model_name] = {"fp32": [], "int8": []}
+        with torch.no_grad():
+            for image_array in image_arrays:
+                fp32_predictions = timed(fp32, image_array, fp32_ms)
+                int8_predictions = timed(int8, image_array, int8_ms)
+                predictions[model_name]["fp32"].append(fp32_predictions)
+                predictions[model_name]["int8"].append(int8_predictions)
+                matches.append(match_detections(
+                    extractors[model_name](fp32_predictions), extractors[model_name](int8_predictions)
+                ))
+        models.append(summarize(model_name, fp32_ms, int8_ms, matches))
+
+    parts, damage = predictions["Parts Detection"], predictions["Damage Detection"]
+    unchanged = 0
+    for index in range(len(image_arrays)):
+        fp32_report = service._build_report(parts["fp32"][index], damage["fp32"][index])
+        int8_report = service._build_report(parts["int8"][index], damage["int8"][index])
+        key = lambda report: Counter((defect.defect_type, defect.car_part) for defect in report)
+        unchanged += key(fp32_report) == key(int8_report)
+
+    results = {
+        "images": len(image_arrays),
+        "thresholds": {"parts": settings.PARTS_MODEL_THRESHOLD, "damage": settings.DAMAGE_MODEL_THRESHOLD},
+        "models": models,
+        "reports_unchanged": unchanged / len(image_arrays),
+    }
+
+    print(f"{'model':<18}{'fp32 ms':>9}{'int8 ms':>9}{'speedup':>9}{'prec':>7}{'recall':>8}{'|dscore|':>10}{'IoU':>7}")
+    for model in models:
+        print(f"{model['model']:<18}{model['fp32_p50_ms']:>9.1f}{model['int8_p50_ms']:>9.1f}{model['speedup']:>8.2f}x"
+              f"{model['precision_vs_fp32']:>7.3f}{model['recall_vs_fp32']:>8.3f}"
+              f"{model['mean_score_abs_diff']:>10.4f}{model['mean_matched_iou']:>7.3f}")
+    print(f"images with unchanged defect report: {results['reports_unchanged'] * 100:.1f}% of {len(image_arrays)}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Stub predictors that stand in for the Detectron2 models in benchmarks
+
+They follow the DefaultPredictor interface used by DefectDetectionService
+(predictor(image) -> {"instances": Instances}, plus predict_batch) and return
+synthetic detections of configurable density, so the serving path can be
+measured without model weights or a GPU.
+"""
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import torch
+from detectron2.structures import Boxes, Instances
+
+from src.config.settings import settings
+from src.services.model_service import ModelManager, ModelSlot
+
+def make_predictions(count: int, num_classes: int, width: int, height: int, generator: torch.Generator) -> Dict:
+    """Build a synthetic predictor output with `count` random detections"""
+    x1 = torch.rand(count, generator=generator) * width * 0.9
+    y1 = torch.rand(count, generator=generator) * height * 0.9
+    w = torch.rand(count, generator=generator) * width * 0.3 + 1
+    h = torch.rand(count, generator=generator) * height * 0.3 + 1
+    boxes = torch.stack([x1, y1, (x1 + w).clamp(max=width), (y1 + h).clamp(max=height)], dim=1)
+
+    instances = Instances((height, width))
+    instances.pred_boxes = Boxes(boxes)
+    instances.scores = torch.rand(count, generator=generator)
+    instances.pred_classes = torch.randint(0, num_classes, (count,), generator=generator)
+    return {"instances": instances}
+
+class FakePredictor:
+    """
+    DefaultPredictor stand-in returning `density` random detections per image
+
+    Outputs are generated once per image size and reused, so timings measure
+    the code around the model rather than the stub. latency_ms adds a sleep
+    per image to mimic model time when measuring the endpoint under load.
+    """
+
+    input_format = "BGR"
+
+    def __init__(self, num_classes: int, density: int, latency_ms: float = 0.0, seed: int = 0):
+        self.num_classes = num_classes
+        self.density = density
+        self.latency_ms = latency_ms
+        self.seed = seed
+        self._outputs: Dict[Tuple[int, int], Dict[str, Any]] = {}
+
+    def _predict(self, image_array: np.ndarray) -> Dict[str, Any]:
+        height, width = image_array.shape[:2]
+        predictions = self._outputs.get((height, width))
+        if predictions is None:
+            generator = torch.Generator().manual_seed(self.seed)
+            predictions = make_predictions(self.density, self.num_classes, width, height, generator)
+            self._outputs[(height, width)] = predictions
+        return predictions
+
+    def __call__(self, image_array: np.ndarray) -> Dict[str, Any]:
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000)
+        return self._predict(image_array)
+
+    def predict_batch(self, image_arrays: List[np.ndarray]) -> List[Dict[str, Any]]:
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms * len(image_arrays) / 1000)
+        return [self._predict(image_array) for image_array in image_arrays]
+
+def install_fake_predictors(
+    manager: ModelManager,
+    parts_density: int,
+    damage_density: int,
+    latency_ms: float = 0.0,
+    seed: int = 0
+) -> Tuple[FakePredictor, FakePredictor]:
+    """Activate a model slot holding stub predictors"""
+    parts_predictor = FakePredictor(settings.PARTS_MODEL_NUM_CLASSES, parts_density, latency_ms, seed)
+    damage_predictor = FakePredictor(settings.DAMAGE_MODEL_NUM_CLASSES, damage_density, latency_ms, seed + 1)
+    manager.activate(ModelSlot(
+        version=f"fake-{parts_density}-{damage_density}-{seed}",
+        sources={"parts": "fake", "damage": "fake"},
+        parts_predictor=parts_predictor,
+        damage_predictor=damage_predictor
+    ))
+    return parts_predictor, damage_predictor
@@ -0,0 +1,282 @@
+"""
+Benchmark suite for the detection serving path, using fake predictors
+
+Runs without model weights: the Detectron2 predictors are replaced by
+FakePredictor stubs returning synthetic detections of configurable density,
+so the suite measures the code around the models. Cases:
+- decode_<W>x<H>: ImageProcessor.decode_image_from_upload on a JPEG upload
+- match: DefectDetectionService._match_damage_to_parts on extracted detections
+- postprocess: DefectDetectionService._build_report (thresholding + matching
+  + report building)
+- detect_defects: DefectDetectionService.detect_defects on a decoded image
+- endpoint: POST /api/v1/find_defects through an in-process ASGI client with
+  the result cache disabled, and endpoint_cached with the cache enabled
+
+Every case reports p50/p95/p99/mean latency over --repeat timed calls and,
+from a separate pass under tracemalloc, the median peak of Python-tracked
+memory allocated per call. Results are written as JSON together with the git
+commit and configuration, and --compare prints the change against a previous
+results file.
+
+Usage (from backend_model/):
+    python -m benchmarks.run_suite --output bench-$(git rev-parse --short HEAD).json
+    python -m benchmarks.run_suite --parts-density 100 --damage-density 50 --cases match,postprocess
+    python -m benchmarks.run_suite --compare bench-base.json --output bench-new.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import torch
+from fastapi import UploadFile
+from PIL import Image
+from starlette.datastructures import Headers
+
+from benchmarks.fake_predictors import install_fake_predictors
+from src.config.settings import settings
+
+CASES = ("decode", "match", "postprocess", "detect_defects", "endpoint")
+
+def make_jpeg(width: int, height: int, seed: int = 0) -> bytes:
+    """Encode a photo-like synthetic JPEG (smooth gradients plus mild noise)"""
+    generator = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    pixels = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=2)
+    pixels += generator.normal(0, 6, pixels.shape).astype(np.float32)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels.clip(0, 255).astype(np.uint8)).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def make_upload(data: bytes, filename: str = "car.jpg") -> UploadFile:
+    """Wrap bytes the way Starlette stores a multipart upload"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(data)
+    spooled.seek(0)
+    return UploadFile(file=spooled, size=len(data), filename=filename, headers=Headers({"content-type": "image/jpeg"}))
+
+def measure(func: Callable[[], object], repeat: int, warmup: int, alloc_repeat: int) -> Dict[str, float]:
+    """Time `func` and measure its per-call allocation peak"""
+    for _ in range(warmup):
+        func()
+
+    latencies = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start_time) * 1000)
+
+    # Separate pass: tracing slows every allocation down and would skew the timings
+    peaks = []
+    if alloc_repeat > 0:
+        tracemalloc.start()
+        try:
+            for _ in range(alloc_repeat):
+                tracemalloc.reset_peak()
+                baseline, _ = tracemalloc.get_traced_memory()
+                func()
+                _, peak = tracemalloc.get_traced_memory()
+                peaks.append((peak - baseline) / 1024)
+        finally:
+            tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "samples": len(latencies),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "mean_ms": round(statistics.fmean(latencies), 4),
+        "min_ms": round(min(latencies), 4),
+        "alloc_peak_kib": round(statistics.median(peaks), 1) if peaks else None,
+    }
+
+def git_revision() -> Dict[str, object]:
+    """Commit the results were measured on, and whether the tree had local changes"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+def run_endpoint_cases(data: bytes, record: Callable[[str, Callable[[], object]], None]) -> None:
+    """Benchmark POST /find_defects through an in-process ASGI client"""
+    import httpx
+    from main import app
+    from src.services.batch_scheduler import inference_scheduler
+    from src.services.inference_executor import inference_executor
+    from src.services.result_cache import result_cache
+
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+    async def start() -> None:
+        # ASGITransport does not run the lifespan, so start what it would have
+        await inference_executor.start()
+        if settings.BATCH_SCHEDULER_ENABLED:
+            inference_scheduler.start()
+
+    async def stop() -> None:
+        await client.aclose()
+        await inference_scheduler.stop()
+        inference_executor.shutdown()
+
+    def post() -> None:
+        response = loop.run_until_complete(client.post(
+            "/api/v1/find_defects", files={"file": ("car.jpg", data, "image/jpeg")}
+        ))
+        if response.status_code != 200:
+            raise RuntimeError(f"find_defects returned {response.status_code}: {response.text}")
+
+    cache_enabled = settings.RESULT_CACHE_ENABLED
+    loop.run_until_complete(start())
+    try:
+        settings.RESULT_CACHE_ENABLED = False
+        record("endpoint", post)
+        settings.RESULT_CACHE_ENABLED = True
+        result_cache.clear()
+        record("endpoint_cached", post)
+    finally:
+        settings.RESULT_CACHE_ENABLED = cache_enabled
+        loop.run_until_complete(stop())
+        loop.close()
+
+def compare(results: Dict, baseline_path: str) -> None:
+    """Print latency changes against a previous results file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    base_commit = (baseline.get("meta", {}).get("git", {}).get("commit") or "?")[:10]
+    print(f"\nchange vs {baseline_path} ({base_commit}), negative is faster:")
+    print(f"{'case':<24}{'p50 base':>10}{'p50 new':>10}{'delta':>9}{'p99 delta':>11}")
+    for name, case in results["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            print(f"{name:<24}{'-':>10}{case['p50_ms']:>10.3f}{'new':>9}")
+            continue
+        delta = lambda key: (case[key] - base[key]) / base[key] * 100 if base[key] else 0.0
+        print(f"{name:<24}{base['p50_ms']:>10.3f}{case['p50_ms']:>10.3f}{delta('p50_ms'):>8.1f}%{delta('p99_ms'):>10.1f}%")
+
+def parse_sizes(value: str) -> List[Tuple[int, int]]:
+    sizes = []
+    for item in value.split(","):
+        width, height = item.lower().split("x")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", default=",".join(CASES), help="Comma-separated cases to run")
+    parser.add_argument("--parts-density", type=int, default=40, help="Raw parts detections per image")
+    parser.add_argument("--damage-density", type=int, default=20, help="Raw damage detections per image")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated model time per image")
+    parser.add_argument("--decode-sizes", default="1280x960,4000x3000", help="JPEG sizes for the decode cases")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed calls per case")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed calls per case")
+    parser.add_argument("--alloc-repeat", type=int, default=20, help="Calls traced for allocations (0 disables)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", default="", help="Previous results file to compare against")
+    args = parser.parse_args()
+
+    cases = [case.strip() for case in args.cases.split(",") if case.strip()]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))} (choose from {', '.join(CASES)})")
+    if "endpoint" in cases and settings.INFERENCE_EXECUTOR_MODE != "thread":
+        parser.error("the endpoint case needs INFERENCE_EXECUTOR_MODE=thread, fake predictors only exist in this process")
+
+    # Per-request INFO logs would dominate the fast cases
+    logging.disable(logging.INFO)
+
+    from src.services.detection_service import detection_service
+    from src.services.model_service import model_manager
+    from src.utils.image_utils import ImageProcessor
+
+    parts_predictor, damage_predictor = install_fake_predictors(
+        model_manager, args.parts_density, args.damage_density, args.latency_ms, args.seed
+    )
+
+    results: Dict[str, Dict] = {"cases": {}}
+
+    def record(name: str, func: Callable[[], object]) -> None:
+        results["cases"][name] = measure(func, args.repeat, args.warmup, args.alloc_repeat)
+        case = results["cases"][name]
+        alloc = f"{case['alloc_peak_kib']:>10.1f}" if case["alloc_peak_kib"] is not None else f"{'-':>10}"
+        print(f"{name:<24}{case['p50_ms']:>10.3f}{case['p95_ms']:>10.3f}{case['p99_ms']:>10.3f}{case['mean_ms']:>10.3f}{alloc}")
+
+    print(f"{'case':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'peak KiB':>10}")
+
+    sizes = parse_sizes(args.decode_sizes)
+    jpegs = {size: make_jpeg(*size, seed=args.seed) for size in sizes}
+    image = ImageProcessor.decode_image_from_upload(make_upload(jpegs[sizes[0]]))
+
+    if "decode" in cases:
+        for (width, height), data in jpegs.items():
+            upload = make_upload(data)
+
+            def decode(upload: UploadFile = upload) -> None:
+                upload.file.seek(0)
+                ImageProcessor.decode_image_from_upload(upload)
+
+            record(f"decode_{width}x{height}", decode)
+
+    image_array = ImageProcessor.to_model_input(image)
+    parts_predictions, damage_predictions = parts_predictor(image_array), damage_predictor(image_array)
+
+    if "match" in cases:
+        part_detections = detection_service._extract_parts(parts_predictions)
+        damage_detections = detection_service._extract_damages(damage_predictions)
+        record("match", lambda: detection_service._match_damage_to_parts(damage_detections, part_detections))
+
+    if "postprocess" in cases:
+        record("postprocess", lambda: detection_service._build_report(parts_predictions, damage_predictions))
+
+    if "detect_defects" in cases:
+        record("detect_defects", lambda: detection_service.detect_defects(image))
+
+    if "endpoint" in cases:
+        run_endpoint_cases(jpegs[sizes[0]], record)
+
+    results["meta"] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "args": vars(args),
+        "settings": {
+            "IMAGE_DECODER": settings.IMAGE_DECODER,
+            "MAX_IMAGE_SIDE": settings.MAX_IMAGE_SIDE,
+            "BATCH_SCHEDULER_ENABLED": settings.BATCH_SCHEDULER_ENABLED,
+            "CASCADE_MODE": settings.CASCADE_MODE,
+            "INFERENCE_WORKERS": settings.INFERENCE_WORKERS,
+            "PARTS_MODEL_THRESHOLD": settings.PARTS_MODEL_THRESHOLD,
+            "DAMAGE_MODEL_THRESHOLD": settings.DAMAGE_MODEL_THRESHOLD,
+        },
+        "defects_per_image": len(detection_service._build_report(parts_predictions, damage_predictions)),
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
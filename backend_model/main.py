@@ -3,12 +3,18 @@ Main FastAPI application for Car Defects Detection API
 """
 import asyncio
 import logging
+import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from src.api.endpoints import router
+from src.api.middleware import RequestSizeLimitMiddleware
 from src.services.model_service import model_manager
+from src.services.batch_scheduler import inference_scheduler
+from src.services.job_queue import job_queue
+from src.services.inference_executor import inference_executor
+from src.services.result_cache import result_cache
 from src.config.settings import settings
 from src.utils.image_utils import setup_logging
 
@@ -27,21 +33,38 @@ async def lifespan(app: FastAPI):
     logger.info(f"Debug mode: {settings.DEBUG}")
     logger.info(f"Device: {settings.DEVICE}")
     
-    # Load models on startup
-    logger.info("Loading ML models...")
+    # Load models on startup (process workers load their own copies)
+    if model_manager.is_ready():
+        logger.info(f"Using models preloaded by the pre-fork parent (worker pid {os.getpid()})")
+    elif settings.INFERENCE_EXECUTOR_MODE != "process":
+        logger.info("Loading ML models...")
+        try:
+            success = model_manager.load_models()
+            if not success:
+                logger.error("Failed to load models during startup")
+            else:
+                logger.info("All models loaded successfully")
+        except Exception as e:
+            logger.error(f"Critical error during model loading: {str(e)}")
+    
+    # Start inference workers so model calls never block the event loop
     try:
-        success = model_manager.load_models()
-        if not success:
-            logger.error("Failed to load models during startup")
-        else:
-            logger.info("All models loaded successfully")
+        await inference_executor.start()
     except Exception as e:
-        logger.error(f"Critical error during model loading: {str(e)}")
+        logger.error(f"Critical error while starting inference executor: {str(e)}")
+    
+    if settings.BATCH_SCHEDULER_ENABLED:
+        inference_scheduler.start()
+    job_queue.start()
     
     yield
     
     # Shutdown
     logger.info("Shutting down application...")
+    await job_queue.stop()
+    await inference_scheduler.stop()
+    inference_executor.shutdown()
+    result_cache.close()
 
 # Create FastAPI application
 app = FastAPI(
@@ -63,6 +86,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Abort oversized request bodies while they stream in: one image for most routes,
+# MAX_REQUEST_SIZE only for the batch uploads
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    max_body_size=settings.MAX_SINGLE_REQUEST_SIZE,
+    path_limits={
+        "/api/v1/find_defects_batch": settings.MAX_REQUEST_SIZE,
+        "/api/v1/jobs/find_defects_batch": settings.MAX_REQUEST_SIZE,
+    }
+)
+
 # Include API routes
 app.include_router(router, prefix="/api/v1")
 
@@ -1,13 +1,44 @@
 """
 API endpoints for car defects detection
 """
+import asyncio
+import hmac
+import shutil
+import tempfile
 import time
 import logging
+import functools
 from datetime import datetime
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from src.models.schemas import DefectDetectionResponse, HealthCheckResponse, ErrorResponse
-from src.services.detection_service import detection_service
-from src.services.model_service import model_manager
+from typing import Any, Awaitable, Callable, List, Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Header, BackgroundTasks, Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+from src.models.schemas import (
+    DefectDetectionResponse,
+    BatchDefectDetectionResponse,
+    ImageDefectReport,
+    HealthCheckResponse,
+    SchedulerStatsResponse,
+    CacheStatsResponse,
+    ModelReloadRequest,
+    ModelReloadResponse,
+    ModelStatusResponse,
+    JobSubmitResponse,
+    JobStatusResponse,
+    JobQueueStatsResponse,
+    ErrorResponse
+)
+from src.services.model_service import ModelReloadError, model_manager
+from src.services.batch_scheduler import inference_scheduler
+from src.services.result_cache import result_cache
+from src.services.job_queue import job_queue, JobQueueFullError
+from src.services import metrics
+from src.services.inference_executor import (
+    inference_executor,
+    InferenceQueueFullError,
+    run_detection,
+    run_detection_batch
+)
 from src.utils.image_utils import ImageProcessor
 from src.config.settings import settings
 
@@ -19,6 +50,190 @@ async def get_image_processor():
     """Dependency to get image processor"""
     return ImageProcessor()
 
+def instrumented(endpoint: str) -> Callable:
+    """Count requests, in-flight requests, errors and latency of a detection endpoint"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            metrics.requests_total.labels(endpoint=endpoint).inc()
+            with metrics.requests_in_flight.labels(endpoint=endpoint).track_inprogress(), \
+                    metrics.request_seconds.labels(endpoint=endpoint).time():
+                try:
+                    return await func(*args, **kwargs)
+                except HTTPException as e:
+                    metrics.errors_total.labels(endpoint=endpoint, status=str(e.status_code)).inc()
+                    raise
+                except Exception:
+                    metrics.errors_total.labels(endpoint=endpoint, status="500").inc()
+                    raise
+        return wrapper
+    return decorator
+
+def _serialize(response: BaseModel) -> Response:
+    """Encode a response model to JSON, timing it as the serialization stage"""
+    with metrics.stage_seconds.labels(stage="serialization").time():
+        content = response.model_dump_json()
+    return Response(content=content, media_type="application/json")
+
+def _saturated_error(e: InferenceQueueFullError) -> HTTPException:
+    """Build the 503 response returned when the inference executor is saturated"""
+    logger.warning("Inference executor saturated, rejecting request")
+    return HTTPException(
+        status_code=503,
+        detail="Inference capacity exhausted. Please retry later.",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+async def _detect_upload(file: UploadFile, image_processor: ImageProcessor, endpoint: str) -> DefectDetectionResponse:
+    """
+    Validate one upload, look it up in the result cache and run detection on a miss
+    
+    Shared by /find_defects and detection jobs.
+    
+    Raises:
+        HTTPException: For invalid uploads or when models are not loaded
+        InferenceQueueFullError: If the inference executor is saturated
+    """
+    start_time = time.time()
+    
+    if not inference_executor.is_ready():
+        raise HTTPException(
+            status_code=500,
+            detail="Models are not loaded. Please check server status."
+        )
+    
+    image_processor.validate_image_file(file)
+    
+    content_hash = None
+    if settings.RESULT_CACHE_ENABLED:
+        # Hashing and decoding read the whole upload; keep them off the event loop
+        content_hash = await asyncio.to_thread(image_processor.compute_content_hash, file)
+        model_version = model_manager.model_version
+        cached_defects = result_cache.get(result_cache.make_key(content_hash, model_version))
+        metrics.cache_lookups_total.labels(result="miss" if cached_defects is None else "hit").inc()
+        metrics.images_total.labels(endpoint=endpoint).inc()
+        if cached_defects is not None:
+            processing_time_ms = (time.time() - start_time) * 1000
+            logger.info(f"Defect detection served from cache. Found {len(cached_defects)} defects in {processing_time_ms:.2f}ms")
+            return DefectDetectionResponse(
+                report=cached_defects,
+                total_defects=len(cached_defects),
+                processing_time_ms=round(processing_time_ms, 2),
+                cache_hit=True,
+                model_version=model_version
+            )
+    else:
+        metrics.images_total.labels(endpoint=endpoint).inc()
+    
+    with inference_executor.admit():
+        image = await asyncio.to_thread(image_processor.decode_image_from_upload, file)
+        
+        if settings.BATCH_SCHEDULER_ENABLED:
+            defects, model_timings, model_version = await inference_scheduler.submit(image)
+        else:
+            defects, model_timings, model_version = await inference_executor.run(run_detection, image)
+            # Scheduled requests are recorded once per batch by the scheduler
+            metrics.observe_model_timings(model_timings)
+    
+    metrics.record_defects(defects)
+    if content_hash is not None:
+        # Keyed by the version that actually ran, which differs from the lookup after a reload
+        result_cache.put(result_cache.make_key(content_hash, model_version), defects)
+    
+    processing_time_ms = (time.time() - start_time) * 1000
+    
+    response = DefectDetectionResponse(
+        report=defects,
+        total_defects=len(defects),
+        processing_time_ms=round(processing_time_ms, 2),
+        model_timings_ms=model_timings,
+        model_version=model_version
+    )
+    
+    logger.info(f"Defect detection completed. Found {len(defects)} defects in {processing_time_ms:.2f}ms")
+    return response
+
+async def _detect_uploads(files: List[UploadFile], image_processor: ImageProcessor, endpoint: str) -> BatchDefectDetectionResponse:
+    """
+    Validate several uploads, answer cached ones and run batched detection on the rest
+    
+    Shared by /find_defects_batch and batch detection jobs.
+    
+    Raises:
+        HTTPException: For invalid uploads or when models are not loaded
+        InferenceQueueFullError: If the inference executor is saturated
+    """
+    start_time = time.time()
+    
+    if not inference_executor.is_ready():
+        raise HTTPException(
+            status_code=500,
+            detail="Models are not loaded. Please check server status."
+        )
+    
+    if len(files) > settings.MAX_BATCH_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many images in one request. Maximum allowed: {settings.MAX_BATCH_IMAGES}"
+        )
+    
+    for file in files:
+        image_processor.validate_image_file(file)
+    
+    content_hashes = [None] * len(files)
+    reports = [None] * len(files)
+    model_version = model_manager.model_version
+    if settings.RESULT_CACHE_ENABLED:
+        content_hashes = await asyncio.to_thread(lambda: [image_processor.compute_content_hash(file) for file in files])
+        for index in range(len(files)):
+            reports[index] = result_cache.get(result_cache.make_key(content_hashes[index], model_version))
+            metrics.cache_lookups_total.labels(result="miss" if reports[index] is None else "hit").inc()
+    metrics.images_total.labels(endpoint=endpoint).inc(len(files))
+    
+    miss_indices = [index for index, report in enumerate(reports) if report is None]
+    model_timings = None
+    if miss_indices:
+        with inference_executor.admit(len(miss_indices)):
+            images = await asyncio.to_thread(
+                lambda: [image_processor.decode_image_from_upload(files[index]) for index in miss_indices]
+            )
+            
+            miss_reports, model_timings, model_version = await inference_executor.run(run_detection_batch, images)
+        metrics.observe_model_timings(model_timings)
+        
+        for index, defects in zip(miss_indices, miss_reports):
+            metrics.record_defects(defects)
+            reports[index] = defects
+            if content_hashes[index] is not None:
+                result_cache.put(result_cache.make_key(content_hashes[index], model_version), defects)
+    
+    missed = set(miss_indices)
+    results = [
+        ImageDefectReport(
+            filename=file.filename,
+            report=defects,
+            total_defects=len(defects),
+            cache_hit=index not in missed
+        )
+        for index, (file, defects) in enumerate(zip(files, reports))
+    ]
+    total_defects = sum(result.total_defects for result in results)
+    
+    processing_time_ms = (time.time() - start_time) * 1000
+    
+    response = BatchDefectDetectionResponse(
+        results=results,
+        total_images=len(results),
+        total_defects=total_defects,
+        processing_time_ms=round(processing_time_ms, 2),
+        model_timings_ms=model_timings,
+        cache_hits=len(files) - len(miss_indices),
+        model_version=model_version
+    )
+    
+    logger.info(f"Batch defect detection completed. Found {total_defects} defects in {len(results)} images in {processing_time_ms:.2f}ms")
+    return response
+
 @router.post(
     "/find_defects",
     response_model=DefectDetectionResponse,
@@ -26,6 +241,7 @@ async def get_image_processor():
         400: {"model": ErrorResponse, "description": "Bad Request - Invalid image"},
         413: {"model": ErrorResponse, "description": "Payload Too Large"},
         500: {"model": ErrorResponse, "description": "Internal Server Error"},
+        503: {"model": ErrorResponse, "description": "Service Unavailable - Inference capacity exhausted"},
     },
     summary="Detect car defects in uploaded image",
     description="""
@@ -43,6 +259,7 @@ async def get_image_processor():
     """,
     tags=["Detection"]
 )
+@instrumented("find_defects")
 async def find_defects(
     file: UploadFile = File(..., description="Car image file to analyze"),
     image_processor: ImageProcessor = Depends(get_image_processor)
@@ -57,36 +274,68 @@ async def find_defects(
     Returns:
         DefectDetectionResponse with detected defects
     """
-    start_time = time.time()
-    
     try:
         logger.info(f"Processing defect detection request for file: {file.filename}")
+        return _serialize(await _detect_upload(file, image_processor, "find_defects"))
         
-        if not model_manager.is_ready():
-            raise HTTPException(
-                status_code=500,
-                detail="Models are not loaded. Please check server status."
-            )
-        
-        image = image_processor.validate_and_load_image(file)
-        
-        defects = detection_service.detect_defects(image)
-        
-        processing_time_ms = (time.time() - start_time) * 1000
-        
-        response = DefectDetectionResponse(
-            report=defects,
-            total_defects=len(defects),
-            processing_time_ms=round(processing_time_ms, 2)
+    except HTTPException:
+        raise
+    except InferenceQueueFullError as e:
+        raise _saturated_error(e)
+    except Exception as e:
+        logger.error(f"Unexpected error during defect detection: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
         )
+
+@router.post(
+    "/find_defects_batch",
+    response_model=BatchDefectDetectionResponse,
+    responses={
+        400: {"model": ErrorResponse, "description": "Bad Request - Invalid image or too many images"},
+        413: {"model": ErrorResponse, "description": "Payload Too Large"},
+        500: {"model": ErrorResponse, "description": "Internal Server Error"},
+        503: {"model": ErrorResponse, "description": "Service Unavailable - Inference capacity exhausted"},
+    },
+    summary="Detect car defects in several uploaded images",
+    description="""
+    Upload all photos of an inspection at once to detect defects in each of them.
+    
+    Images are run through the parts and damage models as batched forward passes,
+    which is considerably cheaper than calling /find_defects once per photo.
+    
+    **Supported image formats:** JPG, JPEG, PNG, BMP, TIFF
+    **Maximum file size:** 10MB per image
+    **Maximum images per request:** 16
+    """,
+    tags=["Detection"]
+)
+@instrumented("find_defects_batch")
+async def find_defects_batch(
+    files: List[UploadFile] = File(..., description="Car image files to analyze"),
+    image_processor: ImageProcessor = Depends(get_image_processor)
+) -> BatchDefectDetectionResponse:
+    """
+    Detect defects in several uploaded car images
+    
+    Args:
+        files: Uploaded image files
+        image_processor: Image processing utility
         
-        logger.info(f"Defect detection completed. Found {len(defects)} defects in {processing_time_ms:.2f}ms")
-        return response
+    Returns:
+        BatchDefectDetectionResponse with a report per image
+    """
+    try:
+        logger.info(f"Processing batch defect detection request for {len(files)} files")
+        return _serialize(await _detect_uploads(files, image_processor, "find_defects_batch"))
         
     except HTTPException:
         raise
+    except InferenceQueueFullError as e:
+        raise _saturated_error(e)
     except Exception as e:
-        logger.error(f"Unexpected error during defect detection: {str(e)}")
+        logger.error(f"Unexpected error during batch defect detection: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
@@ -102,7 +351,7 @@ async def find_defects(
     Returns information about:
     - Service status
     - API version
-    - Model loading status
+    - Model loading status and active model version
     - GPU availability
     - Current timestamp
     """,
@@ -123,8 +372,9 @@ async def healthcheck() -> HealthCheckResponse:
             status="healthy",
             timestamp=datetime.utcnow().isoformat() + "Z",
             version=settings.VERSION,
-            models_loaded=model_manager.is_ready(),
-            gpu_available=gpu_available
+            models_loaded=inference_executor.is_ready(),
+            gpu_available=gpu_available,
+            model_version=model_manager.model_version
         )
         
     except Exception as e:
@@ -136,3 +386,403 @@ async def healthcheck() -> HealthCheckResponse:
             models_loaded=False,
             gpu_available=False
         )
+
+@router.get(
+    "/scheduler/stats",
+    response_model=SchedulerStatsResponse,
+    summary="Inference scheduler statistics",
+    description="""
+    Report the state of the micro-batching scheduler that sits in front of the models.
+    
+    Returns information about:
+    - Current queue depth
+    - Batching configuration
+    - Histogram of dispatched batch sizes
+    """,
+    tags=["Health"]
+)
+async def scheduler_stats() -> SchedulerStatsResponse:
+    """
+    Inference scheduler statistics endpoint
+    
+    Returns:
+        SchedulerStatsResponse with queue depth and batch-size histogram
+    """
+    return SchedulerStatsResponse(
+        enabled=settings.BATCH_SCHEDULER_ENABLED,
+        **inference_scheduler.get_stats()
+    )
+
+@router.get(
+    "/cache/stats",
+    response_model=CacheStatsResponse,
+    summary="Result cache statistics",
+    description="""
+    Report hit/miss counters and sizes of the detection result cache.
+    """,
+    tags=["Health"]
+)
+async def cache_stats() -> CacheStatsResponse:
+    """
+    Result cache statistics endpoint
+    
+    Returns:
+        CacheStatsResponse with hit/miss counters and tier sizes
+    """
+    return CacheStatsResponse(
+        enabled=settings.RESULT_CACHE_ENABLED,
+        **result_cache.get_stats()
+    )
+
+@router.get(
+    "/metrics",
+    response_class=Response,
+    summary="Prometheus metrics",
+    description="""
+    Expose pipeline metrics in Prometheus text format, aggregated over all
+    server workers.
+    
+    Includes:
+    - Per-stage latency histograms (hash, decode, backbone, parts/damage inference, matching, serialization)
+    - Request latency, request, image and error counters per endpoint
+    - In-flight requests, executor and scheduler load
+    - Result cache hits and misses
+    - Reported defects per defect type and car part
+    """,
+    tags=["Health"]
+)
+async def prometheus_metrics() -> Response:
+    """
+    Prometheus metrics endpoint
+    
+    Returns:
+        Metrics in Prometheus text exposition format
+    """
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
+@router.get(
+    "/models",
+    response_model=ModelStatusResponse,
+    summary="Model versions",
+    description="""
+    Report the active model version, replaced versions that are still finishing
+    requests, and the state of the last reload.
+    """,
+    tags=["Models"]
+)
+async def model_status() -> ModelStatusResponse:
+    """
+    Model version status endpoint
+    
+    Returns:
+        ModelStatusResponse with active and draining versions
+    """
+    return ModelStatusResponse(**model_manager.get_status())
+
+@router.post(
+    "/models/reload",
+    response_model=ModelReloadResponse,
+    status_code=202,
+    responses={
+        403: {"model": ErrorResponse, "description": "Forbidden - Reload disabled or wrong token"},
+        409: {"model": ErrorResponse, "description": "Conflict - Reload in progress or not supported in this serving mode"},
+    },
+    summary="Load and swap in a new model version",
+    description="""
+    Load new weights next to the active models without downtime.
+    
+    The new version is loaded and warmed up in the background while the current
+    one keeps serving, then swapped in atomically. Requests already running finish
+    on the old version. Omitted fields default to the configured weights, so an
+    empty body reloads the configured models. Poll /models for the outcome.
+    
+    Requires the X-Reload-Token header to match MODEL_RELOAD_TOKEN.
+    """,
+    tags=["Models"]
+)
+async def reload_models(
+    background_tasks: BackgroundTasks,
+    request: Optional[ModelReloadRequest] = None,
+    x_reload_token: Optional[str] = Header(None)
+) -> ModelReloadResponse:
+    """
+    Start a background model reload
+    
+    Args:
+        background_tasks: Runs the blocking load after the response is sent
+        request: Weight sources and checksums of the new version
+        x_reload_token: Shared secret from MODEL_RELOAD_TOKEN
+        
+    Returns:
+        ModelReloadResponse with the active and target versions
+    """
+    if not settings.MODEL_RELOAD_TOKEN:
+        raise HTTPException(status_code=403, detail="Model reload is disabled (MODEL_RELOAD_TOKEN is not set)")
+    if not x_reload_token or not hmac.compare_digest(x_reload_token, settings.MODEL_RELOAD_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid reload token")
+    if settings.INFERENCE_EXECUTOR_MODE == "process" or settings.SERVER_WORKERS > 1:
+        # Each process holds its own models; reloading one of them would split versions
+        raise HTTPException(
+            status_code=409,
+            detail="Hot reload needs a single serving process; restart the service to change models"
+        )
+    
+    request = request or ModelReloadRequest()
+    try:
+        target_version = model_manager.begin_reload({
+            "parts": request.parts_model_path,
+            "damage": request.damage_model_path,
+            "parts_sha256": request.parts_model_sha256,
+            "damage_sha256": request.damage_model_sha256,
+        })
+    except ModelReloadError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    background_tasks.add_task(model_manager.finish_reload)
+    logger.info(f"Model reload to version {target_version} started")
+    return ModelReloadResponse(
+        status="loading",
+        active_version=model_manager.model_version,
+        target_version=target_version
+    )
+
+def _detach_upload(file: UploadFile) -> UploadFile:
+    """Copy an upload so it outlives the request (Starlette closes the original when the response is sent)"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    file.file.seek(0)
+    shutil.copyfileobj(file.file, spooled)
+    spooled.seek(0)
+    return UploadFile(file=spooled, size=file.size, filename=file.filename, headers=file.headers)
+
+async def _detach_uploads(files: List[UploadFile]) -> List[UploadFile]:
+    """Copy uploads for a job in a worker thread, off the event loop"""
+    return await asyncio.to_thread(lambda: [_detach_upload(file) for file in files])
+
+def _check_jobs_available() -> None:
+    """Reject job requests when another worker process could receive the poll but not see the job"""
+    if settings.SERVER_WORKERS > 1 and not job_queue.shared:
+        raise HTTPException(
+            status_code=409,
+            detail="Jobs need a shared job store with several server workers; set JOB_STORE_PATH"
+        )
+
+def _detection_job(func: Callable[[], Awaitable[Any]], uploads: List[UploadFile]) -> Callable[[], Awaitable[Any]]:
+    """
+    Wrap a detection call for the job queue
+    
+    A saturated executor makes the job wait and retry instead of failing it,
+    since the client is not holding a connection open. Retries stop after
+    JOB_RESULT_TTL_SECONDS and the job fails with 503, so a job never holds a
+    job worker forever. Uploads are closed when the job ends.
+    """
+    async def run() -> Any:
+        deadline = time.monotonic() + settings.JOB_RESULT_TTL_SECONDS
+        try:
+            while True:
+                try:
+                    return await func()
+                except InferenceQueueFullError as e:
+                    if time.monotonic() + e.retry_after > deadline:
+                        raise HTTPException(
+                            status_code=503,
+                            detail="Inference capacity exhausted for too long. Please resubmit the job."
+                        )
+                    await asyncio.sleep(e.retry_after)
+        finally:
+            for upload in uploads:
+                upload.file.close()
+    return run
+
+async def _submit_job(
+    func: Callable[[], Awaitable[Any]],
+    uploads: List[UploadFile],
+    kind: str,
+    request: Request,
+    response: Response
+) -> JobSubmitResponse:
+    """Queue a detection job, turning a full queue into 429 with Retry-After"""
+    try:
+        job = await job_queue.submit(_detection_job(func, uploads), kind)
+    except JobQueueFullError as e:
+        for upload in uploads:
+            upload.file.close()
+        logger.warning("Job queue full, rejecting job")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many queued jobs. Please retry later.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    logger.info(f"Queued {kind} job {job.id}")
+    status_url = request.url_for("get_job", job_id=job.id).path
+    response.headers["Location"] = status_url
+    return JobSubmitResponse(job_id=job.id, kind=kind, status=job.status, status_url=status_url)
+
+@router.post(
+    "/jobs/find_defects",
+    response_model=JobSubmitResponse,
+    status_code=202,
+    responses={
+        400: {"model": ErrorResponse, "description": "Bad Request - Invalid image"},
+        413: {"model": ErrorResponse, "description": "Payload Too Large"},
+        409: {"model": ErrorResponse, "description": "Conflict - Several server workers without a shared job store"},
+        429: {"model": ErrorResponse, "description": "Too Many Requests - Job queue is full"},
+        500: {"model": ErrorResponse, "description": "Internal Server Error"},
+    },
+    summary="Submit a defect detection job",
+    description="""
+    Queue a car image for defect detection and return immediately with a job id.
+    
+    Poll GET /jobs/{job_id} until the status is succeeded or failed; the result
+    has the same shape as the /find_defects response. Results are kept for
+    JOB_RESULT_TTL_SECONDS after the job finishes.
+    
+    When the queue is full the request is rejected with 429 and a Retry-After header.
+    With several server workers, job states are kept in JOB_STORE_PATH so any
+    worker can answer the poll.
+    """,
+    tags=["Jobs"]
+)
+async def submit_find_defects_job(
+    request: Request,
+    response: Response,
+    file: UploadFile = File(..., description="Car image file to analyze"),
+    image_processor: ImageProcessor = Depends(get_image_processor)
+) -> JobSubmitResponse:
+    """
+    Queue single-image detection
+    
+    Args:
+        file: Uploaded image file
+        image_processor: Image processing utility
+        
+    Returns:
+        JobSubmitResponse with the job id
+    """
+    _check_jobs_available()
+    if not inference_executor.is_ready():
+        raise HTTPException(status_code=500, detail="Models are not loaded. Please check server status.")
+    # Reject invalid uploads now rather than in a failed job
+    image_processor.validate_image_file(file)
+    
+    upload, = await _detach_uploads([file])
+    return await _submit_job(
+        lambda: _detect_upload(upload, image_processor, "find_defects_job"),
+        [upload],
+        "find_defects",
+        request,
+        response
+    )
+
+@router.post(
+    "/jobs/find_defects_batch",
+    response_model=JobSubmitResponse,
+    status_code=202,
+    responses={
+        400: {"model": ErrorResponse, "description": "Bad Request - Invalid image or too many images"},
+        413: {"model": ErrorResponse, "description": "Payload Too Large"},
+        409: {"model": ErrorResponse, "description": "Conflict - Several server workers without a shared job store"},
+        429: {"model": ErrorResponse, "description": "Too Many Requests - Job queue is full"},
+        500: {"model": ErrorResponse, "description": "Internal Server Error"},
+    },
+    summary="Submit a batch defect detection job",
+    description="""
+    Queue all photos of an inspection for defect detection and return immediately
+    with a job id. The result has the same shape as the /find_defects_batch response.
+    """,
+    tags=["Jobs"]
+)
+async def submit_find_defects_batch_job(
+    request: Request,
+    response: Response,
+    files: List[UploadFile] = File(..., description="Car image files to analyze"),
+    image_processor: ImageProcessor = Depends(get_image_processor)
+) -> JobSubmitResponse:
+    """
+    Queue batched detection
+    
+    Args:
+        files: Uploaded image files
+        image_processor: Image processing utility
+        
+    Returns:
+        JobSubmitResponse with the job id
+    """
+    _check_jobs_available()
+    if not inference_executor.is_ready():
+        raise HTTPException(status_code=500, detail="Models are not loaded. Please check server status.")
+    if len(files) > settings.MAX_BATCH_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many images in one request. Maximum allowed: {settings.MAX_BATCH_IMAGES}"
+        )
+    for file in files:
+        image_processor.validate_image_file(file)
+    
+    uploads = await _detach_uploads(files)
+    return await _submit_job(
+        lambda: _detect_uploads(uploads, image_processor, "find_defects_batch_job"),
+        uploads,
+        "find_defects_batch",
+        request,
+        response
+    )
+
+@router.get(
+    "/jobs/stats",
+    response_model=JobQueueStatsResponse,
+    summary="Job queue statistics",
+    description="""
+    Report queue depth, running jobs, stored results and rejected submissions.
+    """,
+    tags=["Jobs"]
+)
+async def job_stats() -> JobQueueStatsResponse:
+    """
+    Job queue statistics endpoint
+    
+    Returns:
+        JobQueueStatsResponse with queue depth and counters
+    """
+    return JobQueueStatsResponse(**(await job_queue.get_stats()))
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=JobStatusResponse,
+    responses={
+        404: {"model": ErrorResponse, "description": "Not Found - Unknown or expired job"},
+        409: {"model": ErrorResponse, "description": "Conflict - Several server workers without a shared job store"},
+    },
+    summary="Get the status or result of a detection job",
+    description="""
+    Return the job status (queued, running, succeeded, failed). Succeeded jobs
+    include the detection result, failed jobs the error and the HTTP status the
+    synchronous endpoint would have returned.
+    """,
+    tags=["Jobs"]
+)
+async def get_job(job_id: str) -> JobStatusResponse:
+    """
+    Job status endpoint
+    
+    Args:
+        job_id: Id returned on submission
+        
+    Returns:
+        JobStatusResponse with status and, once finished, result or error
+    """
+    _check_jobs_available()
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found or expired")
+    return JobStatusResponse(
+        job_id=job.id,
+        kind=job.kind,
+        status=job.status,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        result=job.result,
+        error=job.error,
+        error_status=job.error_status
+    )
@@ -0,0 +1,93 @@
+"""
+ASGI middleware for the Car Defects Detection API
+"""
+import json
+import logging
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class RequestSizeLimitMiddleware:
+    """
+    Reject request bodies larger than the limit of their route with 413
+
+    max_body_size applies to every path not listed in path_limits, so
+    single-image routes can be held to one file while batch routes accept
+    several. A declared Content-Length above the limit is rejected before any
+    of the body is read. Otherwise the body is counted while it streams in and
+    the request is aborted at the first chunk that crosses the limit, so an
+    oversized upload never gets fully received or spooled to disk.
+    """
+
+    def __init__(self, app: Callable, max_body_size: int, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        max_body_size = self.path_limits.get(scope["path"].rstrip("/"), self.max_body_size)
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    declared_size = int(value)
+                except ValueError:
+                    declared_size = 0
+                if declared_size > max_body_size:
+                    await self._reject(send, max_body_size)
+                    return
+
+        received = 0
+        too_large = False
+        response_started = False
+
+        async def limited_receive() -> Dict[str, Any]:
+            nonlocal received, too_large
+            if too_large:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_size:
+                    # Stop reading; the app sees a disconnect and its response is replaced below
+                    too_large = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def tracked_send(message: Dict[str, Any]) -> None:
+            nonlocal response_started
+            if too_large and not response_started:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except Exception:
+            if not too_large or response_started:
+                raise
+
+        if too_large and not response_started:
+            await self._reject(send, max_body_size)
+
+    async def _reject(self, send: Callable, max_body_size: int) -> None:
+        """Send the 413 response"""
+        logger.warning(f"Rejected request body larger than {max_body_size} bytes")
+        body = json.dumps({
+            "error": "Payload Too Large",
+            "detail": f"Request body exceeds maximum allowed size of {max_body_size // (1024 * 1024)}MB"
+        }).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
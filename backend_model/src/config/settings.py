@@ -14,11 +14,28 @@ class Settings:
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", 4070))
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
+    # HTTP worker processes of the pre-fork server (python -m src.services.prefork),
+    # forked after the models are loaded so they share them copy-on-write
+    SERVER_WORKERS: int = int(os.getenv("SERVER_WORKERS", 1))
+    SERVER_GRACEFUL_TIMEOUT: float = float(os.getenv("SERVER_GRACEFUL_TIMEOUT", 30))  # Seconds to finish in-flight requests on shutdown
     
     # Model Paths
     PARTS_MODEL_PATH: str = os.getenv("PARTS_MODEL_PATH", "https://huggingface.co/rarayayan/Detectron2-Zoo-Car-Parts-Detection/resolve/main/model_final.pth")
     DAMAGE_MODEL_PATH: str = os.getenv("DAMAGE_MODEL_PATH", "https://huggingface.co/rarayayan/Detectron2-Zoo-Car-Damage-Detection/resolve/main/model_final.pth")
     SEVERITY_MODEL_PATH: str = os.getenv("SEVERITY_MODEL_PATH", "")
+    # Shared secret for POST /models/reload (X-Reload-Token header); empty disables hot reload
+    MODEL_RELOAD_TOKEN: str = os.getenv("MODEL_RELOAD_TOKEN", "")
+    # Expected SHA-256 of the weights (empty = record whatever is downloaded)
+    PARTS_MODEL_SHA256: str = os.getenv("PARTS_MODEL_SHA256", "")
+    DAMAGE_MODEL_SHA256: str = os.getenv("DAMAGE_MODEL_SHA256", "")
+    
+    # Local Weight Store Configuration (populate with: python -m src.services.weight_store prefetch)
+    WEIGHT_STORE_DIR: str = os.getenv("WEIGHT_STORE_DIR", "models")
+    # Re-hash stored files on every load; otherwise only size and mtime are compared with the
+    # manifest (checksums are verified on prefetch and by: python -m src.services.weight_store verify)
+    WEIGHT_STORE_VERIFY: bool = os.getenv("WEIGHT_STORE_VERIFY", "false").lower() == "true"
+    WEIGHT_STORE_DOWNLOAD_ON_MISS: bool = os.getenv("WEIGHT_STORE_DOWNLOAD_ON_MISS", "true").lower() == "true"
+    WEIGHT_STORE_DOWNLOAD_TIMEOUT: float = float(os.getenv("WEIGHT_STORE_DOWNLOAD_TIMEOUT", 60))
     
     # Model Configuration
     PARTS_MODEL_THRESHOLD: float = 0.25
@@ -26,15 +43,92 @@ class Settings:
     PARTS_MODEL_NUM_CLASSES: int = 21
     DAMAGE_MODEL_NUM_CLASSES: int = 8
     
+    # Batch Inference Configuration
+    MAX_BATCH_IMAGES: int = int(os.getenv("MAX_BATCH_IMAGES", 16))  # Max images per batch request
+    INFERENCE_BATCH_SIZE: int = int(os.getenv("INFERENCE_BATCH_SIZE", 4))  # Images per forward pass
+    
+    # Micro-batching Scheduler Configuration
+    BATCH_SCHEDULER_ENABLED: bool = os.getenv("BATCH_SCHEDULER_ENABLED", "false").lower() == "true"
+    BATCH_MAX_SIZE: int = int(os.getenv("BATCH_MAX_SIZE", 8))  # Max requests merged into one batch
+    BATCH_MAX_WAIT_MS: float = float(os.getenv("BATCH_MAX_WAIT_MS", 10))  # Max time to wait for batch to fill
+    
+    # Inference Executor Configuration
+    INFERENCE_EXECUTOR_MODE: str = os.getenv("INFERENCE_EXECUTOR_MODE", "thread")  # "thread" or "process"
+    INFERENCE_WORKERS: int = int(os.getenv("INFERENCE_WORKERS", 1))  # Concurrent model invocations
+    INFERENCE_QUEUE_SIZE: int = int(os.getenv("INFERENCE_QUEUE_SIZE", 32))  # Requests allowed to wait for a worker
+    INFERENCE_RETRY_AFTER_SECONDS: int = int(os.getenv("INFERENCE_RETRY_AFTER_SECONDS", 2))  # Retry-After hint when saturated
+    
+    # Run parts and damage models concurrently for each image / batch
+    PARALLEL_MODELS: bool = os.getenv("PARALLEL_MODELS", "false").lower() == "true"
+    # Intra-op threads per model call on CPU (0 = auto: all cores, or half of them with PARALLEL_MODELS)
+    TORCH_NUM_THREADS: int = int(os.getenv("TORCH_NUM_THREADS", 0))
+    
+    # Inference Backend Configuration
+    # "pytorch" (eager Detectron2), "onnxruntime" or "torchscript" (graphs exported on first load,
+    # or ahead of time with: python -m src.services.inference_backends export)
+    INFERENCE_BACKEND: str = os.getenv("INFERENCE_BACKEND", "pytorch")
+    EXPORTED_MODEL_DIR: str = os.getenv("EXPORTED_MODEL_DIR", "models/exported")
+    ORT_NUM_THREADS: int = int(os.getenv("ORT_NUM_THREADS", 0))  # Intra-op threads per session (0 = auto)
+    ORT_ALLOW_SPINNING: bool = os.getenv("ORT_ALLOW_SPINNING", "true").lower() == "true"  # Busy-wait between ops
+    
+    # INT8 quantization (pytorch backend on CPU only): static for the ResNet backbone and FPN,
+    # dynamic for the box heads. Calibrate and measure speedup and accuracy drift first:
+    # python -m benchmarks.bench_quantization --images DIR
+    QUANTIZE_INT8: bool = os.getenv("QUANTIZE_INT8", "false").lower() == "true"
+    QUANTIZED_MODEL_DIR: str = os.getenv("QUANTIZED_MODEL_DIR", "models/quantized")
+    # Photos used to calibrate activation ranges when no cached INT8 model exists
+    QUANTIZATION_CALIBRATION_DIR: str = os.getenv("QUANTIZATION_CALIBRATION_DIR", "")
+    QUANTIZATION_CALIBRATION_IMAGES: int = int(os.getenv("QUANTIZATION_CALIBRATION_IMAGES", 32))
+    
+    # Compute backbone + FPN features once and feed them to both models' heads.
+    # Only takes effect if both checkpoints have identical backbone weights.
+    SHARED_BACKBONE: bool = os.getenv("SHARED_BACKBONE", "false").lower() == "true"
+    
+    # Run the damage model first and skip the parts model on images without damage
+    # above DAMAGE_MODEL_THRESHOLD. Reports are unchanged; ignored with a shared backbone.
+    CASCADE_MODE: bool = os.getenv("CASCADE_MODE", "false").lower() == "true"
+    
+    # Body limit of batch upload requests, enforced while the body streams in
+    MAX_REQUEST_SIZE: int = int(os.getenv("MAX_REQUEST_SIZE", 10 * 1024 * 1024 * (MAX_BATCH_IMAGES + 1)))
+    
+    # Result Cache Configuration (keyed by image content hash + model version + thresholds)
+    RESULT_CACHE_ENABLED: bool = os.getenv("RESULT_CACHE_ENABLED", "false").lower() == "true"
+    RESULT_CACHE_MAX_ENTRIES: int = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 2048))
+    RESULT_CACHE_TTL_SECONDS: float = float(os.getenv("RESULT_CACHE_TTL_SECONDS", 24 * 3600))
+    RESULT_CACHE_DISK_PATH: str = os.getenv("RESULT_CACHE_DISK_PATH", "")  # Empty disables the SQLite tier
+    RESULT_CACHE_DISK_MAX_ENTRIES: int = int(os.getenv("RESULT_CACHE_DISK_MAX_ENTRIES", 100000))
+    
+    # Asynchronous Job Configuration (per worker process)
+    JOB_QUEUE_SIZE: int = int(os.getenv("JOB_QUEUE_SIZE", 64))  # Waiting jobs before submissions get 429
+    JOB_CONCURRENCY: int = int(os.getenv("JOB_CONCURRENCY", 2))  # Jobs run at the same time
+    JOB_RESULT_TTL_SECONDS: float = float(os.getenv("JOB_RESULT_TTL_SECONDS", 600))  # How long finished results are kept
+    JOB_RETRY_AFTER_SECONDS: int = int(os.getenv("JOB_RETRY_AFTER_SECONDS", 5))
+    # SQLite file holding job states and results for all server workers (empty = per-process
+    # memory; the pre-fork server picks a temporary file when SERVER_WORKERS > 1)
+    JOB_STORE_PATH: str = os.getenv("JOB_STORE_PATH", "")
+    
     # Device Configuration
     DEVICE: str = "cuda" if os.getenv("FORCE_CPU", "false").lower() != "true" else "cpu"
     
     # File Upload Configuration
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
-    ALLOWED_EXTENSIONS: set = {".jpg", ".jpeg", ".png", ".bmp", ".tiff"}
+    # Body limit of every other request (one image plus multipart headers and form fields)
+    MAX_SINGLE_REQUEST_SIZE: int = MAX_FILE_SIZE + 64 * 1024
+    # Accepted formats, detected from file content (PIL format names)
+    ALLOWED_IMAGE_FORMATS: set = {"JPEG", "PNG", "BMP", "TIFF"}
+    # Largest accepted image, checked from the header before decoding
+    MAX_IMAGE_PIXELS: int = int(os.getenv("MAX_IMAGE_PIXELS", 50_000_000))
+    # Longer image side after decoding (0 = keep full resolution). Detectron2 resizes
+    # to at most 1333px anyway, so decoding beyond that only costs time and memory;
+    # 1333 is the recommended value, but reduced JPEG decoding shifts pixels slightly.
+    MAX_IMAGE_SIDE: int = int(os.getenv("MAX_IMAGE_SIDE", 0))
+    # "opencv" decodes straight to BGR arrays (libjpeg-turbo), "pil" uses Pillow
+    IMAGE_DECODER: str = os.getenv("IMAGE_DECODER", "pil")
     
     # Detectron2 Configuration
     DETECTRON2_CONFIG_FILE: str = "COCO-InstanceSegmentation/mask_rcnn_R_50_FPN_3x.yaml"
+    # Skip the mask head: detection only uses scores, boxes and classes
+    BOXES_ONLY: bool = os.getenv("BOXES_ONLY", "false").lower() == "true"
     
     # Part Category Mapping
     PART_CATEGORIES: Dict[str, int] = {
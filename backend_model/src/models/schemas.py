@@ -1,7 +1,7 @@
 """
 Pydantic models for API request/response validation
 """
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Union
 from pydantic import BaseModel, Field, field_validator
 
 class DefectDetection(BaseModel):
@@ -28,6 +28,9 @@ class DefectDetectionResponse(BaseModel):
     report: List[DefectDetection] = Field(..., description="List of detected defects")
     total_defects: int = Field(..., description="Total number of defects detected")
     processing_time_ms: float = Field(..., description="Processing time in milliseconds")
+    model_timings_ms: Optional[Dict[str, float]] = Field(None, description="Inference time per model and matching time in milliseconds, plus image counts with CASCADE_MODE")
+    cache_hit: bool = Field(False, description="Whether the result was served from the result cache")
+    model_version: Optional[str] = Field(None, description="Version of the models that produced the report")
     
     class Config:
         json_schema_extra = {
@@ -47,7 +50,64 @@ class DefectDetectionResponse(BaseModel):
                     }
                 ],
                 "total_defects": 2,
-                "processing_time_ms": 1250.5
+                "processing_time_ms": 1250.5,
+                "model_timings_ms": {
+                    "parts_inference_ms": 610.2,
+                    "damage_inference_ms": 598.7
+                },
+                "cache_hit": False,
+                "model_version": "3f9c2a61b0d4"
+            }
+        }
+
+class ImageDefectReport(BaseModel):
+    """Defect report for a single image of a batch request"""
+    filename: Optional[str] = Field(None, description="Name of the uploaded file")
+    report: List[DefectDetection] = Field(..., description="List of detected defects")
+    total_defects: int = Field(..., description="Total number of defects detected in this image")
+    cache_hit: bool = Field(False, description="Whether the result was served from the result cache")
+
+class BatchDefectDetectionResponse(BaseModel):
+    """Response model for batch defect detection endpoint"""
+    results: List[ImageDefectReport] = Field(..., description="Per-image reports, in upload order")
+    total_images: int = Field(..., description="Number of processed images")
+    total_defects: int = Field(..., description="Total number of defects detected across all images")
+    processing_time_ms: float = Field(..., description="Processing time in milliseconds")
+    model_timings_ms: Optional[Dict[str, float]] = Field(None, description="Inference time per model and matching time in milliseconds, plus image counts with CASCADE_MODE")
+    cache_hits: int = Field(0, description="Number of images served from the result cache")
+    model_version: Optional[str] = Field(None, description="Version of the models that produced the reports")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "results": [
+                    {
+                        "filename": "front.jpg",
+                        "report": [
+                            {
+                                "defect_type": "Dent",
+                                "car_part": "Front-door",
+                                "severity": 4.5,
+                                "confidence": 0.89
+                            }
+                        ],
+                        "total_defects": 1
+                    },
+                    {
+                        "filename": "back.jpg",
+                        "report": [],
+                        "total_defects": 0
+                    }
+                ],
+                "total_images": 2,
+                "total_defects": 1,
+                "processing_time_ms": 2100.4,
+                "model_timings_ms": {
+                    "parts_inference_ms": 1020.3,
+                    "damage_inference_ms": 995.1
+                },
+                "cache_hits": 0,
+                "model_version": "3f9c2a61b0d4"
             }
         }
 
@@ -58,6 +118,7 @@ class HealthCheckResponse(BaseModel):
     version: str = Field(..., description="API version")
     models_loaded: bool = Field(..., description="Whether models are loaded successfully")
     gpu_available: bool = Field(..., description="Whether GPU is available")
+    model_version: Optional[str] = Field(None, description="Version of the active models")
     
     class Config:
         json_schema_extra = {
@@ -66,10 +127,155 @@ class HealthCheckResponse(BaseModel):
                 "timestamp": "2025-06-07T14:30:00Z",
                 "version": "1.0.0",
                 "models_loaded": True,
-                "gpu_available": True
+                "gpu_available": True,
+                "model_version": "3f9c2a61b0d4"
+            }
+        }
+
+class SchedulerStatsResponse(BaseModel):
+    """Response model for inference scheduler statistics"""
+    enabled: bool = Field(..., description="Whether micro-batching is enabled")
+    running: bool = Field(..., description="Whether the batching worker is running")
+    queue_depth: int = Field(..., description="Requests currently waiting to be batched")
+    max_batch_size: int = Field(..., description="Maximum number of requests per batch")
+    max_wait_ms: float = Field(..., description="Maximum time to wait for a batch to fill")
+    total_requests: int = Field(..., description="Requests processed by the scheduler")
+    total_batches: int = Field(..., description="Batches dispatched by the scheduler")
+    batch_size_histogram: Dict[str, int] = Field(..., description="Number of dispatched batches per batch size")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "enabled": True,
+                "running": True,
+                "queue_depth": 3,
+                "max_batch_size": 8,
+                "max_wait_ms": 10.0,
+                "total_requests": 120,
+                "total_batches": 54,
+                "batch_size_histogram": {"1": 30, "2": 12, "4": 8, "8": 4}
+            }
+        }
+
+class CacheStatsResponse(BaseModel):
+    """Response model for result cache statistics"""
+    enabled: bool = Field(..., description="Whether the result cache is enabled")
+    memory_entries: int = Field(..., description="Entries in the in-memory LRU tier")
+    disk_entries: Optional[int] = Field(None, description="Entries in the on-disk tier, if enabled")
+    memory_hits: int = Field(..., description="Lookups answered from memory")
+    disk_hits: int = Field(..., description="Lookups answered from disk")
+    misses: int = Field(..., description="Lookups that required inference")
+    hit_ratio: float = Field(..., description="Share of lookups answered from the cache")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "enabled": True,
+                "memory_entries": 412,
+                "disk_entries": 5120,
+                "memory_hits": 230,
+                "disk_hits": 18,
+                "misses": 640,
+                "hit_ratio": 0.2793
+            }
+        }
+
+class ModelReloadRequest(BaseModel):
+    """Request model for loading a new model version"""
+    parts_model_path: Optional[str] = Field(None, description="Parts model weights (URL or path), defaults to the configured one")
+    damage_model_path: Optional[str] = Field(None, description="Damage model weights (URL or path), defaults to the configured one")
+    parts_model_sha256: Optional[str] = Field(None, description="Expected SHA-256 of the parts weights")
+    damage_model_sha256: Optional[str] = Field(None, description="Expected SHA-256 of the damage weights")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "damage_model_path": "https://example.com/models/damage_v2.pth",
+                "damage_model_sha256": "9b74c9897bac770ffc029102a200c5de4f8e8e2b3b3c5e0c8f1f8e1a4e5d6c7b"
             }
         }
 
+class ModelReloadResponse(BaseModel):
+    """Response model for an accepted model reload"""
+    status: str = Field(..., description="Reload state")
+    active_version: str = Field(..., description="Version serving requests until the reload completes")
+    target_version: str = Field(..., description="Version being loaded")
+
+class ModelSlotInfo(BaseModel):
+    """A loaded model version"""
+    version: str = Field(..., description="Model version")
+    parts_model: Optional[str] = Field(None, description="Parts model weights source")
+    damage_model: Optional[str] = Field(None, description="Damage model weights source")
+    loaded_at: float = Field(..., description="Unix time the version was loaded")
+    in_flight: int = Field(..., description="Inference calls currently running on this version")
+
+class ModelStatusResponse(BaseModel):
+    """Response model for model version status"""
+    active: Optional[ModelSlotInfo] = Field(None, description="Version serving new requests")
+    draining: List[ModelSlotInfo] = Field(default_factory=list, description="Replaced versions still finishing requests")
+    reload: Dict[str, Any] = Field(..., description="State of the last reload (idle, loading, succeeded, failed)")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "active": {
+                    "version": "3f9c2a61b0d4",
+                    "parts_model": "https://huggingface.co/.../model_final.pth",
+                    "damage_model": "https://example.com/models/damage_v2.pth",
+                    "loaded_at": 1749306600.0,
+                    "in_flight": 1
+                },
+                "draining": [],
+                "reload": {
+                    "state": "succeeded",
+                    "target_version": "3f9c2a61b0d4",
+                    "started_at": 1749306590.2,
+                    "finished_at": 1749306600.0
+                }
+            }
+        }
+
+class JobSubmitResponse(BaseModel):
+    """Response model for an accepted detection job"""
+    job_id: str = Field(..., description="Job id")
+    kind: str = Field(..., description="Job type (find_defects or find_defects_batch)")
+    status: str = Field(..., description="Job status")
+    status_url: str = Field(..., description="URL to poll for the result")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "job_id": "8c1d2f0a9b7e4c3d8e6f5a4b3c2d1e0f",
+                "kind": "find_defects",
+                "status": "queued",
+                "status_url": "/api/v1/jobs/8c1d2f0a9b7e4c3d8e6f5a4b3c2d1e0f"
+            }
+        }
+
+class JobStatusResponse(BaseModel):
+    """Response model for a detection job"""
+    job_id: str = Field(..., description="Job id")
+    kind: str = Field(..., description="Job type (find_defects or find_defects_batch)")
+    status: str = Field(..., description="Job status (queued, running, succeeded, failed)")
+    created_at: float = Field(..., description="Unix time the job was submitted")
+    started_at: Optional[float] = Field(None, description="Unix time the job started running")
+    finished_at: Optional[float] = Field(None, description="Unix time the job finished")
+    result: Optional[Union[DefectDetectionResponse, BatchDefectDetectionResponse]] = Field(
+        None, description="Detection result, once succeeded"
+    )
+    error: Optional[str] = Field(None, description="Error message, once failed")
+    error_status: Optional[int] = Field(None, description="HTTP status the synchronous endpoint would have returned")
+
+class JobQueueStatsResponse(BaseModel):
+    """Response model for job queue statistics"""
+    running: bool = Field(..., description="Whether the job workers are running")
+    queue_depth: int = Field(..., description="Jobs waiting for a worker")
+    queue_size: int = Field(..., description="Waiting jobs accepted before submissions are rejected")
+    concurrency: int = Field(..., description="Jobs run at the same time")
+    running_jobs: int = Field(..., description="Jobs currently running")
+    stored_results: int = Field(..., description="Finished jobs whose result can still be polled")
+    rejected: int = Field(..., description="Submissions rejected because the queue was full")
+
 class ErrorResponse(BaseModel):
     """Response model for error cases"""
     error: str = Field(..., description="Error message")
@@ -0,0 +1,190 @@
+"""
+Dynamic micro-batching scheduler for defect detection requests
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+from src.config.settings import settings
+from src.utils.image_utils import ImageInput
+from src.services.inference_executor import inference_executor, run_detection_batch
+from src.models.schemas import DefectDetection
+from src.services import metrics
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class _PendingRequest:
+    """Single image waiting in the scheduler queue"""
+    image: ImageInput
+    future: asyncio.Future
+    enqueued_at: float
+
+class InferenceScheduler:
+    """
+    Groups concurrent detection requests into batches
+
+    Requests are put on a queue and picked up by a single worker task. The worker
+    takes everything already waiting (up to max_batch_size) and runs it as one
+    batch through DefectDetectionService.detect_defects_batch. It only waits up to
+    max_wait_ms for more requests when others are already queued, so a lone request
+    at low load is dispatched immediately and does not pay the batching window.
+
+    Batches run on the inference executor; at most one batch per executor worker is
+    in flight, and requests keep accumulating in the queue while all workers are busy.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._dispatches: Set[asyncio.Task] = set()
+        self.batch_size_histogram: Counter = Counter()
+        self.total_requests: int = 0
+        self.total_batches: int = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether the worker task is alive"""
+        return self._worker is not None and not self._worker.done()
+
+    def queue_depth(self) -> int:
+        """Number of requests waiting to be batched"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self) -> None:
+        """Start the batching worker on the running event loop"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(inference_executor.workers)
+        self._worker = asyncio.create_task(self._run())
+        logger.info(f"Inference scheduler started (max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait_ms})")
+
+    async def stop(self) -> None:
+        """Stop the worker and fail any requests still waiting"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        for task in list(self._dispatches):
+            task.cancel()
+
+        while self._queue is not None and not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Inference scheduler stopped"))
+        metrics.scheduler_queue_depth.set(0)
+        logger.info("Inference scheduler stopped")
+
+    async def submit(self, image: ImageInput) -> Tuple[List[DefectDetection], Dict[str, float], str]:
+        """
+        Queue an image for detection and wait for its result
+
+        Args:
+            image: Decoded upload or PIL Image object
+
+        Returns:
+            List of DefectDetection objects for this image, the per-model
+            timings of the batch it ran in and the model version it ran on
+        """
+        if not self.running:
+            raise RuntimeError("Inference scheduler is not running")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingRequest(image=image, future=future, enqueued_at=time.time()))
+        metrics.scheduler_queue_depth.set(self.queue_depth())
+        return await future
+
+    async def _collect_batch(self) -> List[_PendingRequest]:
+        """Wait for the first request, then gather more within the batching window"""
+        batch = [await self._queue.get()]
+
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+        if len(batch) > 1 and self.max_wait_ms > 0:
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+        metrics.scheduler_queue_depth.set(self.queue_depth())
+        return batch
+
+    async def _run(self) -> None:
+        """Worker loop: wait for a free executor slot, collect a batch, dispatch it"""
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+            batch = [pending for pending in batch if not pending.future.cancelled()]
+            if not batch:
+                self._slots.release()
+                continue
+
+            self.total_batches += 1
+            self.total_requests += len(batch)
+            self.batch_size_histogram[len(batch)] += 1
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[_PendingRequest]) -> None:
+        """Run one batch on the inference executor and hand results back"""
+        try:
+            oldest_wait_ms = (time.time() - min(pending.enqueued_at for pending in batch)) * 1000
+            logger.debug(f"Dispatching batch of {len(batch)} requests (oldest waited {oldest_wait_ms:.2f}ms)")
+
+            try:
+                reports, timings, model_version = await inference_executor.run(
+                    run_detection_batch,
+                    [pending.image for pending in batch]
+                )
+            except Exception as e:
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                return
+
+            metrics.observe_model_timings(timings)
+            for pending, report in zip(batch, reports):
+                if not pending.future.done():
+                    pending.future.set_result((report, timings, model_version))
+        finally:
+            self._slots.release()
+
+    def get_stats(self) -> Dict:
+        """Current queue depth and batch-size distribution"""
+        return {
+            "running": self.running,
+            "queue_depth": self.queue_depth(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "total_requests": self.total_requests,
+            "total_batches": self.total_batches,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_size_histogram.items())}
+        }
+
+# Global inference scheduler instance
+inference_scheduler = InferenceScheduler(
+    max_batch_size=settings.BATCH_MAX_SIZE,
+    max_wait_ms=settings.BATCH_MAX_WAIT_MS
+)
@@ -4,19 +4,107 @@ Car defects detection service
 import numpy as np
 import logging
 import time
-from typing import List, Tuple
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 from src.config.settings import settings
-from src.services.model_service import model_manager
+from src.services.model_service import ModelSlot, model_manager
 from src.models.schemas import DefectDetection
+from src.utils.image_utils import ImageInput, ImageProcessor
 
 logger = logging.getLogger(__name__)
 
+class Detections(NamedTuple):
+    """Thresholded detections of one model for one image"""
+    scores: np.ndarray  # (N,) float32
+    boxes: np.ndarray  # (N, 4) float32, x1 y1 x2 y2
+    labels: List[str]  # class name per detection
+
 class DefectDetectionService:
     """Service for detecting car defects using computer vision models"""
     
     def __init__(self):
         self.id_to_part_name = {v: k for k, v in settings.PART_CATEGORIES.items()}
+        self._predictor_pool: Optional[ThreadPoolExecutor] = None
+        if settings.PARALLEL_MODELS:
+            # One extra thread per inference worker: parts runs there, damage on the caller's thread
+            self._predictor_pool = ThreadPoolExecutor(
+                max_workers=max(1, settings.INFERENCE_WORKERS),
+                thread_name_prefix="parts-predictor"
+            )
+    
+    @staticmethod
+    def _timed(name: str, func: Callable, arg: Any, timings: Dict[str, float]) -> Any:
+        """Call func(arg) and store its wall time in milliseconds under timings[name]"""
+        start_time = time.time()
+        result = func(arg)
+        timings[name] = round((time.time() - start_time) * 1000, 2)
+        return result
+    
+    def _run_predictors(
+        self,
+        parts_func: Callable,
+        damage_func: Callable,
+        inputs: Any,
+        timings: Dict[str, float]
+    ) -> Tuple[Any, Any]:
+        """
+        Run the parts and damage models over the same inputs
+        
+        With settings.PARALLEL_MODELS the two models run concurrently, otherwise
+        one after the other. Per-model wall times are written to timings.
+        """
+        if self._predictor_pool is not None:
+            parts_future = self._predictor_pool.submit(self._timed, "parts_inference_ms", parts_func, inputs, timings)
+            damage_predictions = self._timed("damage_inference_ms", damage_func, inputs, timings)
+            parts_predictions = parts_future.result()
+        else:
+            parts_predictions = self._timed("parts_inference_ms", parts_func, inputs, timings)
+            damage_predictions = self._timed("damage_inference_ms", damage_func, inputs, timings)
+        return parts_predictions, damage_predictions
+    
+    @staticmethod
+    def _has_damage(damage_predictions) -> bool:
+        """Whether any damage detection passes DAMAGE_MODEL_THRESHOLD (same comparison as _filter_detections)"""
+        return bool((damage_predictions['instances'].scores.double() > settings.DAMAGE_MODEL_THRESHOLD).any())
+    
+    def _run_cascade(
+        self,
+        parts_func: Callable,
+        damage_func: Callable,
+        image_arrays: List[np.ndarray],
+        timings: Dict[str, float]
+    ) -> Tuple[List[Any], List[Any]]:
+        """
+        Run the damage model first and the parts model only where damage was found
+        
+        A report can only contain defects that were matched to a damage detection,
+        so images without damage above threshold get an empty report either way
+        and their parts pass is skipped. Skipped images get None as parts
+        predictions. The number of images and of skipped parts passes are added
+        to timings as cascade_images and cascade_parts_skipped.
+        
+        Args:
+            parts_func: Callable running the parts model on a list of images
+            damage_func: Callable running the damage model on a list of images
+            image_arrays: Images in the layout the predictors accept
+            timings: Dict that receives per-model times and cascade counts
+        """
+        damage_predictions = self._timed("damage_inference_ms", damage_func, image_arrays, timings)
+        damaged = [index for index, predictions in enumerate(damage_predictions) if self._has_damage(predictions)]
+        
+        parts_predictions: List[Any] = [None] * len(image_arrays)
+        if damaged:
+            damaged_parts = self._timed(
+                "parts_inference_ms", parts_func, [image_arrays[index] for index in damaged], timings
+            )
+            for index, predictions in zip(damaged, damaged_parts):
+                parts_predictions[index] = predictions
+        else:
+            timings["parts_inference_ms"] = 0.0
+        
+        timings["cascade_images"] = timings.get("cascade_images", 0) + len(image_arrays)
+        timings["cascade_parts_skipped"] = timings.get("cascade_parts_skipped", 0) + len(image_arrays) - len(damaged)
+        return parts_predictions, damage_predictions
     
     def compute_iou(self, boxA: List[float], boxB: List[float]) -> float:
         """Calculate Intersection over Union (IoU) between two bounding boxes"""
@@ -32,100 +120,294 @@ class DefectDetectionService:
         iou = interArea / float(boxAArea + boxBArea - interArea)
         return iou
     
+    @staticmethod
+    def compute_iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+        """
+        Calculate IoU between every box of boxes_a and every box of boxes_b
+        
+        Uses the same formula and float64 arithmetic as compute_iou, so
+        result[i, j] == compute_iou(boxes_a[i], boxes_b[j]).
+        
+        Args:
+            boxes_a: (N, 4) array of x1, y1, x2, y2 boxes
+            boxes_b: (M, 4) array of x1, y1, x2, y2 boxes
+            
+        Returns:
+            (N, M) float64 IoU matrix
+        """
+        boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+        boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+        
+        xA = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+        yA = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+        xB = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+        yB = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+        
+        inter_area = np.maximum(0, xB - xA + 1) * np.maximum(0, yB - yA + 1)
+        area_a = (boxes_a[:, 2] - boxes_a[:, 0] + 1) * (boxes_a[:, 3] - boxes_a[:, 1] + 1)
+        area_b = (boxes_b[:, 2] - boxes_b[:, 0] + 1) * (boxes_b[:, 3] - boxes_b[:, 1] + 1)
+        
+        return inter_area / (area_a[:, None] + area_b[None, :] - inter_area)
+    
     def _match_damage_to_parts(
         self, 
-        damage_detections: List[Tuple[float, List[float], str]], 
-        part_detections: List[Tuple[float, List[float], str]]
+        damage_detections: Detections, 
+        part_detections: Detections
     ) -> List[Tuple[str, str, float]]:
         """
         Match detected damages to car parts based on bounding box overlap
+        
+        Computes the full damage x part IoU matrix at once and picks the best
+        part per damage with argmax. argmax returns the first maximum, which is
+        the part the sequential "iou > best_iou" scan would have kept.
+        
         Returns list of (defect_type, car_part, confidence) tuples
         """
-        matched_defects = []
+        if len(damage_detections.labels) == 0 or len(part_detections.labels) == 0:
+            return []
         
-        for damage_score, damage_box, damage_type in damage_detections:
-            best_match_part = "Unknown"
-            best_iou = 0.0
-            
-            for part_score, part_box, part_type in part_detections:
-                iou = self.compute_iou(damage_box, part_box)
-                if iou > best_iou and iou > 0.1:
-                    best_iou = iou
-                    best_match_part = part_type
-            
-            if best_iou > 0.1:  # Only consider matches with significant overlap
-                matched_defects.append((damage_type, best_match_part, damage_score))
+        iou = self.compute_iou_matrix(damage_detections.boxes, part_detections.boxes)
+        best_part = iou.argmax(axis=1)
+        best_iou = iou[np.arange(len(best_part)), best_part]
+        
+        matched_defects = []
+        for damage_index in np.flatnonzero(best_iou > 0.1):  # Only consider matches with significant overlap
+            matched_defects.append((
+                damage_detections.labels[damage_index],
+                part_detections.labels[best_part[damage_index]],
+                damage_detections.scores[damage_index]
+            ))
         
         return matched_defects
     
-    def detect_defects(self, image: Image.Image) -> List[DefectDetection]:
+    @staticmethod
+    def _filter_detections(predictions, threshold: float, names: Dict[int, str], unknown_prefix: str) -> Detections:
+        """
+        Keep detections scoring above threshold and resolve their class names
+        
+        Filtering happens on the tensors before anything is copied to NumPy. Scores
+        are compared in float64, matching the NumPy scalar comparison used before.
+        """
+        instances = predictions['instances']
+        if len(instances) == 0:
+            return Detections(np.empty(0, dtype=np.float32), np.empty((0, 4), dtype=np.float32), [])
+        
+        keep = instances.scores.double() > threshold
+        scores = instances.scores[keep].cpu().numpy()
+        boxes = instances.pred_boxes.tensor[keep].cpu().numpy()
+        classes = instances.pred_classes[keep].cpu().numpy()
+        
+        labels = [names.get(class_id, f"{unknown_prefix}{class_id}") for class_id in classes]
+        return Detections(scores, boxes, labels)
+    
+    def _extract_parts(self, parts_predictions) -> Detections:
+        """Keep parts detections above PARTS_MODEL_THRESHOLD with their part names"""
+        return self._filter_detections(
+            parts_predictions, settings.PARTS_MODEL_THRESHOLD, self.id_to_part_name, "Unknown_Part_"
+        )
+    
+    def _extract_damages(self, damage_predictions) -> Detections:
+        """Keep damage detections above DAMAGE_MODEL_THRESHOLD with their damage types"""
+        return self._filter_detections(
+            damage_predictions, settings.DAMAGE_MODEL_THRESHOLD, settings.DAMAGE_CATEGORIES, "Unknown_Damage_"
+        )
+    
+    @staticmethod
+    def _rescale(detections: Detections, box_scale: Tuple[float, float]) -> Detections:
+        """Map boxes predicted on a downscaled image back to original image coordinates"""
+        if box_scale == (1.0, 1.0) or len(detections.labels) == 0:
+            return detections
+        scale_x, scale_y = box_scale
+        factors = np.array([scale_x, scale_y, scale_x, scale_y], dtype=detections.boxes.dtype)
+        return detections._replace(boxes=detections.boxes * factors)
+    
+    def _build_report(
+        self,
+        parts_predictions,
+        damage_predictions,
+        box_scale: Tuple[float, float] = (1.0, 1.0)
+    ) -> List[DefectDetection]:
+        """
+        Turn parts and damage predictions for one image into DefectDetection results
+        
+        box_scale maps boxes back to original resolution before matching, so the
+        overlap test behaves the same whether or not the image was decoded downscaled.
+        parts_predictions is None when the cascade skipped the parts model.
+        """
+        if parts_predictions is None:
+            return []
+        parts_detections = self._rescale(self._extract_parts(parts_predictions), box_scale)
+        damage_detections = self._rescale(self._extract_damages(damage_predictions), box_scale)
+        
+        matched_defects = self._match_damage_to_parts(damage_detections, parts_detections)
+        
+        defect_results = []
+        for defect_type, car_part, confidence in matched_defects:
+            defect_results.append(DefectDetection(
+                defect_type=defect_type,
+                car_part=car_part,
+                severity=5.0,
+                confidence=confidence
+            ))
+        return defect_results
+    
+    def detect_defects(
+        self,
+        image: ImageInput,
+        timings: Optional[Dict[str, float]] = None,
+        slot: Optional[ModelSlot] = None
+    ) -> List[DefectDetection]:
         """
         Detect defects in a car image
         
         Args:
-            image: PIL Image object
+            image: Decoded upload or PIL Image object
+            timings: Optional dict that receives per-model inference and matching times in ms
+            slot: Model version to run on (defaults to the active one)
             
         Returns:
             List of DefectDetection objects
         """
+        if slot is None:
+            with model_manager.acquire() as slot:
+                return self.detect_defects(image, timings, slot)
+        
         start_time = time.time()
+        timings = timings if timings is not None else {}
         
         try:
-            image_array = np.array(image)
+            image_array = ImageProcessor.to_model_input(image)
             
-            parts_predictor = model_manager.get_parts_predictor()
-            damage_predictor = model_manager.get_damage_predictor()
+            parts_predictor = slot.parts_predictor
+            damage_predictor = slot.damage_predictor
             # severity_model = model_manager.get_severity_model()
             
-            logger.info("Running parts detection...")
-            parts_predictions = parts_predictor(image_array)
-            
-            logger.info("Running damage detection...")
-            damage_predictions = damage_predictor(image_array)
+            shared_backbone = slot.shared_backbone
+            if shared_backbone is not None:
+                logger.info("Running parts and damage detection on shared backbone...")
+                parts_batch, damage_batch = shared_backbone([image_array], timings)
+                parts_predictions, damage_predictions = parts_batch[0], damage_batch[0]
+            elif settings.CASCADE_MODE:
+                logger.info("Running damage detection, then parts detection if damaged...")
+                parts_batch, damage_batch = self._run_cascade(
+                    lambda arrays: [parts_predictor(array) for array in arrays],
+                    lambda arrays: [damage_predictor(array) for array in arrays],
+                    [image_array],
+                    timings
+                )
+                parts_predictions, damage_predictions = parts_batch[0], damage_batch[0]
+            else:
+                logger.info("Running parts and damage detection...")
+                parts_predictions, damage_predictions = self._run_predictors(
+                    parts_predictor, damage_predictor, image_array, timings
+                )
 
             # logger.info("Running severity assessment...")
             # severity_predictions = severity_model(image_array)
             
-            parts_detections = []
-            if len(parts_predictions['instances']) > 0:
-                parts_scores = parts_predictions['instances'].scores.cpu().numpy()
-                parts_boxes = parts_predictions['instances'].pred_boxes.tensor.cpu().numpy()
-                parts_classes = parts_predictions['instances'].pred_classes.cpu().numpy()
-                
-                for score, box, class_id in zip(parts_scores, parts_boxes, parts_classes):
-                    if score > settings.PARTS_MODEL_THRESHOLD:
-                        part_name = self.id_to_part_name.get(class_id, f"Unknown_Part_{class_id}")
-                        parts_detections.append((score, box.tolist(), part_name))
+            matching_start = time.time()
+            defect_results = self._build_report(
+                parts_predictions, damage_predictions, ImageProcessor.get_box_scale(image)
+            )
+            timings["matching_ms"] = round((time.time() - matching_start) * 1000, 2)
             
-            damage_detections = []
-            if len(damage_predictions['instances']) > 0:
-                damage_scores = damage_predictions['instances'].scores.cpu().numpy()
-                damage_boxes = damage_predictions['instances'].pred_boxes.tensor.cpu().numpy()
-                damage_classes = damage_predictions['instances'].pred_classes.cpu().numpy()
-                
-                for score, box, class_id in zip(damage_scores, damage_boxes, damage_classes):
-                    if score > settings.DAMAGE_MODEL_THRESHOLD:
-                        damage_type = settings.DAMAGE_CATEGORIES.get(class_id, f"Unknown_Damage_{class_id}")
-                        damage_detections.append((score, box.tolist(), damage_type))
+            processing_time = (time.time() - start_time) * 1000
+            logger.info(
+                f"Defect detection completed in {processing_time:.2f}ms "
+                f"(parts: {timings['parts_inference_ms']:.2f}ms, damage: {timings['damage_inference_ms']:.2f}ms). "
+                f"Found {len(defect_results)} defects."
+            )
+            
+            return defect_results
+            
+        except Exception as e:
+            logger.error(f"Error during defect detection: {str(e)}")
+            raise
+    
+    def detect_defects_batch(
+        self,
+        images: List[ImageInput],
+        timings: Optional[Dict[str, float]] = None,
+        slot: Optional[ModelSlot] = None
+    ) -> List[List[DefectDetection]]:
+        """
+        Detect defects in several car images using batched forward passes
+        
+        Images are fed to each model in chunks of settings.INFERENCE_BATCH_SIZE,
+        so every chunk costs one forward pass per model instead of one per image.
+        
+        Args:
+            images: List of decoded uploads or PIL Image objects
+            timings: Optional dict that receives per-model inference and matching
+                times in ms, summed over all chunks
+            slot: Model version to run on (defaults to the active one)
             
-            matched_defects = self._match_damage_to_parts(damage_detections, parts_detections)
+        Returns:
+            List of DefectDetection lists, in the same order as the input images
+        """
+        if slot is None:
+            with model_manager.acquire() as slot:
+                return self.detect_defects_batch(images, timings, slot)
+        
+        start_time = time.time()
+        timings = timings if timings is not None else {}
+        timings.setdefault("parts_inference_ms", 0.0)
+        timings.setdefault("damage_inference_ms", 0.0)
+        timings.setdefault("matching_ms", 0.0)
+        
+        try:
+            image_arrays = [ImageProcessor.to_model_input(image) for image in images]
+            box_scales = [ImageProcessor.get_box_scale(image) for image in images]
             
-            defect_results = []
-            for defect_type, car_part, confidence in matched_defects:
-                defect_results.append(DefectDetection(
-                    defect_type=defect_type,
-                    car_part=car_part,
-                    severity=5.0,
-                    confidence=confidence
-                ))
+            parts_predictor = slot.parts_predictor
+            damage_predictor = slot.damage_predictor
+            
+            shared_backbone = slot.shared_backbone
+            
+            batch_size = max(1, settings.INFERENCE_BATCH_SIZE)
+            results = []
+            for offset in range(0, len(image_arrays), batch_size):
+                chunk = image_arrays[offset:offset + batch_size]
+                
+                logger.info(f"Running batched parts and damage detection on {len(chunk)} images...")
+                chunk_timings = {}
+                if shared_backbone is not None:
+                    parts_predictions, damage_predictions = shared_backbone(chunk, chunk_timings)
+                elif settings.CASCADE_MODE:
+                    parts_predictions, damage_predictions = self._run_cascade(
+                        lambda arrays: model_manager.predict_batch(parts_predictor, arrays),
+                        lambda arrays: model_manager.predict_batch(damage_predictor, arrays),
+                        chunk,
+                        chunk_timings
+                    )
+                else:
+                    parts_predictions, damage_predictions = self._run_predictors(
+                        lambda arrays: model_manager.predict_batch(parts_predictor, arrays),
+                        lambda arrays: model_manager.predict_batch(damage_predictor, arrays),
+                        chunk,
+                        chunk_timings
+                    )
+                for name, value in chunk_timings.items():
+                    timings[name] = round(timings.get(name, 0.0) + value, 2)
+                
+                matching_start = time.time()
+                chunk_scales = box_scales[offset:offset + batch_size]
+                for parts_prediction, damage_prediction, box_scale in zip(parts_predictions, damage_predictions, chunk_scales):
+                    results.append(self._build_report(parts_prediction, damage_prediction, box_scale))
+                timings["matching_ms"] = round(timings["matching_ms"] + (time.time() - matching_start) * 1000, 2)
             
             processing_time = (time.time() - start_time) * 1000
-            logger.info(f"Defect detection completed in {processing_time:.2f}ms. Found {len(defect_results)} defects.")
+            total_defects = sum(len(report) for report in results)
+            logger.info(
+                f"Batch defect detection completed in {processing_time:.2f}ms for {len(images)} images "
+                f"(parts: {timings['parts_inference_ms']:.2f}ms, damage: {timings['damage_inference_ms']:.2f}ms). "
+                f"Found {total_defects} defects."
+            )
             
-            return defect_results
+            return results
             
         except Exception as e:
-            logger.error(f"Error during defect detection: {str(e)}")
+            logger.error(f"Error during batch defect detection: {str(e)}")
             raise
 
 detection_service = DefectDetectionService()
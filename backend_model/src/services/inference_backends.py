@@ -0,0 +1,358 @@
+"""
+Exported-graph inference backends (ONNX Runtime, TorchScript)
+
+Usage (from backend_model/):
+    python -m src.services.inference_backends export --format onnx
+    python -m src.services.inference_backends check --format onnx --images path/to/photos
+"""
+import abc
+import argparse
+import logging
+import os
+import numpy as np
+import torch
+from typing import Any, Dict, List, Tuple
+from detectron2.config import CfgNode
+from detectron2.data import transforms as T
+from detectron2.engine import DefaultPredictor
+from detectron2.export import TracingAdapter
+from detectron2.modeling.postprocessing import detector_postprocess
+from detectron2.structures import Boxes, Instances, pairwise_iou
+from src.config.settings import settings
+from src.services.model_service import ModelManager
+
+logger = logging.getLogger(__name__)
+
+# Export format used by each exported-graph backend
+BACKEND_FORMATS: Dict[str, str] = {
+    "onnxruntime": "onnx",
+    "torchscript": "torchscript",
+}
+
+_FORMAT_EXTENSIONS: Dict[str, str] = {
+    "onnx": ".onnx",
+    "torchscript": ".ts",
+}
+
+ONNX_OPSET_VERSION = 16
+
+# Parity check tolerances: an exported detection matches the pytorch one if it has the
+# same class, overlaps it by at least PARITY_MIN_IOU and its score is within PARITY_SCORE_TOLERANCE
+PARITY_MIN_IOU = 0.95
+PARITY_SCORE_TOLERANCE = 0.01
+_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+def exported_model_path(cfg: CfgNode, model_name: str, export_format: str) -> str:
+    """
+    Location of the exported graph for a model config
+
+    The file name carries a digest of the config and weights (score threshold,
+    number of classes and mask head are all baked into the graph).
+    """
+    cfg = cfg.clone()
+    cfg.MODEL.DEVICE = "cpu"
+    slug = model_name.lower().replace(" ", "_")
+    return os.path.join(
+        settings.EXPORTED_MODEL_DIR, f"{slug}-{ModelManager.cfg_digest(cfg)}{_FORMAT_EXTENSIONS[export_format]}"
+    )
+
+def _graph_inference(model: Any, image: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Traced function: one resized CHW image in, raw boxes/scores/classes out"""
+    instances = model.inference([{"image": image}], do_postprocess=False)[0]
+    return instances.pred_boxes.tensor, instances.scores, instances.pred_classes
+
+def export_predictor(predictor: DefaultPredictor, output_path: str, export_format: str) -> str:
+    """
+    Trace a loaded predictor's model and save it as an ONNX or TorchScript graph
+
+    The graph covers normalization, backbone, RPN, ROI heads and NMS. Test-time
+    resizing and the rescale back to original image size stay in Python
+    (ExportedPredictor), exactly as DefaultPredictor does them.
+
+    Args:
+        predictor: Loaded DefaultPredictor
+        output_path: Target file
+        export_format: "onnx" or "torchscript"
+
+    Returns:
+        output_path
+    """
+    if export_format not in _FORMAT_EXTENSIONS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    # Trace on a synthetic photo-sized image; input height/width stay dynamic
+    sample_array = np.random.default_rng(0).integers(0, 256, size=(480, 640, 3), dtype=np.uint8)
+    sample_image = ModelManager.prepare_inputs(predictor, [sample_array])[0]["image"]
+
+    adapter = TracingAdapter(predictor.model.eval(), sample_image, _graph_inference)
+    adapter.eval()
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    logger.info(f"Exporting model to {export_format}: {output_path}")
+    with torch.no_grad():
+        if export_format == "onnx":
+            torch.onnx.export(
+                adapter,
+                (sample_image,),
+                tmp_path,
+                opset_version=ONNX_OPSET_VERSION,
+                input_names=["image"],
+                output_names=["boxes", "scores", "classes"],
+                dynamic_axes={
+                    "image": {1: "height", 2: "width"},
+                    "boxes": {0: "detections"},
+                    "scores": {0: "detections"},
+                    "classes": {0: "detections"},
+                },
+                dynamo=False
+            )
+        else:
+            torch.jit.trace(adapter, (sample_image,)).save(tmp_path)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+class ExportedPredictor(abc.ABC):
+    """
+    DefaultPredictor-compatible wrapper around an exported detection graph
+
+    Preprocessing (input format, ResizeShortestEdge) and postprocessing
+    (detector_postprocess back to the original image size) are the same as
+    in DefaultPredictor / GeneralizedRCNN, so the returned {"instances": ...}
+    dicts can be consumed by DefectDetectionService unchanged.
+    """
+
+    def __init__(self, cfg: CfgNode):
+        self.cfg = cfg.clone()
+        self.cfg.MODEL.DEVICE = "cpu"
+        self.input_format = cfg.INPUT.FORMAT
+        self.aug = T.ResizeShortestEdge(
+            [cfg.INPUT.MIN_SIZE_TEST, cfg.INPUT.MIN_SIZE_TEST], cfg.INPUT.MAX_SIZE_TEST
+        )
+
+    @abc.abstractmethod
+    def _run_graph(self, image: torch.Tensor) -> Tuple[Any, Any, Any]:
+        """Run the graph on one resized CHW float image, return boxes, scores, classes"""
+
+    def predict_batch(self, image_arrays: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """
+        Run the graph over several images
+
+        The exported graphs take one image per call, so images are run one after
+        the other; each call is already multi-threaded by the runtime.
+        """
+        predictions = []
+        for model_input in ModelManager.prepare_inputs(self, image_arrays):
+            image = model_input["image"]
+            boxes, scores, classes = self._run_graph(image)
+
+            instances = Instances(tuple(image.shape[1:]))
+            instances.pred_boxes = Boxes(torch.as_tensor(boxes))
+            instances.scores = torch.as_tensor(scores)
+            instances.pred_classes = torch.as_tensor(classes)
+            predictions.append({
+                "instances": detector_postprocess(instances, model_input["height"], model_input["width"])
+            })
+        return predictions
+
+    def __call__(self, original_image: np.ndarray) -> Dict[str, Any]:
+        return self.predict_batch([original_image])[0]
+
+class OnnxRuntimePredictor(ExportedPredictor):
+    """Runs an exported ONNX graph with ONNX Runtime on CPU"""
+
+    def __init__(self, cfg: CfgNode, model_path: str):
+        super().__init__(cfg)
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("INFERENCE_BACKEND=onnxruntime requires the onnxruntime package") from e
+
+        self.session = ort.InferenceSession(
+            model_path,
+            sess_options=self._session_options(ort),
+            providers=["CPUExecutionProvider"]
+        )
+        self._input_name = self.session.get_inputs()[0].name
+
+    @staticmethod
+    def _session_options(ort: Any) -> Any:
+        """
+        Session threading tuned for one request per session call
+
+        Intra-op threads follow ORT_NUM_THREADS (0 = one per core, or half of
+        the cores with PARALLEL_MODELS since both sessions then run at once).
+        Inter-op parallelism is off: the graph is a single chain of large ops.
+        """
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+
+        num_threads = settings.ORT_NUM_THREADS
+        if num_threads <= 0 and settings.PARALLEL_MODELS:
+            num_threads = max(1, (os.cpu_count() or 2) // 2)
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        if not settings.ORT_ALLOW_SPINNING:
+            options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+        return options
+
+    def _run_graph(self, image: torch.Tensor) -> Tuple[Any, Any, Any]:
+        return self.session.run(None, {self._input_name: image.numpy()})
+
+class TorchScriptPredictor(ExportedPredictor):
+    """Runs a traced TorchScript graph"""
+
+    def __init__(self, cfg: CfgNode, model_path: str):
+        super().__init__(cfg)
+        self.module = torch.jit.load(model_path, map_location="cpu")
+        self.module.eval()
+
+    def _run_graph(self, image: torch.Tensor) -> Tuple[Any, Any, Any]:
+        with torch.no_grad():
+            return self.module(image)
+
+_PREDICTOR_CLASSES = {
+    "onnxruntime": OnnxRuntimePredictor,
+    "torchscript": TorchScriptPredictor,
+}
+
+def load_exported_predictor(cfg: CfgNode, model_name: str, backend: str) -> ExportedPredictor:
+    """
+    Load a model through an exported-graph backend, exporting it first if needed
+
+    Args:
+        cfg: Detectron2 config the model is built from
+        model_name: Human-readable model name
+        backend: "onnxruntime" or "torchscript"
+
+    Returns:
+        Predictor with the DefaultPredictor interface
+    """
+    export_format = BACKEND_FORMATS[backend]
+    model_path = exported_model_path(cfg, model_name, export_format)
+    if not os.path.isfile(model_path):
+        logger.info(f"No exported {export_format} graph for {model_name} model, exporting now")
+        export_cfg = cfg.clone()
+        export_cfg.MODEL.DEVICE = "cpu"
+        export_predictor(DefaultPredictor(export_cfg), model_path, export_format)
+
+    logger.info(f"Loading {model_name} model with {backend} backend from {model_path}")
+    return _PREDICTOR_CLASSES[backend](cfg, model_path)
+
+def _match_detections(reference: Instances, exported: Instances) -> Tuple[int, float]:
+    """
+    Pair each reference detection with the best overlapping exported one of the same class
+
+    Returns:
+        (number of reference detections without a match, largest score difference of matched pairs)
+    """
+    if len(reference) == 0:
+        return 0, 0.0
+    if len(exported) == 0:
+        return len(reference), 0.0
+
+    iou = pairwise_iou(reference.pred_boxes, exported.pred_boxes).numpy()
+    iou[reference.pred_classes.numpy()[:, None] != exported.pred_classes.numpy()[None, :]] = 0.0
+    best = iou.argmax(axis=1)
+    matched = iou[np.arange(len(best)), best] >= PARITY_MIN_IOU
+    score_diff = np.abs(reference.scores.numpy() - exported.scores.numpy()[best])[matched]
+    return int((~matched).sum()), float(score_diff.max()) if len(score_diff) else 0.0
+
+def check_parity(cfg: CfgNode, model_name: str, backend: str, image_arrays: List[np.ndarray]) -> bool:
+    """
+    Compare an exported graph with the eager pytorch model on the same images
+
+    Every pytorch detection must have an exported counterpart of the same class
+    with IoU >= PARITY_MIN_IOU and a score within PARITY_SCORE_TOLERANCE, and the
+    exported graph must not report extra detections.
+
+    Args:
+        cfg: Detectron2 config the model is built from
+        model_name: Human-readable model name
+        backend: "onnxruntime" or "torchscript"
+        image_arrays: BGR uint8 images
+
+    Returns:
+        True if the outputs agree on every image
+    """
+    cfg = cfg.clone()
+    cfg.MODEL.DEVICE = "cpu"
+    reference_predictor = DefaultPredictor(cfg)
+    exported_predictor = load_exported_predictor(cfg, model_name, backend)
+
+    reference_count = exported_count = missing = 0
+    max_score_diff = 0.0
+    with torch.no_grad():
+        for image_array in image_arrays:
+            reference = reference_predictor(image_array)["instances"].to("cpu")
+            exported = exported_predictor(image_array)["instances"]
+            image_missing, score_diff = _match_detections(reference, exported)
+            reference_count += len(reference)
+            exported_count += len(exported)
+            missing += image_missing
+            max_score_diff = max(max_score_diff, score_diff)
+
+    ok = missing == 0 and exported_count == reference_count and max_score_diff <= PARITY_SCORE_TOLERANCE
+    log = logger.info if ok else logger.error
+    log(
+        f"{model_name} model, {backend} vs pytorch on {len(image_arrays)} images: "
+        f"{reference_count} pytorch / {exported_count} {backend} detections, {missing} unmatched, "
+        f"max score difference {max_score_diff:.4f} -> {'OK' if ok else 'MISMATCH'}"
+    )
+    return ok
+
+def _load_check_images(images_dir: str, synthetic: int) -> List[np.ndarray]:
+    """Photos from images_dir as BGR arrays, or random images when no directory is given"""
+    import cv2
+
+    if not images_dir:
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 256, size=(720, 960, 3), dtype=np.uint8) for _ in range(synthetic)]
+
+    image_arrays = []
+    for name in sorted(os.listdir(images_dir)):
+        if name.lower().endswith(_IMAGE_EXTENSIONS):
+            image_array = cv2.imread(os.path.join(images_dir, name), cv2.IMREAD_COLOR)
+            if image_array is not None:
+                image_arrays.append(image_array)
+    if not image_arrays:
+        raise SystemExit(f"No images found in {images_dir}")
+    return image_arrays
+
+def main() -> None:
+    from src.utils.image_utils import setup_logging
+
+    parser = argparse.ArgumentParser(description="Export detection models for the exported-graph backends")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Export parts and damage models and check them against pytorch")
+    export_parser.add_argument("--force", action="store_true", help="Re-export even if the graph exists")
+    export_parser.add_argument("--skip-check", action="store_true", help="Do not compare the exported graphs with pytorch")
+    check_parser = subparsers.add_parser("check", help="Compare exported graphs with the pytorch models")
+    for subparser in (export_parser, check_parser):
+        subparser.add_argument("--format", choices=sorted(_FORMAT_EXTENSIONS), default="onnx")
+        subparser.add_argument("--images", default="", help="Directory of photos to compare on (recommended)")
+        subparser.add_argument("--synthetic", type=int, default=4, help="Random images used when --images is not given")
+    args = parser.parse_args()
+
+    setup_logging("INFO")
+    model_cfgs = ModelManager.build_model_cfgs()
+    if args.command == "export":
+        for model_name, cfg in model_cfgs:
+            cfg.MODEL.DEVICE = "cpu"
+            model_path = exported_model_path(cfg, model_name, args.format)
+            if os.path.isfile(model_path) and not args.force:
+                logger.info(f"{model_name} model already exported: {model_path}")
+                continue
+            export_predictor(DefaultPredictor(cfg), model_path, args.format)
+        if args.skip_check:
+            return
+
+    backend = {export_format: backend for backend, export_format in BACKEND_FORMATS.items()}[args.format]
+    image_arrays = _load_check_images(args.images, args.synthetic)
+    ok = all([check_parity(cfg, model_name, backend, image_arrays) for model_name, cfg in model_cfgs])
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
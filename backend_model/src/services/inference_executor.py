@@ -0,0 +1,154 @@
+"""
+Bounded worker pool that runs model inference off the asyncio event loop
+"""
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from src.config.settings import settings
+from src.utils.image_utils import ImageInput
+from src.services.model_service import model_manager
+from src.services.detection_service import detection_service
+from src.models.schemas import DefectDetection
+from src.services import metrics
+
+logger = logging.getLogger(__name__)
+
+class InferenceQueueFullError(RuntimeError):
+    """Raised when the executor has no free worker and its wait queue is full"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+def _init_process_worker() -> None:
+    """Process pool initializer: every worker process loads its own models"""
+    from src.utils.image_utils import setup_logging
+    setup_logging("INFO" if not settings.DEBUG else "DEBUG")
+    model_manager.load_models()
+
+def _worker_models_ready() -> bool:
+    """Report whether models are loaded in the current worker"""
+    return model_manager.is_ready()
+
+def run_detection(image: ImageInput) -> Tuple[List[DefectDetection], Dict[str, float], str]:
+    """Run single-image detection (picklable entry point for worker processes)"""
+    timings: Dict[str, float] = {}
+    with model_manager.acquire() as slot:
+        defects = detection_service.detect_defects(image, timings, slot)
+    return defects, timings, slot.version
+
+def run_detection_batch(images: List[ImageInput]) -> Tuple[List[List[DefectDetection]], Dict[str, float], str]:
+    """Run batched detection (picklable entry point for worker processes)"""
+    timings: Dict[str, float] = {}
+    with model_manager.acquire() as slot:
+        reports = detection_service.detect_defects_batch(images, timings, slot)
+    return reports, timings, slot.version
+
+class InferenceExecutor:
+    """
+    Runs blocking model calls in a thread or process pool
+
+    Admission is bounded: at most `workers` calls run at once and at most
+    `queue_size` more may wait for a worker. Anything beyond that is rejected
+    with InferenceQueueFullError instead of queueing without limit.
+    """
+
+    def __init__(self, mode: str, workers: int, queue_size: int, retry_after: int):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unsupported inference executor mode: {mode}")
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.retry_after = retry_after
+        self._pool: Optional[Executor] = None
+        self._workers_ready: bool = False
+        self.in_flight: int = 0
+        self.rejected: int = 0
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of admitted requests (running plus waiting)"""
+        return self.workers + self.queue_size
+
+    async def start(self) -> None:
+        """Create the worker pool; in process mode wait until every worker has loaded models"""
+        if self._pool is not None:
+            return
+
+        if self.mode == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        else:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process_worker
+            )
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(*[
+                loop.run_in_executor(self._pool, _worker_models_ready) for _ in range(self.workers)
+            ])
+            self._workers_ready = all(results)
+            if not self._workers_ready:
+                logger.error("Some inference worker processes failed to load models")
+
+        logger.info(f"Inference executor started (mode={self.mode}, workers={self.workers}, queue_size={self.queue_size})")
+
+    def shutdown(self) -> None:
+        """Shut down the worker pool"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._workers_ready = False
+            logger.info("Inference executor stopped")
+
+    def is_ready(self) -> bool:
+        """Check whether models are available to the workers"""
+        if self.mode == "process":
+            return self._pool is not None and self._workers_ready
+        return model_manager.is_ready()
+
+    @contextmanager
+    def admit(self, weight: int = 1):
+        """
+        Reserve room for a request, rejecting it if the executor is saturated
+
+        Args:
+            weight: Number of images the request carries
+
+        Raises:
+            InferenceQueueFullError: If admitting the request would exceed capacity
+        """
+        # An idle executor always admits, so a batch larger than capacity is not starved
+        if self.in_flight > 0 and self.in_flight + weight > self.capacity:
+            self.rejected += 1
+            metrics.executor_rejected_total.inc()
+            raise InferenceQueueFullError(self.retry_after)
+        self.in_flight += weight
+        metrics.executor_in_flight.inc(weight)
+        try:
+            yield
+        finally:
+            self.in_flight -= weight
+            metrics.executor_in_flight.dec(weight)
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        """
+        Run a blocking function in the worker pool
+
+        In process mode `func` and its arguments must be picklable, so use the
+        module-level run_detection / run_detection_batch entry points.
+        """
+        if self._pool is None:
+            raise RuntimeError("Inference executor is not running")
+        return await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+
+# Global inference executor instance
+inference_executor = InferenceExecutor(
+    mode=settings.INFERENCE_EXECUTOR_MODE,
+    workers=settings.INFERENCE_WORKERS,
+    queue_size=settings.INFERENCE_QUEUE_SIZE,
+    retry_after=settings.INFERENCE_RETRY_AFTER_SECONDS
+)
@@ -0,0 +1,315 @@
+"""
+Bounded in-process queue for asynchronous detection jobs
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from pydantic import BaseModel
+from src.config.settings import settings
+from src.services import metrics
+
+logger = logging.getLogger(__name__)
+
+class JobQueueFullError(RuntimeError):
+    """Raised when the job queue cannot accept another job"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+class Job:
+    """One submitted unit of work and its outcome"""
+
+    def __init__(self, func: Optional[Callable[[], Awaitable[Any]]], kind: str, job_id: Optional[str] = None):
+        self.id: str = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.func: Optional[Callable[[], Awaitable[Any]]] = func
+        self.status: str = "queued"
+        self.created_at: float = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.error_status: Optional[int] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+class JobStore:
+    """
+    SQLite table of job states and results shared by all workers on the host
+
+    The worker that accepted a job runs it and writes every state change here,
+    so a poll answered by any other worker sees the same job. Calls block on
+    the file lock, so JobQueue makes them from its store thread only.
+    """
+
+    _COLUMNS = ("id", "kind", "status", "created_at", "started_at", "finished_at", "result", "error", "error_status")
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, created_at REAL NOT NULL, "
+            "started_at REAL, finished_at REAL, result TEXT, error TEXT, error_status INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_finished_at ON jobs (finished_at)")
+
+    @staticmethod
+    def row(job: Job) -> Tuple:
+        """Column values of a job, taken on the event loop before the write is handed off"""
+        result = job.result.model_dump(mode="json") if isinstance(job.result, BaseModel) else job.result
+        return (
+            job.id, job.kind, job.status, job.created_at, job.started_at, job.finished_at,
+            json.dumps(result) if result is not None else None, job.error, job.error_status
+        )
+
+    def save(self, row: Tuple) -> None:
+        """Insert or update a job from its row()"""
+        self._db.execute(
+            f"INSERT OR REPLACE INTO jobs ({', '.join(self._COLUMNS)}) VALUES ({', '.join('?' * len(self._COLUMNS))})",
+            row
+        )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Load a job; results come back as plain dicts"""
+        row = self._db.execute(f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        values = dict(zip(self._COLUMNS, row))
+        job = Job(None, values["kind"], job_id=values["id"])
+        for name in ("status", "created_at", "started_at", "finished_at", "error", "error_status"):
+            setattr(job, name, values[name])
+        job.result = json.loads(values["result"]) if values["result"] is not None else None
+        return job
+
+    def prune(self, cutoff: float) -> None:
+        """Delete jobs that finished before cutoff"""
+        self._db.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+
+    def count_finished(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM jobs WHERE finished_at IS NOT NULL").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+class JobQueue:
+    """
+    Runs submitted jobs with a fixed number of worker tasks
+
+    Submission never blocks: when queue_size jobs are already waiting, submit
+    raises JobQueueFullError with a retry hint. Finished jobs keep their result
+    for ttl_seconds and are then forgotten.
+
+    Jobs run in the process that accepted them. Without store_path their state
+    lives in that process only; with it, states and results are written to a
+    JobStore so every worker process can answer polls. Store calls run on a
+    single dedicated thread, in order, so waiting for the SQLite lock held by
+    another worker never stalls the event loop. Either way unfinished jobs are
+    lost on restart.
+    """
+
+    def __init__(self, queue_size: int, concurrency: int, ttl_seconds: float, retry_after: int, store_path: str = ""):
+        self.queue_size = max(1, queue_size)
+        self.concurrency = max(1, concurrency)
+        self.ttl_seconds = ttl_seconds
+        self.retry_after = retry_after
+        self.store_path = store_path
+        self._store: Optional[JobStore] = None
+        self._store_thread: Optional[ThreadPoolExecutor] = None
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.rejected: int = 0
+        self.running_jobs: int = 0
+
+    @property
+    def running(self) -> bool:
+        return any(not worker.done() for worker in self._workers)
+
+    @property
+    def shared(self) -> bool:
+        """Whether job states are visible to other worker processes"""
+        return bool(self.store_path)
+
+    def queue_depth(self) -> int:
+        """Jobs waiting for a worker"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self) -> None:
+        """Start the worker tasks on the running event loop"""
+        if self.running:
+            return
+        if self.store_path and self._store is None:
+            # Opened here rather than at import, so every forked worker gets its own connection
+            self._store_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+            self._store = self._store_thread.submit(JobStore, self.store_path).result()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        logger.info(f"Job queue started (concurrency={self.concurrency}, queue_size={self.queue_size})")
+
+    async def stop(self) -> None:
+        """Stop the workers; queued and running jobs are marked failed"""
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+        self._queue = None
+        metrics.job_queue_depth.set(0)
+        for job in self._jobs.values():
+            if not job.done:
+                await self._finish(job, error="Service shutting down", error_status=503)
+        if self._store is not None:
+            await self._store_call(self._store.close)
+            self._store_thread.shutdown()
+            self._store = None
+            self._store_thread = None
+        logger.info("Job queue stopped")
+
+    async def _store_call(self, method: Callable[..., Any], *args: Any) -> Any:
+        """Run a JobStore method on the store thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._store_thread, method, *args)
+
+    async def submit(self, func: Callable[[], Awaitable[Any]], kind: str) -> Job:
+        """
+        Queue a job
+
+        Args:
+            func: Coroutine function producing the job result
+            kind: Job type, reported back to the client
+
+        Returns:
+            The queued Job
+
+        Raises:
+            JobQueueFullError: If queue_size jobs are already waiting
+            RuntimeError: If the queue is not running
+        """
+        if not self.running:
+            raise RuntimeError("Job queue is not running")
+        await self._prune()
+
+        job = Job(func, kind)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            metrics.jobs_rejected_total.inc()
+            raise JobQueueFullError(self.retry_after)
+        self._jobs[job.id] = job
+        metrics.job_queue_depth.set(self.queue_depth())
+        await self._save(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        """
+        Look up a job; None if it never existed or its result expired
+
+        With a store, jobs of other workers are found too; their results are plain dicts.
+        """
+        await self._prune()
+        if self._store is not None:
+            return await self._store_call(self._store.get, job_id)
+        return self._jobs.get(job_id)
+
+    async def _save(self, job: Job) -> None:
+        """Write a job state change to the shared store"""
+        if self._store is None:
+            return
+        try:
+            await self._store_call(self._store.save, JobStore.row(job))
+        except sqlite3.Error as e:
+            logger.error(f"Failed to store job {job.id}: {str(e)}")
+
+    async def _prune(self) -> None:
+        """Forget finished jobs older than the TTL"""
+        cutoff = time.time() - self.ttl_seconds
+        expired = [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self._store is not None:
+            try:
+                await self._store_call(self._store.prune, cutoff)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to prune stored jobs: {str(e)}")
+
+    async def _finish(
+        self, job: Job, result: Any = None, error: Optional[str] = None, error_status: Optional[int] = None
+    ) -> None:
+        job.status = "failed" if error is not None else "succeeded"
+        job.result = result
+        job.error = error
+        job.error_status = error_status
+        job.finished_at = time.time()
+        job.func = None  # Drop the closure and the upload it holds
+        await self._save(job)
+
+    async def _work(self) -> None:
+        """Worker loop: run queued jobs one at a time"""
+        while True:
+            job = await self._queue.get()
+            metrics.job_queue_depth.set(self.queue_depth())
+            job.status = "running"
+            job.started_at = time.time()
+            await self._save(job)
+            self.running_jobs += 1
+            metrics.jobs_running.inc()
+            try:
+                await self._finish(job, result=await job.func())
+            except HTTPException as e:
+                await self._finish(job, error=str(e.detail), error_status=e.status_code)
+            except asyncio.CancelledError:
+                await self._finish(job, error="Service shutting down", error_status=503)
+                raise
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {str(e)}")
+                await self._finish(job, error=f"Internal server error: {str(e)}", error_status=500)
+            finally:
+                self.running_jobs -= 1
+                metrics.jobs_running.dec()
+                self._queue.task_done()
+
+    async def get_stats(self) -> Dict:
+        """Queue depth, running jobs and stored results"""
+        finished = sum(1 for job in self._jobs.values() if job.done)
+        if self._store is not None:
+            try:
+                finished = await self._store_call(self._store.count_finished)
+            except sqlite3.Error:
+                pass
+        return {
+            "running": self.running,
+            "queue_depth": self.queue_depth(),
+            "queue_size": self.queue_size,
+            "concurrency": self.concurrency,
+            "running_jobs": self.running_jobs,
+            "stored_results": finished,
+            "rejected": self.rejected,
+        }
+
+# Global job queue instance
+job_queue = JobQueue(
+    queue_size=settings.JOB_QUEUE_SIZE,
+    concurrency=settings.JOB_CONCURRENCY,
+    ttl_seconds=settings.JOB_RESULT_TTL_SECONDS,
+    retry_after=settings.JOB_RETRY_AFTER_SECONDS,
+    store_path=settings.JOB_STORE_PATH
+)
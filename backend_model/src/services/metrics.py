@@ -0,0 +1,144 @@
+"""
+Prometheus metrics for the detection pipeline
+
+Metrics are prometheus_client collectors. With several server workers the
+pre-fork server sets PROMETHEUS_MULTIPROC_DIR before any worker imports this
+module, so every worker writes its samples there and /metrics aggregates all
+of them, whichever worker answers the scrape.
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+from src.models.schemas import DefectDetection
+
+# Latency buckets in seconds, from fast cache hits up to slow CPU inference
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def multiprocess_enabled() -> bool:
+    """Whether samples are shared between worker processes through PROMETHEUS_MULTIPROC_DIR"""
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+def render() -> Tuple[bytes, str]:
+    """
+    Current metrics in Prometheus text format
+
+    Returns:
+        Exposition body and its content type
+    """
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+stage_seconds = Histogram(
+    "car_defects_stage_seconds",
+    "Time spent per pipeline stage (hash, decode, backbone, parts_inference, damage_inference, matching, serialization)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+request_seconds = Histogram(
+    "car_defects_request_seconds",
+    "End-to-end detection request latency",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS
+)
+requests_total = Counter(
+    "car_defects_requests_total",
+    "Detection requests received",
+    ["endpoint"]
+)
+images_total = Counter(
+    "car_defects_images_total",
+    "Images processed",
+    ["endpoint"]
+)
+errors_total = Counter(
+    "car_defects_errors_total",
+    "Detection requests that failed, by HTTP status",
+    ["endpoint", "status"]
+)
+requests_in_flight = Gauge(
+    "car_defects_requests_in_flight",
+    "Detection requests currently being processed",
+    ["endpoint"],
+    multiprocess_mode="livesum"
+)
+cache_lookups_total = Counter(
+    "car_defects_cache_lookups_total",
+    "Result cache lookups per image",
+    ["result"]
+)
+cascade_images_total = Counter(
+    "car_defects_cascade_images_total",
+    "Images run through the damage-first cascade, by whether the parts model ran or was skipped",
+    ["parts_model"]
+)
+defects_total = Counter(
+    "car_defects_detections_total",
+    "Defects reported by the models, per defect type and car part",
+    ["defect_type", "car_part"]
+)
+
+# Load of the serving components, updated where it changes
+executor_in_flight = Gauge(
+    "car_defects_executor_in_flight",
+    "Images admitted to the inference executor (running or waiting)",
+    multiprocess_mode="livesum"
+)
+executor_rejected_total = Counter(
+    "car_defects_executor_rejected_total",
+    "Requests rejected because the inference executor was saturated"
+)
+scheduler_queue_depth = Gauge(
+    "car_defects_scheduler_queue_depth",
+    "Requests waiting in the micro-batching scheduler",
+    multiprocess_mode="livesum"
+)
+job_queue_depth = Gauge(
+    "car_defects_job_queue_depth",
+    "Detection jobs waiting for a job worker",
+    multiprocess_mode="livesum"
+)
+jobs_running = Gauge(
+    "car_defects_jobs_running",
+    "Detection jobs currently running",
+    multiprocess_mode="livesum"
+)
+jobs_rejected_total = Counter(
+    "car_defects_jobs_rejected_total",
+    "Detection jobs rejected because the job queue was full"
+)
+
+# Keys of the timings dicts returned by DefectDetectionService, mapped to stage names
+_TIMING_STAGES: Dict[str, str] = {
+    "backbone_ms": "backbone",
+    "parts_inference_ms": "parts_inference",
+    "damage_inference_ms": "damage_inference",
+    "matching_ms": "matching",
+}
+
+def observe_model_timings(timings: Optional[Dict[str, float]]) -> None:
+    """
+    Record the stage times of one detection call
+
+    Timings come back from the inference executor rather than being recorded
+    where the models run, so they are collected in the serving process in both
+    thread and process executor modes.
+    """
+    for key, stage in _TIMING_STAGES.items():
+        if timings and key in timings:
+            stage_seconds.labels(stage=stage).observe(timings[key] / 1000)
+    if timings and "cascade_images" in timings:
+        skipped = timings["cascade_parts_skipped"]
+        cascade_images_total.labels(parts_model="skipped").inc(skipped)
+        cascade_images_total.labels(parts_model="run").inc(timings["cascade_images"] - skipped)
+
+def record_defects(defects: List[DefectDetection]) -> None:
+    """Count reported defects per type and part"""
+    for defect in defects:
+        defects_total.labels(defect_type=defect.defect_type, car_part=defect.car_part).inc()
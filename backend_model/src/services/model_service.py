@@ -2,50 +2,207 @@
 Model loading and management service
 """
 import torch
+import os
+import time
+import hashlib
 import logging
-from typing import Optional, Any
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Optional, Any, Dict, Iterator, List, Tuple
 from detectron2.engine import DefaultPredictor
-from detectron2.config import get_cfg
+from detectron2.config import CfgNode, get_cfg
 from detectron2 import model_zoo
 from src.config.settings import settings
+from src.services.weight_store import weight_store
 
 logger = logging.getLogger(__name__)
 
+class ModelReloadError(RuntimeError):
+    """Raised when a model reload cannot be started"""
+
+class ModelSlot:
+    """
+    One loaded model version: both predictors and the optional shared-backbone engine
+    
+    Requests take the active slot once (ModelManager.acquire) and run their
+    whole inference on it. A reload swaps in a new slot for later requests,
+    while requests already holding the old slot finish on it; the old models
+    are freed when the last of them is done.
+    """
+    
+    def __init__(
+        self,
+        version: str,
+        sources: Dict[str, str],
+        parts_predictor: Any,
+        damage_predictor: Any,
+        shared_backbone: Optional[Any] = None
+    ):
+        self.version = version
+        self.sources = sources
+        self.parts_predictor = parts_predictor
+        self.damage_predictor = damage_predictor
+        self.shared_backbone = shared_backbone
+        self.loaded_at: float = time.time()
+        self.in_flight: int = 0
+    
+    def describe(self) -> Dict[str, Any]:
+        """Version, weight sources and load state for status endpoints"""
+        return {
+            "version": self.version,
+            "parts_model": self.sources.get("parts"),
+            "damage_model": self.sources.get("damage"),
+            "loaded_at": self.loaded_at,
+            "in_flight": self.in_flight,
+        }
+
 class ModelManager:
-    """Manages loading and initialization of ML models"""
+    """
+    Manages loading and initialization of ML models
+    
+    Loaded models live in versioned slots. load_models fills the first slot,
+    reload loads another version next to it, warms it up and swaps it in
+    atomically.
+    """
+    
+    INFERENCE_BACKENDS = ("pytorch", "onnxruntime", "torchscript")
+    WARMUP_IMAGE_SIZE = (480, 640)  # height, width
     
     def __init__(self):
-        self.parts_predictor: Optional[DefaultPredictor] = None
-        self.damage_predictor: Optional[DefaultPredictor] = None
         self.severity_model: Optional[Any] = None
-        self.models_loaded: bool = False
-        
-    def _load_detectron2_model(
-        self, 
-        model_path: str, 
-        threshold: float, 
-        num_classes: int,
-        model_name: str = "Unknown"
-    ) -> DefaultPredictor:
-        """Load a Detectron2 model with given configuration"""
+        self._slot: Optional[ModelSlot] = None
+        self._draining: List[ModelSlot] = []
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.reload_status: Dict[str, Any] = {"state": "idle"}
+        self.configured_version: str = self._compute_model_version(self.default_sources())
+    
+    @property
+    def parts_predictor(self) -> Optional[Any]:
+        return self._slot.parts_predictor if self._slot else None
+    
+    @property
+    def damage_predictor(self) -> Optional[Any]:
+        return self._slot.damage_predictor if self._slot else None
+    
+    @property
+    def shared_backbone(self) -> Optional[Any]:
+        return self._slot.shared_backbone if self._slot else None
+    
+    @property
+    def models_loaded(self) -> bool:
+        return self._slot is not None
+    
+    @property
+    def model_version(self) -> str:
+        """Version of the active slot, or of the configured weights before anything is loaded"""
+        slot = self._slot
+        return slot.version if slot else self.configured_version
+    
+    @staticmethod
+    def default_sources() -> Dict[str, str]:
+        """Weight sources and expected checksums from the settings"""
+        return {
+            "parts": settings.PARTS_MODEL_PATH,
+            "damage": settings.DAMAGE_MODEL_PATH,
+            "parts_sha256": settings.PARTS_MODEL_SHA256,
+            "damage_sha256": settings.DAMAGE_MODEL_SHA256,
+        }
+    
+    @staticmethod
+    def _compute_model_version(sources: Dict[str, str]) -> str:
+        """Short fingerprint of the weights and model config"""
+        fingerprint = [
+            settings.DETECTRON2_CONFIG_FILE,
+            sources["parts"],
+            sources["damage"],
+            "int8-static" if settings.QUANTIZE_INT8 else "fp32",
+        ]
+        # Pinned checksums tell apart new weights published under the same path
+        fingerprint += [sources[key] for key in ("parts_sha256", "damage_sha256") if sources.get(key)]
+        return hashlib.sha256("|".join(fingerprint).encode()).hexdigest()[:12]
+    
+    @staticmethod
+    def cfg_digest(cfg: CfgNode) -> str:
+        """
+        Short fingerprint of a model config and its weights file
+        
+        Used to name derived artifacts (exported graphs, quantized models) so they
+        are rebuilt whenever the config or the local checkpoint changes.
+        """
+        fingerprint = cfg.dump()
+        if os.path.isfile(cfg.MODEL.WEIGHTS):
+            stat = os.stat(cfg.MODEL.WEIGHTS)
+            fingerprint += f"|{stat.st_size}|{stat.st_mtime_ns}"
+        return hashlib.sha256(fingerprint.encode()).hexdigest()[:12]
+    
+    @staticmethod
+    def build_cfg(model_path: str, threshold: float, num_classes: int, model_name: str = "Unknown") -> CfgNode:
+        """Build the Detectron2 config for one model"""
+        cfg = get_cfg()
+        cfg.merge_from_file(model_zoo.get_config_file(settings.DETECTRON2_CONFIG_FILE))
+        cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = threshold
+        cfg.MODEL.ROI_HEADS.NUM_CLASSES = num_classes
+        cfg.MODEL.WEIGHTS = model_path
+        
+        if settings.BOXES_ONLY:
+            # Mask head weights in the checkpoint are simply not loaded
+            cfg.MODEL.MASK_ON = False
+            logger.info(f"Mask head disabled for {model_name} model (boxes only)")
+        
+        # Set device
+        if torch.cuda.is_available() and settings.DEVICE == "cuda":
+            cfg.MODEL.DEVICE = 'cuda'
+            logger.info(f"Using CUDA for {model_name} model")
+        else:
+            cfg.MODEL.DEVICE = 'cpu'
+            logger.info(f"Using CPU for {model_name} model")
+        return cfg
+    
+    @staticmethod
+    def build_model_cfgs(sources: Optional[Dict[str, str]] = None) -> List[Tuple[str, CfgNode]]:
+        """Configs of the parts and damage models, with weights resolved through the weight store"""
+        sources = sources or ModelManager.default_sources()
+        return [
+            ("Parts Detection", ModelManager.build_cfg(
+                model_path=weight_store.resolve("parts", sources["parts"], sources.get("parts_sha256", "")),
+                threshold=settings.PARTS_MODEL_THRESHOLD,
+                num_classes=settings.PARTS_MODEL_NUM_CLASSES,
+                model_name="Parts Detection"
+            )),
+            ("Damage Detection", ModelManager.build_cfg(
+                model_path=weight_store.resolve("damage", sources["damage"], sources.get("damage_sha256", "")),
+                threshold=settings.DAMAGE_MODEL_THRESHOLD,
+                num_classes=settings.DAMAGE_MODEL_NUM_CLASSES,
+                model_name="Damage Detection"
+            )),
+        ]
+    
+    def _load_detectron2_model(self, cfg: CfgNode, model_name: str = "Unknown") -> Any:
+        """
+        Load a Detectron2 model with the configured inference backend
+        
+        "pytorch" returns an eager DefaultPredictor (with an INT8 backbone and box
+        heads when QUANTIZE_INT8 is set); the exported-graph backends return a predictor with
+        the same interface and output format.
+        """
         try:
-            logger.info(f"Loading {model_name} model from {model_path}")
+            logger.info(f"Loading {model_name} model from {cfg.MODEL.WEIGHTS} ({settings.INFERENCE_BACKEND} backend)")
             
-            cfg = get_cfg()
-            cfg.merge_from_file(model_zoo.get_config_file(settings.DETECTRON2_CONFIG_FILE))
-            cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = threshold
-            cfg.MODEL.ROI_HEADS.NUM_CLASSES = num_classes
-            cfg.MODEL.WEIGHTS = model_path
-            
-            # Set device
-            if torch.cuda.is_available() and settings.DEVICE == "cuda":
-                cfg.MODEL.DEVICE = 'cuda'
-                logger.info(f"Using CUDA for {model_name} model")
+            if settings.INFERENCE_BACKEND == "pytorch" and settings.QUANTIZE_INT8:
+                if cfg.MODEL.DEVICE != "cpu":
+                    logger.warning(f"INT8 quantization is CPU-only, loading {model_name} model in FP32")
+                    predictor = DefaultPredictor(cfg)
+                else:
+                    from src.services.quantization import load_quantized_predictor
+                    predictor = load_quantized_predictor(cfg, model_name)
+            elif settings.INFERENCE_BACKEND == "pytorch":
+                predictor = DefaultPredictor(cfg)
             else:
-                cfg.MODEL.DEVICE = 'cpu'
-                logger.info(f"Using CPU for {model_name} model")
-                
-            predictor = DefaultPredictor(cfg)
+                from src.services.inference_backends import load_exported_predictor
+                predictor = load_exported_predictor(cfg, model_name, settings.INFERENCE_BACKEND)
+            
             logger.info(f"Successfully loaded {model_name} model")
             return predictor
             
@@ -53,47 +210,264 @@ class ModelManager:
             logger.error(f"Failed to load {model_name} model: {str(e)}")
             raise
     
+    @staticmethod
+    def _configure_cpu_threads() -> None:
+        """
+        Set the intra-op thread budget for CPU inference
+        
+        With PARALLEL_MODELS both models run at the same time, each with its own
+        OpenMP team, so by default each gets half of the cores instead of both
+        oversubscribing all of them.
+        """
+        if torch.cuda.is_available() and settings.DEVICE == "cuda":
+            return
+        
+        num_threads = settings.TORCH_NUM_THREADS
+        if num_threads <= 0 and settings.PARALLEL_MODELS:
+            num_threads = max(1, torch.get_num_threads() // 2)
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+            logger.info(f"Using {num_threads} intra-op threads per model call")
+    
+    def load_slot(self, sources: Optional[Dict[str, str]] = None) -> ModelSlot:
+        """
+        Load and warm up one model version without activating it
+        
+        Args:
+            sources: Weight sources and expected checksums (defaults to the settings)
+            
+        Returns:
+            ModelSlot ready to be activated
+        """
+        if settings.INFERENCE_BACKEND not in self.INFERENCE_BACKENDS:
+            raise ValueError(f"Unsupported inference backend: {settings.INFERENCE_BACKEND}")
+        
+        sources = {**self.default_sources(), **(sources or {})}
+        (parts_name, parts_cfg), (damage_name, damage_cfg) = self.build_model_cfgs(sources)
+        
+        # Load parts detection model
+        parts_predictor = self._load_detectron2_model(parts_cfg, parts_name)
+        
+        # Load damage detection model
+        damage_predictor = self._load_detectron2_model(damage_cfg, damage_name)
+        
+        slot = ModelSlot(
+            version=self._compute_model_version(sources),
+            sources=sources,
+            parts_predictor=parts_predictor,
+            damage_predictor=damage_predictor,
+            shared_backbone=self._build_shared_backbone(parts_predictor, damage_predictor)
+        )
+        self._warm_up(slot)
+        return slot
+    
+    def _warm_up(self, slot: ModelSlot) -> None:
+        """Run a blank image through a slot so its first real request does not pay for lazy initialization"""
+        start_time = time.time()
+        image_arrays = [np.zeros((*self.WARMUP_IMAGE_SIZE, 3), dtype=np.uint8)]
+        if slot.shared_backbone is not None:
+            slot.shared_backbone(image_arrays, {})
+        else:
+            self.predict_batch(slot.parts_predictor, image_arrays)
+            self.predict_batch(slot.damage_predictor, image_arrays)
+        logger.info(f"Model version {slot.version} warmed up in {(time.time() - start_time) * 1000:.2f}ms")
+    
+    def activate(self, slot: ModelSlot) -> None:
+        """Make slot the one new requests run on; requests on the previous slot finish on it"""
+        with self._lock:
+            previous, self._slot = self._slot, slot
+            self._draining = [old for old in self._draining if old.in_flight > 0]
+            if previous is not None and previous.in_flight > 0:
+                self._draining.append(previous)
+        logger.info(
+            f"Activated model version {slot.version}"
+            + (f" (replacing {previous.version})" if previous is not None else "")
+        )
+    
     def load_models(self) -> bool:
         """Load all required models"""
         try:
             logger.info("Starting model loading process...")
+            self._configure_cpu_threads()
             
-            # Load parts detection model
-            self.parts_predictor = self._load_detectron2_model(
-                model_path=settings.PARTS_MODEL_PATH,
-                threshold=settings.PARTS_MODEL_THRESHOLD,
-                num_classes=settings.PARTS_MODEL_NUM_CLASSES,
-                model_name="Parts Detection"
-            )
-            
-            # Load damage detection model
-            self.damage_predictor = self._load_detectron2_model(
-                model_path=settings.DAMAGE_MODEL_PATH,
-                threshold=settings.DAMAGE_MODEL_THRESHOLD,
-                num_classes=settings.DAMAGE_MODEL_NUM_CLASSES,
-                model_name="Damage Detection"
-            )
+            self.activate(self.load_slot())
             
             # Load severity model (placeholder)
             # TODO: Implement severity model loading when available
             self.severity_model = None
             
-            self.models_loaded = True
             logger.info("All models loaded successfully")
             return True
             
         except Exception as e:
             logger.error(f"Failed to load models: {str(e)}")
-            self.models_loaded = False
             return False
     
-    def get_parts_predictor(self) -> DefaultPredictor:
+    def begin_reload(self, sources: Optional[Dict[str, str]] = None) -> str:
+        """
+        Claim the reload lock for a new model version
+        
+        Args:
+            sources: Weight sources and checksums to override (defaults to the settings)
+            
+        Returns:
+            Version the reload will activate
+            
+        Raises:
+            ModelReloadError: If another reload is still running
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            raise ModelReloadError(f"Reload to version {self.reload_status.get('target_version')} is already in progress")
+        sources = {**self.default_sources(), **{key: value for key, value in (sources or {}).items() if value is not None}}
+        target_version = self._compute_model_version(sources)
+        self.reload_status = {
+            "state": "loading",
+            "target_version": target_version,
+            "sources": sources,
+            "started_at": time.time(),
+        }
+        return target_version
+    
+    def finish_reload(self) -> bool:
+        """
+        Load, warm up and activate the version claimed by begin_reload (blocking)
+        
+        Runs while the current slot keeps serving. On failure the current slot
+        stays active and the error is kept in reload_status.
+        
+        Returns:
+            True if the new version was activated
+        """
+        status = self.reload_status
+        try:
+            logger.info(f"Reloading models, target version {status['target_version']}")
+            slot = self.load_slot(status["sources"])
+            self.activate(slot)
+            self.reload_status = {**status, "state": "succeeded", "finished_at": time.time()}
+            return True
+        except Exception as e:
+            logger.error(f"Model reload to version {status['target_version']} failed, keeping {self.model_version}: {str(e)}")
+            self.reload_status = {**status, "state": "failed", "error": str(e), "finished_at": time.time()}
+            return False
+        finally:
+            self._reload_lock.release()
+    
+    def reload(self, sources: Optional[Dict[str, str]] = None) -> bool:
+        """Load a new model version and swap it in (blocking)"""
+        self.begin_reload(sources)
+        return self.finish_reload()
+    
+    @contextmanager
+    def acquire(self) -> Iterator[ModelSlot]:
+        """
+        Pin the active slot for the duration of one inference
+        
+        Raises:
+            RuntimeError: If no models are loaded
+        """
+        with self._lock:
+            slot = self._slot
+            if slot is None:
+                raise RuntimeError("Models are not loaded")
+            slot.in_flight += 1
+        try:
+            yield slot
+        finally:
+            with self._lock:
+                slot.in_flight -= 1
+                if slot.in_flight == 0 and slot in self._draining:
+                    # Last request on a replaced version: release its models
+                    self._draining.remove(slot)
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Active and draining versions plus the state of the last reload"""
+        with self._lock:
+            self._draining = [old for old in self._draining if old.in_flight > 0]
+            return {
+                "active": self._slot.describe() if self._slot else None,
+                "draining": [old.describe() for old in self._draining],
+                "reload": dict(self.reload_status),
+            }
+    
+    @staticmethod
+    def prepare_inputs(predictor: DefaultPredictor, image_arrays: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """
+        Build model inputs the way DefaultPredictor.__call__ does
+        
+        Applies format handling and the test-time resize, and converts each image
+        to a CHW float tensor on the model device.
+        """
+        inputs = []
+        for original_image in image_arrays:
+            if predictor.input_format == "RGB":
+                original_image = original_image[:, :, ::-1]
+            height, width = original_image.shape[:2]
+            image = predictor.aug.get_transform(original_image).apply_image(original_image)
+            image = torch.as_tensor(image.astype("float32").transpose(2, 0, 1))
+            image = image.to(predictor.cfg.MODEL.DEVICE)
+            inputs.append({"image": image, "height": height, "width": width})
+        return inputs
+
+    @staticmethod
+    def predict_batch(predictor: DefaultPredictor, image_arrays: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """
+        Run a single batched forward pass of a predictor over several images
+
+        Mirrors DefaultPredictor.__call__ (format handling, test-time resize)
+        but hands all images to the model at once instead of one by one.
+
+        Args:
+            predictor: Loaded DefaultPredictor
+            image_arrays: Images in the same layout DefaultPredictor accepts
+
+        Returns:
+            List of prediction dicts (one per image), same as DefaultPredictor output
+        """
+        if not image_arrays:
+            return []
+
+        batch_predict = getattr(predictor, "predict_batch", None)
+        if batch_predict is not None:
+            # Exported-graph predictors handle batching themselves
+            return batch_predict(image_arrays)
+
+        with torch.no_grad():
+            return predictor.model(ModelManager.prepare_inputs(predictor, image_arrays))
+
+    def _build_shared_backbone(self, parts_predictor: Any, damage_predictor: Any) -> Optional[Any]:
+        """
+        Build the shared-backbone engine if enabled and both models allow it
+        
+        Returns None (two independent forward passes) when SHARED_BACKBONE is off
+        or when the checkpoints do not share backbone weights and preprocessing.
+        """
+        if not settings.SHARED_BACKBONE:
+            return None
+        if settings.INFERENCE_BACKEND != "pytorch":
+            logger.warning(f"Shared backbone is not supported with the {settings.INFERENCE_BACKEND} backend")
+            return None
+        if settings.QUANTIZE_INT8:
+            # Each model's INT8 backbone is calibrated on its own, so the weights never match
+            logger.warning("Shared backbone is not supported with QUANTIZE_INT8")
+            return None
+        
+        from src.services.shared_backbone import SharedBackboneEngine
+        
+        compatible, reason = SharedBackboneEngine.can_share(parts_predictor, damage_predictor)
+        if not compatible:
+            logger.warning(f"Shared backbone disabled, falling back to two-model inference: {reason}")
+            return None
+        
+        logger.info("Parts and damage models share backbone weights, using shared-backbone inference")
+        return SharedBackboneEngine(parts_predictor, damage_predictor)
+    
+    def get_parts_predictor(self) -> Any:
         """Get the parts detection predictor"""
         if not self.parts_predictor:
             raise RuntimeError("Parts detection model not loaded")
         return self.parts_predictor
     
-    def get_damage_predictor(self) -> DefaultPredictor:
+    def get_damage_predictor(self) -> Any:
         """Get the damage detection predictor"""
         if not self.damage_predictor:
             raise RuntimeError("Damage detection model not loaded")
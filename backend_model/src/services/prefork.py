@@ -0,0 +1,247 @@
+"""
+Pre-fork server: load models once, then fork the HTTP workers
+
+    python -m src.services.prefork --workers 4
+
+The parent process loads the models and binds the listening socket, then
+forks SERVER_WORKERS uvicorn workers that accept on that socket. Workers
+inherit the already-loaded models and share their memory pages with the
+parent copy-on-write, since inference only reads the weights. Resident
+memory therefore grows by the per-worker Python heap and activations, not
+by a full copy of both models per worker.
+
+Caveats:
+- CUDA cannot be initialized before fork, and INFERENCE_EXECUTOR_MODE=process
+  loads models in separate processes anyway. In both cases the parent does
+  not preload, and each worker loads its own models in the app lifespan.
+- The in-memory result cache and the batch scheduler are per worker. Share
+  the SQLite cache tier (RESULT_CACHE_DISK_PATH) between workers if needed.
+- With more than one worker, job states go to a SQLite file (JOB_STORE_PATH,
+  a fresh temporary file unless set) so any worker can answer job polls.
+- With more than one worker, Prometheus metrics use prometheus_client's
+  multiprocess mode: samples go to PROMETHEUS_MULTIPROC_DIR (a fresh
+  temporary directory unless set) and /metrics sums them over all workers.
+"""
+import argparse
+import gc
+import glob
+import logging
+import os
+import signal
+import socket
+import tempfile
+import time
+from typing import Dict, Optional
+
+import torch
+
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# A worker that dies sooner than this after starting is restarted with a delay
+MIN_WORKER_UPTIME_SECONDS = 5.0
+RESTART_DELAY_SECONDS = 1.0
+
+def can_preload() -> bool:
+    """Whether models can be loaded in the parent and shared with forked workers"""
+    if torch.cuda.is_available() and settings.DEVICE == "cuda":
+        logger.warning("CUDA cannot be shared across fork, every worker loads its own models")
+        return False
+    if settings.INFERENCE_EXECUTOR_MODE == "process":
+        logger.warning("INFERENCE_EXECUTOR_MODE=process loads models in executor processes, not preloading")
+        return False
+    return True
+
+def worker_threads(workers: int) -> int:
+    """Intra-op threads per worker so that all workers together use the cores once"""
+    if settings.TORCH_NUM_THREADS > 0:
+        return settings.TORCH_NUM_THREADS
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+    if settings.PARALLEL_MODELS:
+        num_threads = max(1, num_threads // 2)
+    return num_threads
+
+def prepare_metrics_dir(workers: int) -> None:
+    """
+    Let the workers share Prometheus metrics through prometheus_client multiprocess mode
+
+    Must run before anything imports prometheus_client. Sample files left by a
+    previous run are removed, otherwise their counts would be added to this one's.
+    """
+    if workers <= 1:
+        return
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.path.join(
+        tempfile.gettempdir(), f"car-defects-metrics-{os.getpid()}"
+    )
+    os.makedirs(path, exist_ok=True)
+    for sample_file in glob.glob(os.path.join(path, "*.db")):
+        os.remove(sample_file)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    logger.info(f"Sharing metrics between workers through {path}")
+
+def prepare_job_store(workers: int) -> None:
+    """Give the workers a shared job store so a job can be polled through any of them"""
+    if workers <= 1 or settings.JOB_STORE_PATH:
+        return
+    path = os.path.join(tempfile.gettempdir(), f"car-defects-jobs-{os.getpid()}.sqlite3")
+    for stale_file in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(stale_file):
+            os.remove(stale_file)
+    settings.JOB_STORE_PATH = path
+    logger.info(f"Sharing job states between workers through {path}")
+
+def preload_models(workers: int) -> bool:
+    """
+    Load the models in the parent process before forking
+
+    Loading runs with one intra-op thread: an OpenMP thread team started in
+    the parent does not survive fork and can deadlock the workers' first
+    parallel region. Workers set their own thread budget after fork.
+
+    Returns:
+        True if the models were loaded
+    """
+    from src.services.model_service import model_manager
+
+    num_threads = settings.TORCH_NUM_THREADS
+    settings.TORCH_NUM_THREADS = 1
+    try:
+        loaded = model_manager.load_models()
+    finally:
+        settings.TORCH_NUM_THREADS = num_threads
+
+    if not loaded:
+        logger.error("Failed to preload models, workers will try to load their own")
+        return False
+
+    # Move everything allocated so far out of the collector's reach, so collections
+    # in the workers do not write to (and thereby copy) the pages holding the models
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Models preloaded in parent process {os.getpid()}, sharing them with {workers} workers")
+    return True
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """Create the listening socket shared by all workers"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(sock: socket.socket) -> None:
+    """Serve the app on the inherited socket (runs in the forked child)"""
+    import uvicorn
+    from main import app
+    from src.services.model_service import ModelManager
+
+    ModelManager._configure_cpu_threads()
+    config = uvicorn.Config(
+        app,
+        log_level="info" if not settings.DEBUG else "debug",
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+class PreforkServer:
+    """Parent process: forks the workers, restarts crashed ones and forwards shutdown signals"""
+
+    def __init__(self, sock: socket.socket, workers: int):
+        self.sock = sock
+        self.workers = max(1, workers)
+        self.children: Dict[int, float] = {}  # pid -> start time
+        self.stopping: bool = False
+
+    def spawn(self) -> int:
+        """Fork one worker"""
+        pid = os.fork()
+        if pid == 0:
+            # Child: default signal handling until uvicorn installs its own
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            exit_code = 0
+            try:
+                run_worker(self.sock)
+            except BaseException:
+                logger.exception("Worker crashed")
+                exit_code = 1
+            finally:
+                # Skip the parent's atexit handlers and finalizers
+                os._exit(exit_code)
+        self.children[pid] = time.monotonic()
+        logger.info(f"Started worker {pid}")
+        return pid
+
+    def stop(self, signum: int, frame: Optional[object] = None) -> None:
+        """Ask every worker to shut down gracefully"""
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info(f"Received signal {signum}, stopping {len(self.children)} workers")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        """Fork the workers and supervise them until all have exited"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for _ in range(self.workers):
+            self.spawn()
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started_at = self.children.pop(pid, None)
+            if started_at is None:
+                continue
+            if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+                from prometheus_client import multiprocess
+                # Drop the gauges of the dead worker (in-flight requests, queue depths)
+                multiprocess.mark_process_dead(pid)
+            if self.stopping:
+                logger.info(f"Worker {pid} stopped")
+                continue
+
+            logger.error(f"Worker {pid} exited unexpectedly (status {os.waitstatus_to_exitcode(status)}), restarting")
+            if time.monotonic() - started_at < MIN_WORKER_UPTIME_SECONDS:
+                time.sleep(RESTART_DELAY_SECONDS)
+            if not self.stopping:
+                self.spawn()
+
+        self.sock.close()
+        logger.info("All workers stopped")
+
+def main() -> None:
+    from src.utils.image_utils import setup_logging
+
+    parser = argparse.ArgumentParser(description="Serve the API from forked workers sharing preloaded models")
+    parser.add_argument("--host", default=settings.HOST)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS, help="HTTP worker processes")
+    args = parser.parse_args()
+
+    setup_logging("INFO" if not settings.DEBUG else "DEBUG")
+    settings.SERVER_WORKERS = args.workers
+    prepare_metrics_dir(args.workers)
+    prepare_job_store(args.workers)
+
+    if can_preload():
+        preload_models(args.workers)
+    # Applied by each worker after fork
+    settings.TORCH_NUM_THREADS = worker_threads(args.workers)
+
+    sock = bind_socket(args.host, args.port)
+    logger.info(f"Listening on {args.host}:{args.port} with {args.workers} workers")
+    PreforkServer(sock, args.workers).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+INT8 quantization of Detectron2 models for CPU inference
+
+The ResNet backbone (backbone.bottom_up) and the FPN convolutions, which take
+almost all of Mask R-CNN's CPU time, are quantized statically: activation
+ranges are calibrated on a fixed image set and the convolutions then run as
+INT8 kernels. The box head FCs and predictors are quantized dynamically.
+RPN, ROI pooling and the mask head stay FP32.
+"""
+import logging
+import os
+import warnings
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.ao.quantization import DeQuantStub, QuantStub
+from detectron2.config import CfgNode
+from detectron2.engine import DefaultPredictor
+from src.config.settings import settings
+from src.services.model_service import ModelManager
+
+logger = logging.getLogger(__name__)
+
+# Layer types quantized dynamically (weights INT8, activations quantized on the fly)
+QUANTIZED_LAYER_TYPES = {torch.nn.Linear}
+
+# Bumped whenever the quantized module layout changes, so stale caches are not loaded
+QUANTIZATION_VERSION = 2
+
+_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+def quantization_engine() -> str:
+    """Quantized kernel library for this CPU (x86/fbgemm on Intel and AMD, qnnpack on ARM)"""
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in torch.backends.quantized.supported_engines:
+            return engine
+    raise RuntimeError("PyTorch was built without quantized CPU kernels")
+
+def _fold_conv(conv: torch.nn.Conv2d) -> torch.nn.Conv2d:
+    """
+    Plain Conv2d with the wrapper's frozen batch norm folded into its weights
+
+    Detectron2's Conv2d applies its norm inside forward, which eager-mode
+    quantization cannot fuse, so the (frozen) affine transform is baked into
+    the convolution instead.
+    """
+    if getattr(conv, "activation", None) is not None:
+        raise ValueError("convolutions with a built-in activation are not supported")
+    folded = torch.nn.Conv2d(
+        conv.in_channels, conv.out_channels, conv.kernel_size,
+        stride=conv.stride, padding=conv.padding, dilation=conv.dilation, groups=conv.groups, bias=True
+    )
+    weight = conv.weight.detach()
+    bias = conv.bias.detach() if conv.bias is not None else torch.zeros(conv.out_channels)
+    norm = getattr(conv, "norm", None)
+    if norm is not None:
+        if not hasattr(norm, "running_var"):
+            raise ValueError(f"cannot fold {type(norm).__name__} into a convolution")
+        scale = norm.running_var.detach().add(norm.eps).rsqrt()
+        if getattr(norm, "weight", None) is not None:
+            scale = scale * norm.weight.detach()
+        shift = -norm.running_mean.detach() * scale
+        if getattr(norm, "bias", None) is not None:
+            shift = shift + norm.bias.detach()
+        weight = weight * scale.reshape(-1, 1, 1, 1)
+        bias = bias * scale + shift
+    folded.weight.data.copy_(weight)
+    folded.bias.data.copy_(bias)
+    return folded
+
+class _QuantizableStem(torch.nn.Module):
+    """BasicStem: conv1 (+ folded norm) -> ReLU -> 3x3 max pool"""
+
+    def __init__(self, stem: torch.nn.Module):
+        super().__init__()
+        self.conv1 = _fold_conv(stem.conv1)
+        self.relu = torch.nn.ReLU()
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return F.max_pool2d(self.relu(self.conv1(x)), kernel_size=3, stride=2, padding=1)
+
+    def fuse(self) -> None:
+        torch.ao.quantization.fuse_modules(self, [["conv1", "relu"]], inplace=True)
+
+class _QuantizableBottleneck(torch.nn.Module):
+    """BottleneckBlock with the residual add and final ReLU as one quantized op"""
+
+    def __init__(self, block: torch.nn.Module):
+        super().__init__()
+        if hasattr(block, "conv2_offset"):
+            raise ValueError("deformable convolution blocks are not supported")
+        self.conv1 = _fold_conv(block.conv1)
+        self.relu1 = torch.nn.ReLU()
+        self.conv2 = _fold_conv(block.conv2)
+        self.relu2 = torch.nn.ReLU()
+        self.conv3 = _fold_conv(block.conv3)
+        self.shortcut = _fold_conv(block.shortcut) if block.shortcut is not None else None
+        self.add_relu = torch.ao.nn.quantized.FloatFunctional()
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        out = self.relu1(self.conv1(x))
+        out = self.relu2(self.conv2(out))
+        out = self.conv3(out)
+        shortcut = self.shortcut(x) if self.shortcut is not None else x
+        return self.add_relu.add_relu(out, shortcut)
+
+    def fuse(self) -> None:
+        torch.ao.quantization.fuse_modules(self, [["conv1", "relu1"], ["conv2", "relu2"]], inplace=True)
+
+class QuantizableResNet(torch.nn.Module):
+    """
+    Drop-in replacement for Detectron2's ResNet bottom-up network
+
+    The input is quantized once, every stage runs on INT8 tensors and the
+    feature maps FPN reads are dequantized on the way out, so FPN and the heads
+    see the same dict of float tensors as before.
+    """
+
+    def __init__(self, resnet: torch.nn.Module):
+        super().__init__()
+        if getattr(resnet, "num_classes", None) is not None:
+            raise ValueError("ResNet classification heads are not supported")
+        self.quant = QuantStub()
+        self.stem = _QuantizableStem(resnet.stem)
+        self.stage_names = list(resnet.stage_names)
+        self.stages = torch.nn.ModuleList(
+            torch.nn.Sequential(*[_QuantizableBottleneck(block) for block in stage]) for stage in resnet.stages
+        )
+        self.dequant = DeQuantStub()
+        self._out_features = list(resnet._out_features)
+        self._output_shape = resnet.output_shape()
+
+    def output_shape(self) -> Dict:
+        return self._output_shape
+
+    @property
+    def size_divisibility(self) -> int:
+        return 0
+
+    def forward(self, x: torch.Tensor) -> Dict[str, torch.Tensor]:
+        outputs = {}
+        x = self.stem(self.quant(x))
+        if "stem" in self._out_features:
+            outputs["stem"] = self.dequant(x)
+        for name, stage in zip(self.stage_names, self.stages):
+            x = stage(x)
+            if name in self._out_features:
+                outputs[name] = self.dequant(x)
+        return outputs
+
+    def fuse(self) -> None:
+        self.stem.fuse()
+        for stage in self.stages:
+            for block in stage:
+                block.fuse()
+
+class QuantizableConv(torch.nn.Module):
+    """
+    A single FPN convolution run in INT8
+
+    FPN adds and upsamples its levels in float, so each lateral and output
+    convolution quantizes its input and dequantizes its result on its own.
+    """
+
+    def __init__(self, conv: torch.nn.Module):
+        super().__init__()
+        self.quant = QuantStub()
+        self.conv = _fold_conv(conv)
+        self.dequant = DeQuantStub()
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.dequant(self.conv(self.quant(x)))
+
+    def fuse(self) -> None:
+        pass
+
+def _replace_fpn_convs(fpn: torch.nn.Module) -> List[QuantizableConv]:
+    """Swap FPN's lateral and output convolutions (kept both as attributes and in lists)"""
+    replaced = []
+    for conv_list in (fpn.lateral_convs, fpn.output_convs):
+        for index, conv in enumerate(conv_list):
+            quantizable = QuantizableConv(conv)
+            for name, child in list(fpn.named_children()):
+                if child is conv:
+                    setattr(fpn, name, quantizable)
+            conv_list[index] = quantizable
+            replaced.append(quantizable)
+    return replaced
+
+def prepare_backbone(model: torch.nn.Module) -> List[torch.nn.Module]:
+    """
+    Swap the backbone for quantizable modules with calibration observers
+
+    Returns:
+        The prepared modules; run images through the model, then pass them
+        to convert_backbone
+    """
+    backbone = model.backbone
+    if not hasattr(backbone, "bottom_up"):
+        raise ValueError(f"{type(backbone).__name__} backbone is not supported (expected FPN)")
+
+    backbone.bottom_up = QuantizableResNet(backbone.bottom_up)
+    modules = [backbone.bottom_up] + _replace_fpn_convs(backbone)
+
+    torch.backends.quantized.engine = quantization_engine()
+    qconfig = torch.ao.quantization.get_default_qconfig(torch.backends.quantized.engine)
+    for module in modules:
+        module.eval()
+        module.fuse()
+        module.qconfig = qconfig
+        torch.ao.quantization.prepare(module, inplace=True)
+    return modules
+
+def convert_backbone(modules: List[torch.nn.Module]) -> None:
+    """Replace the calibrated modules' float convolutions with INT8 kernels"""
+    with warnings.catch_warnings():
+        # Uncalibrated observers (when restoring a cached model) warn about default ranges
+        warnings.simplefilter("ignore", UserWarning)
+        for module in modules:
+            torch.ao.quantization.convert(module, inplace=True)
+
+def quantize_heads(model: torch.nn.Module) -> torch.nn.Module:
+    """Replace the model's Linear layers with dynamically quantized INT8 versions"""
+    return torch.ao.quantization.quantize_dynamic(model.eval(), QUANTIZED_LAYER_TYPES, dtype=torch.qint8, inplace=True)
+
+def quantized_model_path(cfg: CfgNode, model_name: str) -> str:
+    """Location of the cached quantized state dict for a model config"""
+    slug = model_name.lower().replace(" ", "_")
+    return os.path.join(
+        settings.QUANTIZED_MODEL_DIR,
+        f"{slug}-{ModelManager.cfg_digest(cfg)}-int8-v{QUANTIZATION_VERSION}.pt"
+    )
+
+def load_calibration_images(images_dir: str, limit: int) -> List[np.ndarray]:
+    """
+    Up to limit photos from images_dir as BGR arrays
+
+    Without a directory random images are used, which only roughly calibrates
+    activation ranges; point QUANTIZATION_CALIBRATION_DIR at real photos.
+    """
+    import cv2
+
+    if not images_dir:
+        logger.warning("No QUANTIZATION_CALIBRATION_DIR set, calibrating INT8 ranges on random images")
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 256, size=(720, 960, 3), dtype=np.uint8) for _ in range(min(limit, 4))]
+
+    image_arrays = []
+    for name in sorted(os.listdir(images_dir)):
+        if len(image_arrays) >= limit:
+            break
+        if name.lower().endswith(_IMAGE_EXTENSIONS):
+            image_array = cv2.imread(os.path.join(images_dir, name), cv2.IMREAD_COLOR)
+            if image_array is not None:
+                image_arrays.append(image_array)
+    if not image_arrays:
+        raise ValueError(f"No calibration images found in {images_dir}")
+    return image_arrays
+
+def load_quantized_predictor(
+    cfg: CfgNode,
+    model_name: str,
+    calibration_images: Optional[List[np.ndarray]] = None,
+    force: bool = False
+) -> DefaultPredictor:
+    """
+    Build a DefaultPredictor whose backbone and box heads run in INT8
+
+    The first load (or force) calibrates the FP32 model on calibration_images
+    (by default QUANTIZATION_CALIBRATION_DIR), converts it and saves the
+    quantized state dict. Later loads build the quantized module layout
+    without reading the FP32 checkpoint and restore the cached INT8 weights.
+
+    Args:
+        cfg: Detectron2 config of the model (device must be CPU)
+        model_name: Human-readable model name
+        calibration_images: BGR uint8 images to calibrate activation ranges on
+        force: Recalibrate even if a cached model exists
+
+    Returns:
+        DefaultPredictor with a quantized model
+    """
+    cache_path = quantized_model_path(cfg, model_name)
+
+    if os.path.isfile(cache_path) and not force:
+        logger.info(f"Loading cached INT8 {model_name} model from {cache_path}")
+        skeleton_cfg = cfg.clone()
+        skeleton_cfg.MODEL.WEIGHTS = ""
+        predictor = DefaultPredictor(skeleton_cfg)
+        quantize_heads(predictor.model)
+        convert_backbone(prepare_backbone(predictor.model))
+        predictor.model.load_state_dict(torch.load(cache_path, map_location="cpu"))
+        predictor.cfg = cfg
+        return predictor
+
+    if calibration_images is None:
+        calibration_images = load_calibration_images(
+            settings.QUANTIZATION_CALIBRATION_DIR, settings.QUANTIZATION_CALIBRATION_IMAGES
+        )
+
+    predictor = DefaultPredictor(cfg)
+    quantize_heads(predictor.model)
+    modules = prepare_backbone(predictor.model)
+    logger.info(f"Calibrating INT8 {model_name} backbone on {len(calibration_images)} images")
+    with torch.no_grad():
+        for image_array in calibration_images:
+            predictor(image_array)
+    convert_backbone(modules)
+
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    torch.save(predictor.model.state_dict(), tmp_path)
+    os.replace(tmp_path, cache_path)
+    logger.info(f"Quantized {model_name} model to INT8, cached at {cache_path}")
+    return predictor
@@ -0,0 +1,203 @@
+"""
+Content-addressed cache of defect detection results
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from src.config.settings import settings
+from src.models.schemas import DefectDetection
+
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """
+    Two-tier cache of detection reports keyed by image content
+
+    The key combines the SHA-256 of the uploaded bytes with the model version,
+    inference backend and detection thresholds, so a re-submitted photo is answered without
+    decoding or inference, while a weight or threshold change never serves
+    stale results.
+
+    Tiers:
+    - in-memory LRU bounded by max_entries, entries expire after ttl_seconds
+    - optional SQLite file shared by all workers on the host, same TTL
+    """
+
+    _PRUNE_EVERY_WRITES = 100
+    # Bump when preprocessing changes so older stored results are not served
+    KEY_VERSION = 3
+
+    def __init__(self, max_entries: int, ttl_seconds: float, disk_path: str = "", disk_max_entries: int = 0):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self._memory: "OrderedDict[str, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_writes = 0
+        self.hits: Dict[str, int] = {"memory": 0, "disk": 0}
+        self.misses: int = 0
+
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, disk_path: str) -> None:
+        """Open (and create if needed) the SQLite tier"""
+        try:
+            directory = os.path.dirname(disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS detection_results ("
+                "key TEXT PRIMARY KEY, report TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._disk.execute(
+                "CREATE INDEX IF NOT EXISTS idx_detection_results_created_at ON detection_results (created_at)"
+            )
+            logger.info(f"Result cache disk tier at {disk_path}")
+        except sqlite3.Error as e:
+            logger.error(f"Failed to open result cache database {disk_path}: {str(e)}")
+            self._disk = None
+
+    @staticmethod
+    def make_key(content_hash: str, model_version: str) -> str:
+        """Build a cache key from the image hash, model version and detection parameters"""
+        return (
+            f"v{ResultCache.KEY_VERSION}:{content_hash}:{model_version}:{settings.INFERENCE_BACKEND}:"
+            f"{settings.PARTS_MODEL_THRESHOLD}:{settings.DAMAGE_MODEL_THRESHOLD}:"
+            f"{settings.MAX_IMAGE_SIDE}:{settings.IMAGE_DECODER}"
+        )
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[List[DefectDetection]]:
+        """
+        Look up a cached report
+
+        Returns:
+            Cached list of DefectDetection objects, or None on a miss
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, report = entry
+                if not self._expired(created_at):
+                    self._memory.move_to_end(key)
+                    self.hits["memory"] += 1
+                    return [DefectDetection(**defect) for defect in report]
+                del self._memory[key]
+
+            if self._disk is not None:
+                try:
+                    row = self._disk.execute(
+                        "SELECT report, created_at FROM detection_results WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"Result cache disk lookup failed: {str(e)}")
+                    row = None
+                if row is not None and not self._expired(row[1]):
+                    report = json.loads(row[0])
+                    self._put_memory(key, report, row[1])
+                    self.hits["disk"] += 1
+                    return [DefectDetection(**defect) for defect in report]
+
+            self.misses += 1
+            return None
+
+    def _put_memory(self, key: str, report: List[Dict], created_at: float) -> None:
+        """Insert into the LRU tier, evicting the least recently used entries"""
+        self._memory[key] = (created_at, report)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def put(self, key: str, defects: List[DefectDetection]) -> None:
+        """Store a report in all enabled tiers"""
+        report = [defect.model_dump() for defect in defects]
+        created_at = time.time()
+        with self._lock:
+            self._put_memory(key, report, created_at)
+
+            if self._disk is not None:
+                try:
+                    self._disk.execute(
+                        "INSERT OR REPLACE INTO detection_results (key, report, created_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(report), created_at)
+                    )
+                    self._disk_writes += 1
+                    if self._disk_writes % self._PRUNE_EVERY_WRITES == 0:
+                        self._prune_disk()
+                except sqlite3.Error as e:
+                    logger.warning(f"Result cache disk write failed: {str(e)}")
+
+    def _prune_disk(self) -> None:
+        """Drop expired rows and trim the disk tier to disk_max_entries"""
+        if self.ttl_seconds > 0:
+            self._disk.execute(
+                "DELETE FROM detection_results WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+        if self.disk_max_entries > 0:
+            self._disk.execute(
+                "DELETE FROM detection_results WHERE key IN ("
+                "SELECT key FROM detection_results ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.disk_max_entries,)
+            )
+
+    def clear(self) -> None:
+        """Remove all cached results"""
+        with self._lock:
+            self._memory.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM detection_results")
+
+    def _reopen_after_fork(self) -> None:
+        """Give a forked worker its own lock and SQLite connection (neither may cross fork)"""
+        self._lock = threading.Lock()
+        self._disk = None
+        if self.disk_path:
+            self._open_disk(self.disk_path)
+
+    def close(self) -> None:
+        """Close the disk tier"""
+        with self._lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
+
+    def get_stats(self) -> Dict:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            disk_entries = None
+            if self._disk is not None:
+                try:
+                    disk_entries = self._disk.execute("SELECT COUNT(*) FROM detection_results").fetchone()[0]
+                except sqlite3.Error:
+                    disk_entries = None
+            lookups = self.hits["memory"] + self.hits["disk"] + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "memory_hits": self.hits["memory"],
+                "disk_hits": self.hits["disk"],
+                "misses": self.misses,
+                "hit_ratio": round((self.hits["memory"] + self.hits["disk"]) / lookups, 4) if lookups else 0.0
+            }
+
+# Global result cache instance
+result_cache = ResultCache(
+    max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+    disk_path=settings.RESULT_CACHE_DISK_PATH,
+    disk_max_entries=settings.RESULT_CACHE_DISK_MAX_ENTRIES
+)
+# Workers forked by the pre-fork server must not share the parent's SQLite connection
+os.register_at_fork(after_in_child=result_cache._reopen_after_fork)
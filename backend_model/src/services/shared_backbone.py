@@ -0,0 +1,108 @@
+"""
+Shared-backbone inference for the parts and damage models
+"""
+import time
+import logging
+import torch
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+from detectron2.engine import DefaultPredictor
+from detectron2.modeling.meta_arch import GeneralizedRCNN
+from src.services.model_service import ModelManager
+
+logger = logging.getLogger(__name__)
+
+class SharedBackboneEngine:
+    """
+    Runs both Mask R-CNN models on a single set of backbone features
+
+    Both predictors are built from the same mask_rcnn_R_50_FPN_3x config. When
+    the checkpoints also share ResNet-50 + FPN weights (e.g. heads fine-tuned on
+    a frozen common backbone), the features are computed once and each model's
+    RPN and ROI heads run on them. This is the same computation as
+    GeneralizedRCNN.inference, minus the second backbone pass.
+    """
+
+    def __init__(self, parts_predictor: DefaultPredictor, damage_predictor: DefaultPredictor):
+        self.parts_predictor = parts_predictor
+        self.damage_predictor = damage_predictor
+
+    @staticmethod
+    def can_share(parts_predictor: DefaultPredictor, damage_predictor: DefaultPredictor) -> Tuple[bool, str]:
+        """
+        Check whether two predictors can run on the same backbone features
+
+        Returns:
+            (compatible, reason) - reason explains why sharing is not possible
+        """
+        parts_model = parts_predictor.model
+        damage_model = damage_predictor.model
+
+        if parts_predictor.input_format != damage_predictor.input_format:
+            return False, "input formats differ"
+
+        parts_input, damage_input = parts_predictor.cfg.INPUT, damage_predictor.cfg.INPUT
+        if (parts_input.MIN_SIZE_TEST, parts_input.MAX_SIZE_TEST) != (damage_input.MIN_SIZE_TEST, damage_input.MAX_SIZE_TEST):
+            return False, "test-time resize settings differ"
+
+        if not (torch.equal(parts_model.pixel_mean, damage_model.pixel_mean)
+                and torch.equal(parts_model.pixel_std, damage_model.pixel_std)):
+            return False, "pixel normalization differs"
+
+        parts_state = parts_model.backbone.state_dict()
+        damage_state = damage_model.backbone.state_dict()
+        if parts_state.keys() != damage_state.keys():
+            return False, "backbone architectures differ"
+
+        for name, tensor in parts_state.items():
+            if not torch.equal(tensor, damage_state[name]):
+                return False, f"backbone weights differ (first mismatch: {name})"
+
+        return True, ""
+
+    @staticmethod
+    def _run_heads(model: Any, images: Any, features: Dict[str, torch.Tensor], inputs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run RPN and ROI heads of one model on precomputed features"""
+        proposals, _ = model.proposal_generator(images, features, None)
+        results, _ = model.roi_heads(images, features, proposals, None)
+        return GeneralizedRCNN._postprocess(results, inputs, images.image_sizes)
+
+    def __call__(
+        self,
+        image_arrays: List[np.ndarray],
+        timings: Optional[Dict[str, float]] = None
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Detect parts and damage on a batch of images with one backbone pass
+
+        Args:
+            image_arrays: Images in the layout DefaultPredictor accepts
+            timings: Optional dict that receives backbone and per-head times in ms
+
+        Returns:
+            (parts_predictions, damage_predictions), each a list of prediction
+            dicts in DefaultPredictor output format
+        """
+        timings = timings if timings is not None else {}
+        if not image_arrays:
+            return [], []
+
+        parts_model = self.parts_predictor.model
+        damage_model = self.damage_predictor.model
+
+        with torch.no_grad():
+            start_time = time.time()
+            inputs = ModelManager.prepare_inputs(self.parts_predictor, image_arrays)
+            images = parts_model.preprocess_image(inputs)
+            features = parts_model.backbone(images.tensor)
+            timings["backbone_ms"] = round((time.time() - start_time) * 1000, 2)
+
+            start_time = time.time()
+            parts_predictions = self._run_heads(parts_model, images, features, inputs)
+            timings["parts_inference_ms"] = round((time.time() - start_time) * 1000, 2)
+
+            start_time = time.time()
+            damage_predictions = self._run_heads(damage_model, images, features, inputs)
+            timings["damage_inference_ms"] = round((time.time() - start_time) * 1000, 2)
+
+        return parts_predictions, damage_predictions
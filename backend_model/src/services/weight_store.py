@@ -0,0 +1,272 @@
+"""
+Local model weight store with SHA-256 verification
+
+Usage (from backend_model/):
+    python -m src.services.weight_store prefetch   # download configured weights
+    python -m src.services.weight_store verify     # re-check stored checksums
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import urllib.parse
+import urllib.request
+from typing import Dict, Optional
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class WeightChecksumError(ValueError):
+    """Raised when a weight file does not match its expected SHA-256"""
+
+def sha256_file(path: str, chunk_size: int = 4 * 1024 * 1024) -> str:
+    """Compute SHA-256 of a file, reading it in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _is_remote(source: str) -> bool:
+    return source.startswith(("http://", "https://"))
+
+class WeightStore:
+    """
+    Directory of model checkpoints plus a manifest of their sources and checksums
+
+    ModelManager asks the store for a local path before loading a model, so a
+    prefetched store makes cold start depend on disk reads only. The manifest
+    (manifest.json) is keyed by source URL or path and records the model name,
+    file name, SHA-256, size and mtime of what was fetched from it. Checksums
+    are verified when weights are fetched and by the verify command; loading
+    only compares size and mtime unless WEIGHT_STORE_VERIFY asks for a re-hash. Stored files are named
+    after their checksum, so fetching a new source for a model never overwrites
+    the file a loaded version came from.
+    """
+
+    MANIFEST_NAME = "manifest.json"
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.root, self.MANIFEST_NAME)
+
+    def _read_manifest(self) -> Dict[str, Dict]:
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Weight store manifest unreadable, ignoring it: {str(e)}")
+            return {}
+
+    def _write_manifest(self, manifest: Dict[str, Dict]) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _local_path(self, name: str, source: str, sha256: str) -> str:
+        # Take the extension from the URL path, not its query string
+        path = urllib.parse.urlparse(source).path if _is_remote(source) else source
+        return os.path.join(self.root, f"{name}-{sha256[:16]}{os.path.splitext(path)[1] or '.pth'}")
+
+    def fetch(self, name: str, source: str, expected_sha256: str = "") -> str:
+        """
+        Copy or download weights into the store and record their checksum
+
+        The file is written to a temporary name and only moved into place after
+        the checksum has been verified, so a partial download is never used.
+
+        Args:
+            name: Model name, e.g. "parts"
+            source: URL or local path of the checkpoint
+            expected_sha256: Optional checksum the file must match
+
+        Returns:
+            Path of the stored file
+
+        Raises:
+            WeightChecksumError: If the file does not match expected_sha256
+        """
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+
+        logger.info(f"Fetching {name} weights from {source}")
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=f".{name}-", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                if _is_remote(source):
+                    reader = urllib.request.urlopen(source, timeout=settings.WEIGHT_STORE_DOWNLOAD_TIMEOUT)
+                else:
+                    reader = open(source, "rb")
+                with reader:
+                    for chunk in iter(lambda: reader.read(4 * 1024 * 1024), b""):
+                        digest.update(chunk)
+                        out.write(chunk)
+                        size += len(chunk)
+
+            sha256 = digest.hexdigest()
+            if expected_sha256 and sha256 != expected_sha256.lower():
+                raise WeightChecksumError(
+                    f"{name} weights from {source} have SHA-256 {sha256}, expected {expected_sha256}"
+                )
+            target_path = self._local_path(name, source, sha256)
+            os.replace(tmp_path, target_path)
+            mtime_ns = os.stat(target_path).st_mtime_ns
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with self._lock:
+            manifest = self._read_manifest()
+            manifest[source] = {
+                "name": name,
+                "file": os.path.basename(target_path),
+                "sha256": sha256,
+                "size": size,
+                "mtime_ns": mtime_ns
+            }
+            self._write_manifest(manifest)
+
+        logger.info(f"Stored {name} weights at {target_path} ({size / (1024 * 1024):.1f}MB, sha256 {sha256})")
+        return target_path
+
+    def lookup(self, name: str, source: str, expected_sha256: str = "", verify: bool = True) -> Optional[str]:
+        """
+        Find stored weights for a model without touching the network
+
+        Args:
+            verify: Re-hash the file; otherwise only its size and mtime are
+                compared with the manifest
+
+        Returns:
+            Local path if the store holds weights from this source that pass the
+            checks, otherwise None
+        """
+        entry = self._read_manifest().get(source)
+        if not entry:
+            return None
+
+        path = os.path.join(self.root, entry["file"])
+        if not os.path.isfile(path):
+            return None
+
+        if expected_sha256 and entry["sha256"] != expected_sha256.lower():
+            logger.warning(f"Stored {name} weights do not match the configured SHA-256")
+            return None
+
+        # Entries written before mtimes were recorded only have their size checked
+        stat = os.stat(path)
+        if (stat.st_size != entry.get("size", stat.st_size)
+                or stat.st_mtime_ns != entry.get("mtime_ns", stat.st_mtime_ns)):
+            logger.warning(f"Stored {name} weights changed on disk since they were fetched")
+            return None
+
+        if verify:
+            actual = sha256_file(path)
+            if actual != entry["sha256"]:
+                logger.error(f"Stored {name} weights are corrupted (sha256 {actual}, manifest {entry['sha256']})")
+                return None
+
+        return path
+
+    def resolve(self, name: str, source: str, expected_sha256: str = "") -> str:
+        """
+        Return the path ModelManager should load weights from
+
+        Order: copy in the store (full re-hash only with WEIGHT_STORE_VERIFY), then the source itself if it is a
+        local file (checked against expected_sha256), then a download into the
+        store if WEIGHT_STORE_DOWNLOAD_ON_MISS is set. If none applies, the
+        source URL is returned unchanged and Detectron2 downloads it as before.
+        """
+        stored_path = self.lookup(name, source, expected_sha256, verify=settings.WEIGHT_STORE_VERIFY)
+        if stored_path:
+            logger.info(f"Using {name} weights from local store: {stored_path}")
+            return stored_path
+
+        if not _is_remote(source):
+            if expected_sha256 and sha256_file(source) != expected_sha256.lower():
+                raise WeightChecksumError(f"{name} weights at {source} do not match the configured SHA-256")
+            return source
+
+        if settings.WEIGHT_STORE_DOWNLOAD_ON_MISS:
+            return self.fetch(name, source, expected_sha256)
+
+        logger.warning(f"{name} weights not in local store, loading from {source}")
+        return source
+
+    def configured_models(self) -> Dict[str, Dict[str, str]]:
+        """Weights the service is configured to load"""
+        return {
+            "parts": {"source": settings.PARTS_MODEL_PATH, "sha256": settings.PARTS_MODEL_SHA256},
+            "damage": {"source": settings.DAMAGE_MODEL_PATH, "sha256": settings.DAMAGE_MODEL_SHA256},
+        }
+
+    def prefetch(self, force: bool = False) -> bool:
+        """Make sure every configured model is present and verified in the store"""
+        ok = True
+        for name, model in self.configured_models().items():
+            try:
+                if not force and self.lookup(name, model["source"], model["sha256"]):
+                    logger.info(f"{name} weights already in store")
+                    continue
+                self.fetch(name, model["source"], model["sha256"])
+            except Exception as e:
+                logger.error(f"Failed to prefetch {name} weights: {str(e)}")
+                ok = False
+        return ok
+
+    def verify(self) -> bool:
+        """Re-hash every stored file and compare with the manifest"""
+        ok = True
+        for source, entry in self._read_manifest().items():
+            name = entry.get("name", source)
+            path = os.path.join(self.root, entry["file"])
+            if not os.path.isfile(path):
+                logger.error(f"{name}: missing file {path}")
+                ok = False
+                continue
+            actual = sha256_file(path)
+            if actual != entry["sha256"]:
+                logger.error(f"{name}: checksum mismatch ({actual} != {entry['sha256']})")
+                ok = False
+            else:
+                logger.info(f"{name}: OK ({entry['sha256']})")
+        return ok
+
+    def disk_usage(self) -> int:
+        """Total bytes of stored weight files"""
+        return sum(entry.get("size", 0) for entry in self._read_manifest().values())
+
+# Global weight store instance
+weight_store = WeightStore(settings.WEIGHT_STORE_DIR)
+
+def main() -> None:
+    from src.utils.image_utils import setup_logging
+
+    parser = argparse.ArgumentParser(description="Manage the local model weight store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    prefetch_parser = subparsers.add_parser("prefetch", help="Download configured weights into the store")
+    prefetch_parser.add_argument("--force", action="store_true", help="Re-download even if already stored")
+    subparsers.add_parser("verify", help="Verify checksums of stored weights")
+    args = parser.parse_args()
+
+    setup_logging("INFO")
+    if args.command == "prefetch":
+        ok = weight_store.prefetch(force=args.force)
+    else:
+        ok = weight_store.verify()
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
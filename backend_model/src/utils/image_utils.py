@@ -2,46 +2,321 @@
 Utility functions for the API
 """
 import io
+import os
+import mmap
+import hashlib
 import logging
+import numpy as np
+from typing import NamedTuple, Optional, Tuple, Union
 from PIL import Image
 from fastapi import UploadFile, HTTPException
 from src.config.settings import settings
+from src.services import metrics
+
+try:
+    import cv2
+except ImportError:  # Optional: falls back to PIL decoding
+    cv2 = None
 
 logger = logging.getLogger(__name__)
 
+class DecodedImage(NamedTuple):
+    """Upload decoded straight into the layout DefaultPredictor expects"""
+    array: np.ndarray  # (H, W, 3) uint8, BGR, C-contiguous
+    original_size: Tuple[int, int]  # (width, height) before any downscaling
+
+# Anything the detection service accepts as an image
+ImageInput = Union[Image.Image, DecodedImage]
+
 class ImageProcessor:
     """Utility class for image processing operations"""
     
+    # Leading bytes of each accepted format, mapped to PIL format names
+    FORMAT_SIGNATURES: Tuple[Tuple[bytes, str], ...] = (
+        (b"\xff\xd8\xff", "JPEG"),
+        (b"\x89PNG\r\n\x1a\n", "PNG"),
+        (b"BM", "BMP"),
+        (b"II*\x00", "TIFF"),
+        (b"MM\x00*", "TIFF"),
+    )
+    
     @staticmethod
-    def validate_image_file(file: UploadFile) -> None:
+    def sniff_format(header: bytes) -> Optional[str]:
+        """
+        Detect the image format from the first bytes of a file
+        
+        Args:
+            header: At least the first 8 bytes of the file
+            
+        Returns:
+            PIL format name, or None if the signature is not an accepted format
+        """
+        for signature, image_format in ImageProcessor.FORMAT_SIGNATURES:
+            if header.startswith(signature):
+                return image_format
+        return None
+    
+    @staticmethod
+    def get_upload_size(file: UploadFile) -> int:
+        """
+        Size of the received upload in bytes
+        
+        The upload is already spooled by the multipart parser, so seeking to the
+        end gives the real size without reading it, whatever the client declared.
+        """
+        size = file.file.seek(0, os.SEEK_END)
+        file.file.seek(0)
+        return size
+    
+    @staticmethod
+    def validate_image_file(file: UploadFile) -> str:
         """
         Validate uploaded image file
         
+        Checks the actual upload size and the format signature in the file
+        header; the file name and declared content type are not trusted.
+        
         Args:
             file: FastAPI UploadFile object
             
+        Returns:
+            Detected PIL format name
+            
         Raises:
             HTTPException: If file is invalid
         """
-        if file.size and file.size > settings.MAX_FILE_SIZE:
+        if ImageProcessor.get_upload_size(file) > settings.MAX_FILE_SIZE:
             raise HTTPException(
                 status_code=413,
                 detail=f"File size exceeds maximum allowed size of {settings.MAX_FILE_SIZE // (1024*1024)}MB"
             )
         
-        if file.filename:
-            file_ext = '.' + file.filename.split('.')[-1].lower()
-            if file_ext not in settings.ALLOWED_EXTENSIONS:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Unsupported file format. Allowed formats: {', '.join(settings.ALLOWED_EXTENSIONS)}"
-                )
+        try:
+            header = file.file.read(16)
+        finally:
+            file.file.seek(0)
+        
+        image_format = ImageProcessor.sniff_format(header)
+        if image_format is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported file format. Allowed formats: {', '.join(sorted(settings.ALLOWED_IMAGE_FORMATS))}"
+            )
+        return image_format
+    
+    @staticmethod
+    def compute_content_hash(file: UploadFile, chunk_size: int = 1024 * 1024) -> str:
+        """
+        Compute SHA-256 of the uploaded file contents
+        
+        Reads the file in chunks and rewinds it afterwards, so the image can
+        still be loaded from the same UploadFile.
+        
+        Args:
+            file: FastAPI UploadFile object
+            chunk_size: Bytes read per iteration
+            
+        Returns:
+            Hex digest of the file contents
+        """
+        digest = hashlib.sha256()
+        try:
+            with metrics.stage_seconds.labels(stage="hash").time():
+                for chunk in iter(lambda: file.file.read(chunk_size), b""):
+                    digest.update(chunk)
+        finally:
+            file.file.seek(0)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def cap_resolution(image: Image.Image, max_side: int) -> Image.Image:
+        """
+        Shrink an opened (not yet decoded) image so its longer side is at most max_side
+        
+        For JPEG, Image.draft makes libjpeg decode straight to a 1/2, 1/4 or 1/8
+        scale that is still at least the target size, instead of the full frame.
+        The remaining downscale is a cheap resize of the already small image.
+        
+        Args:
+            image: PIL Image returned by Image.open
+            max_side: Maximum length of the longer side, 0 disables the cap
+            
+        Returns:
+            Image decoded at capped resolution
+        """
+        width, height = image.size
+        if max_side <= 0 or max(width, height) <= max_side:
+            return image
+        
+        ratio = max_side / max(width, height)
+        target_size = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+        
+        image.draft("RGB", target_size)
+        if image.size != target_size:
+            image = image.resize(target_size, resample=Image.BILINEAR)
+        return image
+    
+    @staticmethod
+    def get_box_scale(image: ImageInput) -> Tuple[float, float]:
+        """
+        Factors that map boxes predicted on a capped image back to original pixels
+        
+        Returns:
+            (scale_x, scale_y), (1.0, 1.0) when the image was not downscaled
+        """
+        if isinstance(image, DecodedImage):
+            original_size = image.original_size
+            size = (image.array.shape[1], image.array.shape[0])
+        else:
+            original_size = image.info.get("original_size")
+            size = image.size
+        if not original_size or tuple(original_size) == size:
+            return 1.0, 1.0
+        return original_size[0] / size[0], original_size[1] / size[1]
+    
+    @staticmethod
+    def to_model_input(image: ImageInput) -> np.ndarray:
+        """
+        Image as the (H, W, 3) BGR uint8 array DefaultPredictor takes
+        
+        DefaultPredictor always expects BGR input and converts it itself when
+        the model's INPUT.FORMAT is RGB. Decoded uploads are already in that
+        layout; PIL images are converted with a single copy.
+        """
+        if isinstance(image, DecodedImage):
+            return image.array
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return np.ascontiguousarray(np.asarray(image)[:, :, ::-1])
+    
+    @staticmethod
+    def _read_header(file: UploadFile) -> Image.Image:
+        """
+        Parse the image header of an upload without decoding pixel data
+        
+        Raises:
+            HTTPException: If the image has more than settings.MAX_IMAGE_PIXELS pixels
+        """
+        file.file.seek(0)
+        # Only accepted decoders are tried
+        image = Image.open(file.file, formats=sorted(settings.ALLOWED_IMAGE_FORMATS))
+        width, height = image.size
+        if width * height > settings.MAX_IMAGE_PIXELS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Image dimensions {width}x{height} exceed the maximum of {settings.MAX_IMAGE_PIXELS} pixels"
+            )
+        return image
+    
+    @staticmethod
+    def _reduced_decode_flag(image_format: str, size: Tuple[int, int], target_size: Tuple[int, int]) -> int:
+        """
+        OpenCV imread flag that makes libjpeg-turbo decode at 1/2, 1/4 or 1/8 scale
+        
+        Picks the smallest scale that is still at least target_size, like
+        Image.draft does for the PIL path. Other formats decode at full size.
+        """
+        if image_format == "JPEG":
+            for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)):
+                if -(-size[0] // factor) >= target_size[0] and -(-size[1] // factor) >= target_size[1]:
+                    return flag
+        return cv2.IMREAD_COLOR
+    
+    @staticmethod
+    def _imdecode_upload(file: UploadFile, flags: int) -> Optional[np.ndarray]:
+        """
+        Run cv2.imdecode over the upload's bytes without copying them
+        
+        Small uploads are held by the multipart parser in memory and are read
+        through their buffer; larger ones are spooled to disk and memory-mapped.
+        """
+        raw = getattr(file.file, "_file", file.file)  # SpooledTemporaryFile wraps BytesIO or a real file
+        if isinstance(raw, io.BytesIO):
+            buffer = raw.getbuffer()
+        else:
+            try:
+                buffer = mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ)
+            except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+                file.file.seek(0)
+                buffer = file.file.read()
+        return cv2.imdecode(np.frombuffer(buffer, dtype=np.uint8), flags | cv2.IMREAD_IGNORE_ORIENTATION)
+    
+    @staticmethod
+    def decode_image_from_upload(file: UploadFile) -> DecodedImage:
+        """
+        Decode an uploaded image directly into a contiguous BGR uint8 array
+        
+        With OpenCV available (settings.IMAGE_DECODER == "opencv"), the bytes go
+        straight to libjpeg-turbo / libpng, which write BGR pixels into the
+        output array, and large JPEGs are decoded at reduced DCT scale. There
+        are no intermediate PIL images or RGB copies. Otherwise, or if OpenCV
+        cannot decode the file, the PIL path is used and converted once.
+        
+        Args:
+            file: FastAPI UploadFile object
+            
+        Returns:
+            DecodedImage with the BGR array and the original image size
+            
+        Raises:
+            HTTPException: If image cannot be loaded
+        """
+        with metrics.stage_seconds.labels(stage="decode").time():
+            return ImageProcessor._decode(file)
+    
+    @staticmethod
+    def _decode(file: UploadFile) -> DecodedImage:
+        """Decode implementation behind decode_image_from_upload"""
+        if cv2 is None or settings.IMAGE_DECODER != "opencv":
+            image = ImageProcessor.load_image_from_upload(file)
+            return DecodedImage(ImageProcessor.to_model_input(image), image.info["original_size"])
+        
+        try:
+            header = ImageProcessor._read_header(file)
+            original_size = header.size
+            
+            max_side = settings.MAX_IMAGE_SIDE
+            target_size = original_size
+            if max_side > 0 and max(original_size) > max_side:
+                ratio = max_side / max(original_size)
+                target_size = (max(1, round(original_size[0] * ratio)), max(1, round(original_size[1] * ratio)))
+            
+            array = ImageProcessor._imdecode_upload(
+                file, ImageProcessor._reduced_decode_flag(header.format, original_size, target_size)
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to load image: {str(e)}")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid image file: {str(e)}"
+            )
+        finally:
+            file.file.seek(0)
+        
+        if array is None:
+            logger.warning("OpenCV could not decode image, falling back to PIL")
+            image = ImageProcessor.load_image_from_upload(file)
+            return DecodedImage(ImageProcessor.to_model_input(image), image.info["original_size"])
+        
+        if (array.shape[1], array.shape[0]) != target_size:
+            array = cv2.resize(array, target_size, interpolation=cv2.INTER_AREA)
+        
+        logger.info(f"Successfully decoded image: {target_size} pixels (original {original_size})")
+        return DecodedImage(array, original_size)
     
     @staticmethod
     def load_image_from_upload(file: UploadFile) -> Image.Image:
         """
         Load PIL Image from uploaded file
         
+        The image is decoded directly from the spooled upload without copying
+        its bytes. Images larger than settings.MAX_IMAGE_SIDE are decoded at
+        reduced resolution; the original size is kept in image.info["original_size"].
+        Images above settings.MAX_IMAGE_PIXELS are rejected from their header,
+        before any pixel data is decoded.
+        
         Args:
             file: FastAPI UploadFile object
             
@@ -52,16 +327,23 @@ class ImageProcessor:
             HTTPException: If image cannot be loaded
         """
         try:
-            contents = file.file.read()
+            # Decode straight from the spooled upload
+            image = ImageProcessor._read_header(file)
+            original_size = image.size
             
-            image = Image.open(io.BytesIO(contents))
+            image = ImageProcessor.cap_resolution(image, settings.MAX_IMAGE_SIDE)
             
             if image.mode != 'RGB':
                 image = image.convert('RGB')
+            # Finish decoding while the upload is still positioned for it
+            image.load()
+            image.info["original_size"] = original_size
             
-            logger.info(f"Successfully loaded image: {image.size} pixels, mode: {image.mode}")
+            logger.info(f"Successfully loaded image: {image.size} pixels (original {original_size}), mode: {image.mode}")
             return image
             
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Failed to load image: {str(e)}")
             raise HTTPException(
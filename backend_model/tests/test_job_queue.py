@@ -0,0 +1,172 @@
+"""
+Job queue lifecycle, limits, expiry and the shared job store
+"""
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from src.services.job_queue import JobQueue, JobQueueFullError, JobStore
+
+def _queue(**kwargs) -> JobQueue:
+    options = dict(queue_size=4, concurrency=1, ttl_seconds=60, retry_after=3)
+    options.update(kwargs)
+    return JobQueue(**options)
+
+async def _wait_done(queue: JobQueue, job_id: str):
+    for _ in range(200):
+        job = await queue.get(job_id)
+        if job.done:
+            return job
+        await asyncio.sleep(0.005)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+def test_job_runs_from_queued_to_succeeded():
+    async def scenario():
+        queue = _queue()
+        queue.start()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return {"total_defects": 0}
+
+        job = await queue.submit(work, "find_defects")
+        assert job.status == "queued"
+        await asyncio.sleep(0.01)
+        assert (await queue.get(job.id)).status == "running"
+        assert (await queue.get_stats())["running_jobs"] == 1
+
+        release.set()
+        job = await _wait_done(queue, job.id)
+        assert job.status == "succeeded"
+        assert job.result == {"total_defects": 0}
+        assert job.func is None
+        assert (await queue.get_stats())["stored_results"] == 1
+        await queue.stop()
+
+    asyncio.run(scenario())
+
+def test_failed_job_keeps_http_status():
+    async def scenario():
+        queue = _queue()
+        queue.start()
+
+        async def invalid():
+            raise HTTPException(status_code=400, detail="Invalid image file")
+
+        async def broken():
+            raise ValueError("boom")
+
+        invalid_job = await _wait_done(queue, (await queue.submit(invalid, "find_defects")).id)
+        broken_job = await _wait_done(queue, (await queue.submit(broken, "find_defects")).id)
+        assert (invalid_job.status, invalid_job.error_status, invalid_job.error) == ("failed", 400, "Invalid image file")
+        assert (broken_job.status, broken_job.error_status) == ("failed", 500)
+        await queue.stop()
+
+    asyncio.run(scenario())
+
+def test_full_queue_rejects_with_retry_hint():
+    async def scenario():
+        queue = _queue(queue_size=1)
+        queue.start()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+
+        await queue.submit(work, "find_defects")
+        await asyncio.sleep(0.01)  # First job is running, the queue is empty again
+        await queue.submit(work, "find_defects")
+        with pytest.raises(JobQueueFullError) as error:
+            await queue.submit(work, "find_defects")
+        assert error.value.retry_after == 3
+        assert (await queue.get_stats())["rejected"] == 1
+        release.set()
+        await queue.stop()
+
+    asyncio.run(scenario())
+
+def test_finished_jobs_expire(monkeypatch):
+    async def scenario():
+        queue = _queue(ttl_seconds=60)
+        queue.start()
+
+        async def work():
+            return 1
+
+        job = await _wait_done(queue, (await queue.submit(work, "find_defects")).id)
+        finished_at = job.finished_at
+        monkeypatch.setattr("src.services.job_queue.time.time", lambda: finished_at + 61)
+        assert await queue.get(job.id) is None
+        await queue.stop()
+
+    asyncio.run(scenario())
+
+def test_stop_fails_unfinished_jobs():
+    async def scenario():
+        queue = _queue()
+        queue.start()
+
+        async def work():
+            await asyncio.sleep(60)
+
+        running = await queue.submit(work, "find_defects")
+        queued = await queue.submit(work, "find_defects")
+        await asyncio.sleep(0.01)
+        await queue.stop()
+
+        for job in (running, queued):
+            assert (job.status, job.error_status) == ("failed", 503)
+        with pytest.raises(RuntimeError):
+            await queue.submit(work, "find_defects")
+
+    asyncio.run(scenario())
+
+def test_store_makes_jobs_visible_to_other_workers(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "jobs.sqlite3")
+        accepting = _queue(store_path=path)
+        other = _queue(store_path=path)
+        accepting.start()
+        other.start()
+
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return {"total_defects": 2}
+
+        job = await accepting.submit(work, "find_defects_batch")
+        assert (await other.get(job.id)).status in ("queued", "running")
+        release.set()
+        await _wait_done(accepting, job.id)
+
+        seen = await other.get(job.id)
+        assert (seen.kind, seen.status, seen.result) == ("find_defects_batch", "succeeded", {"total_defects": 2})
+        assert await other.get("unknown") is None
+        await accepting.stop()
+        await other.stop()
+
+    asyncio.run(scenario())
+
+def test_store_calls_run_off_the_event_loop(tmp_path, monkeypatch):
+    async def scenario():
+        threads = set()
+        save = JobStore.save
+
+        def recording_save(store, row):
+            threads.add(threading.current_thread().name)
+            save(store, row)
+
+        monkeypatch.setattr(JobStore, "save", recording_save)
+        queue = _queue(store_path=str(tmp_path / "jobs.sqlite3"))
+        queue.start()
+
+        async def work():
+            return 1
+
+        await _wait_done(queue, (await queue.submit(work, "find_defects")).id)
+        await queue.stop()
+        assert threads and all(name.startswith("job-store") for name in threads)
+
+    asyncio.run(scenario())
@@ -0,0 +1,51 @@
+"""
+Damage-to-part matching must return exactly what the per-detection loops did
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("detectron2")
+torch = pytest.importorskip("torch")
+
+from benchmarks.bench_matching import legacy_post_process, vectorized_post_process
+from benchmarks.fake_predictors import make_predictions
+from src.config.settings import settings
+from src.services.detection_service import DefectDetectionService, Detections
+
+@pytest.fixture(scope="module")
+def service():
+    return DefectDetectionService()
+
+def _detections(boxes, labels, scores=None):
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores if scores is not None else [0.9] * len(labels), dtype=np.float32)
+    return Detections(scores, boxes, list(labels))
+
+@pytest.mark.parametrize("seed", range(10))
+def test_matches_legacy_loops_on_random_scenes(service, seed):
+    generator = torch.Generator().manual_seed(seed)
+    parts = make_predictions(200, settings.PARTS_MODEL_NUM_CLASSES, 1920, 1080, generator)
+    damages = make_predictions(200, settings.DAMAGE_MODEL_NUM_CLASSES, 1920, 1080, generator)
+
+    assert vectorized_post_process(service, parts, damages) == legacy_post_process(service, parts, damages)
+
+def test_equal_overlap_keeps_first_part(service):
+    damages = _detections([[10, 10, 20, 20]], ["Dent"])
+    parts = _detections([[0, 0, 30, 30], [0, 0, 30, 30]], ["Hood", "Fender"])
+
+    assert [(defect, part) for defect, part, _ in service._match_damage_to_parts(damages, parts)] == [("Dent", "Hood")]
+
+def test_small_overlap_is_not_matched(service):
+    # IoU 16/546 for the dent, 121/441 for the scratch
+    damages = _detections([[88, 88, 98, 98], [100, 100, 110, 110]], ["Dent", "Scratch"])
+    parts = _detections([[95, 95, 115, 115]], ["Hood"])
+
+    matches = service._match_damage_to_parts(damages, parts)
+    assert [(defect, part) for defect, part, _ in matches] == [("Scratch", "Hood")]
+
+def test_no_parts_or_damages(service):
+    empty = _detections([], [])
+    some = _detections([[0, 0, 10, 10]], ["Dent"])
+
+    assert service._match_damage_to_parts(empty, some) == []
+    assert service._match_damage_to_parts(some, empty) == []
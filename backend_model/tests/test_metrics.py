@@ -0,0 +1,46 @@
+"""
+Prometheus exposition, in one process and aggregated over workers
+"""
+import os
+import subprocess
+import sys
+from src.models.schemas import DefectDetection
+from src.services import metrics
+
+BACKEND_MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _sample(text: str, prefix: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{prefix} not in exposition")
+
+def test_render_includes_pipeline_metrics():
+    metrics.observe_model_timings({"parts_inference_ms": 120.0, "cascade_images": 3, "cascade_parts_skipped": 1})
+    metrics.record_defects([DefectDetection(defect_type="Dent", car_part="Hood", severity=5.0, confidence=0.9)])
+
+    content, content_type = metrics.render()
+    text = content.decode()
+
+    assert content_type.startswith("text/plain")
+    assert 'car_defects_stage_seconds_count{stage="parts_inference"}' in text
+    assert _sample(text, 'car_defects_cascade_images_total{parts_model="skipped"}') >= 1
+    assert _sample(text, 'car_defects_detections_total{car_part="Hood",defect_type="Dent"}') >= 1
+
+def _run(code: str, env: dict) -> str:
+    return subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_MODEL_DIR, env=env, check=True, capture_output=True, text=True
+    ).stdout
+
+def test_multiprocess_mode_sums_workers(tmp_path):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    worker = (
+        "from src.services import metrics\n"
+        "metrics.requests_total.labels(endpoint='find_defects').inc()\n"
+        "metrics.executor_in_flight.inc(2)\n"
+    )
+    _run(worker, env)
+    _run(worker, env)
+
+    text = _run("from src.services import metrics\nprint(metrics.render()[0].decode())", env)
+    assert _sample(text, 'car_defects_requests_total{endpoint="find_defects"}') == 2
@@ -0,0 +1,71 @@
+"""
+Request body limits of RequestSizeLimitMiddleware
+"""
+import asyncio
+import json
+from src.api.middleware import RequestSizeLimitMiddleware
+
+async def _echo_app(scope, receive, send):
+    """Read the whole body and answer 200 with its length"""
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise RuntimeError("client disconnected")
+        size += len(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    body = json.dumps({"size": size}).encode()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": body})
+
+def _call(middleware, path, chunks, content_length=None):
+    """Send the body in chunks; return the status and how many chunks the app pulled"""
+    headers = [] if content_length is None else [(b"content-length", str(content_length).encode())]
+    scope = {"type": "http", "path": path, "headers": headers}
+    pending = list(chunks)
+    pulled = 0
+    sent = []
+
+    async def receive():
+        nonlocal pulled
+        pulled += 1
+        body = pending.pop(0)
+        return {"type": "http.request", "body": body, "more_body": bool(pending)}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return sent[0]["status"], pulled
+
+def _middleware():
+    return RequestSizeLimitMiddleware(_echo_app, max_body_size=100, path_limits={"/batch": 1000})
+
+def test_body_within_limit_passes():
+    status, pulled = _call(_middleware(), "/single", [b"x" * 50, b"x" * 50])
+    assert status == 200
+    assert pulled == 2
+
+def test_declared_length_over_limit_is_rejected_unread():
+    status, pulled = _call(_middleware(), "/single", [b"x" * 200], content_length=200)
+    assert status == 413
+    assert pulled == 0
+
+def test_streamed_body_stops_at_first_chunk_over_limit():
+    status, pulled = _call(_middleware(), "/single", [b"x" * 60] * 10)
+    assert status == 413
+    assert pulled == 2
+
+def test_path_limit_overrides_default():
+    assert _call(_middleware(), "/batch", [b"x" * 60] * 10)[0] == 200
+    assert _call(_middleware(), "/batch/", [b"x" * 600] * 2)[0] == 413
+
+def test_non_http_scopes_pass_through():
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(scope["type"])
+
+    asyncio.run(RequestSizeLimitMiddleware(app, max_body_size=1)({"type": "lifespan"}, None, None))
+    assert seen == ["lifespan"]
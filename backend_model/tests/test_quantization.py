@@ -0,0 +1,87 @@
+"""
+Static INT8 quantization of the ResNet/FPN backbone
+"""
+import copy
+
+import pytest
+
+pytest.importorskip("detectron2")
+torch = pytest.importorskip("torch")
+
+from detectron2.config import get_cfg
+from detectron2.layers import Conv2d, FrozenBatchNorm2d, ShapeSpec
+from detectron2.modeling.backbone import build_resnet_fpn_backbone
+from src.services.quantization import _fold_conv, convert_backbone, prepare_backbone
+
+class _Model(torch.nn.Module):
+    """Holds a backbone the way GeneralizedRCNN does"""
+
+    def __init__(self, backbone):
+        super().__init__()
+        self.backbone = backbone
+
+    def forward(self, x):
+        return self.backbone(x)
+
+def _randomize_norms(module):
+    generator = torch.Generator().manual_seed(0)
+    for norm in module.modules():
+        if isinstance(norm, FrozenBatchNorm2d):
+            norm.weight.copy_(torch.rand(norm.weight.shape, generator=generator) + 0.5)
+            norm.bias.copy_(torch.randn(norm.bias.shape, generator=generator) * 0.1)
+            norm.running_mean.copy_(torch.randn(norm.running_mean.shape, generator=generator) * 0.1)
+            norm.running_var.copy_(torch.rand(norm.running_var.shape, generator=generator) + 0.5)
+
+def _r50_fpn():
+    cfg = get_cfg()
+    cfg.MODEL.RESNETS.DEPTH = 50
+    cfg.MODEL.RESNETS.NORM = "FrozenBN"
+    cfg.MODEL.RESNETS.OUT_FEATURES = ["res2", "res3", "res4", "res5"]
+    cfg.MODEL.FPN.IN_FEATURES = ["res2", "res3", "res4", "res5"]
+    torch.manual_seed(0)
+    model = _Model(build_resnet_fpn_backbone(cfg, ShapeSpec(channels=3))).eval()
+    _randomize_norms(model)
+    return model
+
+def _quantized(model, calibration):
+    modules = prepare_backbone(model)
+    with torch.no_grad():
+        for image in calibration:
+            model(image)
+    convert_backbone(modules)
+    return model
+
+def test_folded_conv_matches_conv_and_norm():
+    conv = Conv2d(8, 16, kernel_size=3, padding=1, bias=False, norm=FrozenBatchNorm2d(16)).eval()
+    _randomize_norms(conv)
+    x = torch.randn(1, 8, 12, 12)
+    with torch.no_grad():
+        torch.testing.assert_close(_fold_conv(conv)(x), conv(x), rtol=1e-4, atol=1e-4)
+
+def test_quantized_backbone_tracks_fp32_features():
+    fp32 = _r50_fpn()
+    calibration = [torch.randn(1, 3, 256, 320) * 50 for _ in range(2)]
+    int8 = _quantized(copy.deepcopy(fp32), calibration)
+
+    image = torch.randn(1, 3, 256, 320) * 50
+    with torch.no_grad():
+        expected, actual = fp32(image), int8(image)
+    assert expected.keys() == actual.keys()
+    for name in expected:
+        assert actual[name].dtype == torch.float32
+        similarity = torch.nn.functional.cosine_similarity(expected[name].flatten(), actual[name].flatten(), dim=0)
+        assert similarity > 0.99, name
+
+def test_cached_state_restores_into_skeleton():
+    calibration = [torch.randn(1, 3, 128, 160) * 50]
+    int8 = _quantized(_r50_fpn(), calibration)
+
+    skeleton = _r50_fpn()
+    convert_backbone(prepare_backbone(skeleton))
+    skeleton.load_state_dict(int8.state_dict())
+
+    image = torch.randn(1, 3, 128, 160) * 50
+    with torch.no_grad():
+        expected, actual = int8(image), skeleton(image)
+    for name in expected:
+        assert torch.equal(expected[name], actual[name])
@@ -0,0 +1,63 @@
+"""
+Result cache keys and eviction
+"""
+import pytest
+from src.config.settings import settings
+from src.models.schemas import DefectDetection
+from src.services.result_cache import ResultCache
+
+def _report(defect_type: str = "Dent"):
+    return [DefectDetection(defect_type=defect_type, car_part="Hood", severity=5.0, confidence=0.9)]
+
+def test_key_depends_on_content_and_model_version():
+    key = ResultCache.make_key("abc", "v1")
+
+    assert key == ResultCache.make_key("abc", "v1")
+    assert key != ResultCache.make_key("abd", "v1")
+    assert key != ResultCache.make_key("abc", "v2")
+
+@pytest.mark.parametrize("name, value", [
+    ("PARTS_MODEL_THRESHOLD", 0.5),
+    ("DAMAGE_MODEL_THRESHOLD", 0.9),
+    ("MAX_IMAGE_SIDE", 640),
+    ("IMAGE_DECODER", "other"),
+    ("INFERENCE_BACKEND", "onnxruntime"),
+])
+def test_key_changes_with_detection_settings(monkeypatch, name, value):
+    key = ResultCache.make_key("abc", "v1")
+    monkeypatch.setattr(settings, name, value)
+
+    assert ResultCache.make_key("abc", "v1") != key
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2, ttl_seconds=0)
+    cache.put("a", _report("Dent"))
+    cache.put("b", _report("Scratch"))
+    assert cache.get("a") is not None  # "b" is now the least recently used
+    cache.put("c", _report("Cracked"))
+
+    assert cache.get("b") is None
+    assert cache.get("a")[0].defect_type == "Dent"
+    assert cache.get("c")[0].defect_type == "Cracked"
+    assert cache.get_stats()["memory_entries"] == 2
+
+def test_expired_entries_are_misses(monkeypatch):
+    cache = ResultCache(max_entries=10, ttl_seconds=60)
+    now = 1000.0
+    monkeypatch.setattr("src.services.result_cache.time.time", lambda: now)
+    cache.put("a", _report())
+    now += 61
+
+    assert cache.get("a") is None
+    assert cache.get_stats()["misses"] == 1
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    cache = ResultCache(max_entries=10, ttl_seconds=0, disk_path=path)
+    cache.put("a", _report("Scratch"))
+    cache.close()
+
+    reopened = ResultCache(max_entries=10, ttl_seconds=0, disk_path=path)
+    assert reopened.get("a")[0].defect_type == "Scratch"
+    assert reopened.get_stats()["disk_hits"] == 1
+    reopened.close()
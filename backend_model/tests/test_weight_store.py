@@ -0,0 +1,56 @@
+"""
+Weight store file naming and manifest
+"""
+import hashlib
+import os
+from src.services.weight_store import WeightStore
+
+def _checkpoint(tmp_path, name: str, content: bytes) -> str:
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+def test_extension_ignores_url_query():
+    store = WeightStore("models")
+    sha256 = "ab" * 32
+
+    path = store._local_path("parts", "https://example.com/model_final.pth?download=true", sha256)
+    assert path.endswith(f"parts-{sha256[:16]}.pth")
+
+def test_new_source_does_not_replace_stored_weights(tmp_path):
+    store = WeightStore(str(tmp_path / "store"))
+    first = _checkpoint(tmp_path, "v1.pth", b"first weights")
+    second = _checkpoint(tmp_path, "v2.pth", b"second weights")
+
+    first_path = store.fetch("parts", first)
+    second_path = store.fetch("parts", second)
+
+    assert first_path != second_path
+    assert store.lookup("parts", first) == first_path
+    assert store.lookup("parts", second) == second_path
+    with open(first_path, "rb") as f:
+        assert f.read() == b"first weights"
+    assert store.verify()
+
+def test_lookup_rejects_other_checksum(tmp_path):
+    store = WeightStore(str(tmp_path / "store"))
+    source = _checkpoint(tmp_path, "v1.pth", b"weights")
+    store.fetch("damage", source, hashlib.sha256(b"weights").hexdigest())
+
+    assert store.lookup("damage", source, "0" * 64) is None
+
+def test_lookup_without_verify_checks_size_and_mtime(tmp_path, monkeypatch):
+    store = WeightStore(str(tmp_path / "store"))
+    source = _checkpoint(tmp_path, "v1.pth", b"weights")
+    path = store.fetch("parts", source)
+
+    hashed = []
+    monkeypatch.setattr("src.services.weight_store.sha256_file", lambda p: hashed.append(p))
+    assert store.lookup("parts", source, verify=False) == path
+    assert hashed == []
+
+    # Same size, different content and mtime: caught without re-hashing
+    with open(path, "wb") as f:
+        f.write(b"WEIGHTS")
+    os.utime(path, ns=(0, 0))
+    assert store.lookup("parts", source, verify=False) is None